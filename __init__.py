@@ -26,6 +26,7 @@ import bpy
 from . game_sprite_addon import *
 
 classes = (
+    CameraParentProperties,
     AddonProperties,
     CreateOrthoTemplate_OT_Operator,
     CreateDimeTemplate_OT_Operator,
@@ -33,6 +34,8 @@ classes = (
     CreateDimeCamera_OT_Operator,
     CreateSideCamera_OT_Operator,
     CreateBirdCamera_OT_Operator,
+    AddCameraParent_OT_Operator,
+    RemoveCameraParent_OT_Operator,
     OriginToFloor_OT_Operator,
     LoadExample_OT_Operator,
     RenderSprites_OT_Operator,
@@ -47,9 +50,12 @@ def register():
     for cls in classes:
         bpy.utils.register_class(cls)
     bpy.types.Scene.addon_properties = bpy.props.PointerProperty(type=AddonProperties)
+    bpy.app.handlers.load_post.append(upgrade_camera_properties)
 
 
 def unregister():
+    if upgrade_camera_properties in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(upgrade_camera_properties)
     for cls in reversed(classes):
         bpy.utils.unregister_class(cls)
     del bpy.types.Scene.addon_properties
@@ -0,0 +1,275 @@
+"""Python API for running sprite render jobs from scripts.
+
+A job is described by a spec, a dict or JSON file of settings. Any setting not given is taken from the scene's addon properties.
+Settings use the names of the addon properties, with or without their type prefix, eg 'camera_angles' or 'int_camera_angles'.
+Objects are given by name, and 'cameras' is a list of camera parent names.
+
+    {
+        "scene": "Scene",
+        "output_path": "C:\\sprites\\",
+        "output_parent": "Output",
+        "global_parent": "Global",
+        "cameras": ["Dimetric Parent"],
+        "camera_angles": 8,
+        "output_order": "sheet,object,camera,track,angle,frame",
+        "output_orientation": "-,v,h,v,v,h",
+        "sprite_sheet": "OBJECT",
+        "render_passes": ["NORMAL"],
+        "resolution_variants": "0.5",
+        "resample_filter": "NEAREST"
+    }
+
+Example, run from Blender's Python console or with blender -b file.blend --python script.py:
+
+    from game_sprite_creator import api
+    for spec in api.load_job_specs("jobs.json"):
+        job = api.SpriteJob(spec)
+        print(job.run())
+"""
+
+import json
+import time
+import bpy
+
+from . game_sprite_addon import AddonProperties, RenderSprites, ValidationError
+
+
+class JobContext():
+    """The parts of a Blender context used by RenderSprites, for running jobs on a scene other than the active one"""
+
+    scene = None
+    view_layer = None
+
+    def __init__(self, scene, view_layer):
+        self.scene = scene
+        self.view_layer = view_layer
+
+
+class JobCamera():
+    """An entry in the camera list of a job, with the same attribute name as CameraParentProperties"""
+
+    pointer_camera_parent = None
+
+    def __init__(self, camera_parent):
+        self.pointer_camera_parent = camera_parent
+
+
+class JobSettings():
+    """Settings for a single job, with the same attribute names as AddonProperties"""
+
+    def __init__(self, spec, scene):
+        """Copy the scene's addon properties, then apply the settings in the spec"""
+
+        addon_prop = scene.addon_properties
+        names = list(AddonProperties.__annotations__)
+
+        for name in names:
+            value = getattr(addon_prop, name)
+            if isinstance(value, set):
+                value = set(value)
+            elif name == 'collection_cameras':
+                value = [JobCamera(camera.pointer_camera_parent) for camera in value]
+            setattr(self, name, value)
+
+        for key, value in spec.items():
+            if key == 'scene':
+                continue
+            elif key == 'cameras':
+                self.collection_cameras = [JobCamera(get_object(name)) for name in value]
+                continue
+
+            name = get_property_name(key, names)
+            if name.startswith('pointer_'):
+                value = get_object(value) if value != None else None
+            elif name.startswith('enum_') and isinstance(value, (list, tuple)):
+                value = set(value)
+            setattr(self, name, value)
+
+
+def get_property_name(key, names):
+    """Return the addon property name for a job spec key, which may or may not have the type prefix"""
+
+    if key in names:
+        return key
+    for name in names:
+        if name.split('_', 1)[1] == key:
+            return name
+    raise ValidationError("* {0} is not a recognised job setting".format(key))
+
+
+def get_object(name):
+    """Return the object with the given name"""
+
+    obj = bpy.data.objects.get(name)
+    if obj == None:
+        raise ValidationError("* There is no object named {0}".format(name))
+    return obj
+
+
+def load_job_specs(path):
+    """Read a JSON file containing a single job spec or a list of job specs, returning a list of specs"""
+
+    with open(path) as f:
+        specs = json.load(f)
+    if isinstance(specs, dict):
+        specs = [specs]
+    return specs
+
+
+class SpriteJob():
+    """A sprite render job created from a job spec.
+    Call step() repeatedly, or run() once, to render the sprites.
+    progress, status and result can be read at any time, and cancel() stops the job at the next step.
+    """
+
+    # One of PENDING, RUNNING, FINISHED, CANCELLED or FAILED
+    status = 'PENDING'
+
+    # The number of iterations completed and the total number needed
+    completed = 0
+    total = 0
+
+    spec = None
+    context = None
+    settings = None
+    renderer = None
+
+    start_time = None
+    end_time = None
+    error = None
+    cancel_requested = False
+
+    def __init__(self, spec, context=None):
+        """Create a job from a spec dict, or the path of a JSON file containing one
+        If the spec does not name a scene, the scene of context or bpy.context is used
+        """
+
+        if isinstance(spec, str):
+            spec = load_job_specs(spec)[0]
+        self.spec = spec
+
+        if context == None:
+            context = bpy.context
+        if 'scene' in spec and spec['scene'] != context.scene.name:
+            scene = bpy.data.scenes[spec['scene']]
+            context = JobContext(scene, scene.view_layers[0])
+        self.context = context
+
+        self.settings = JobSettings(spec, self.context.scene)
+
+    @property
+    def progress(self):
+        """The fraction of the job completed, from 0 to 1"""
+
+        if self.status == 'FINISHED':
+            return 1.0
+        if self.total == 0:
+            return 0.0
+        return self.completed / self.total
+
+    @property
+    def result(self):
+        """A summary of the job, the sprite sheets are only listed once the job has finished"""
+
+        result = {
+            "status": self.status,
+            "completed": self.completed,
+            "total": self.total,
+            "output_path": self.settings.string_output_path,
+            "sheets": [],
+            "elapsed": 0.0,
+            "error": self.error}
+        if self.renderer != None:
+            result["sheets"] = list(self.renderer.written_sheets)
+            if self.renderer.output_digests != None:
+                result["changed"] = len(self.renderer.output_digests.changed)
+                result["unchanged"] = len(self.renderer.output_digests.unchanged)
+        if self.start_time != None:
+            result["elapsed"] = (self.end_time or time.perf_counter()) - self.start_time
+        return result
+
+    def start(self):
+        """Validate the settings and prepare the scene, raises ValidationError if the settings are invalid"""
+
+        self.start_time = time.perf_counter()
+        try:
+            self.renderer = RenderSprites(self.context, self.settings)
+        except ValidationError as e:
+            self.finish('FAILED', str(e))
+            raise
+        self.total = self.renderer.count_iterations()
+        self.status = 'RUNNING'
+
+    def step(self):
+        """Render a single sprite, starting the job if needed
+        Returns True while there are still sprites to render
+        """
+
+        if self.status == 'PENDING':
+            self.start()
+        if self.status != 'RUNNING':
+            return False
+
+        if self.cancel_requested:
+            self.renderer.cleanup()
+            self.finish('CANCELLED')
+            return False
+
+        try:
+            finished = self.renderer.iterate()
+        except Exception as e:
+            self.renderer.cleanup()
+            self.finish('FAILED', str(e))
+            raise
+
+        self.completed += 1
+        if finished:
+            self.finish('FINISHED')
+        return not finished
+
+    def run(self):
+        """Render every sprite, returning the result"""
+
+        while self.step():
+            pass
+        return self.result
+
+    def cancel(self):
+        """Stop the job before the next sprite is rendered, the scene is reset when it stops"""
+
+        self.cancel_requested = True
+        if self.status == 'PENDING':
+            self.finish('CANCELLED')
+
+    def finish(self, status, error=None):
+        self.status = status
+        self.error = error
+        self.end_time = time.perf_counter()
+
+
+def run_job(spec, context=None):
+    """Run a single job spec, returning its result"""
+
+    return SpriteJob(spec, context).run()
+
+
+def run_jobs(specs, context=None):
+    """Run a list of job specs one after another in the current Blender session, returning a list of results in the same order
+    A job that fails, including a spec that cannot be read, is reported with the status FAILED and its error, and the remaining jobs are still run
+    """
+
+    results = []
+    for spec in specs:
+        job = None
+        try:
+            job = SpriteJob(spec, context)
+            job.run()
+        except Exception as e:
+            # A spec with an unknown setting, object or scene fails before there is a job to report on
+            if job == None:
+                results.append({"status": 'FAILED', "completed": 0, "total": 0, "output_path": None, "sheets": [], "elapsed": 0.0, "error": str(e)})
+                continue
+            if job.status != 'FAILED':
+                job.finish('FAILED', str(e))
+        results.append(job.result)
+    return results
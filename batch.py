@@ -0,0 +1,229 @@
+"""Render the sprites of many .blend files using a small pool of long-lived Blender processes.
+
+Each worker is a background Blender process that registers the addon once, then opens each file it is given in turn
+and renders it with the settings saved in that file's addon properties.
+This avoids paying Blender's startup, addon registration and Python import cost for every file.
+
+Run from a terminal with any Python 3 interpreter, for example:
+
+    python batch.py --blender /path/to/blender --workers 2 --report report.json characters/*.blend
+
+The settings of a file can be overridden for every file with a JSON job spec, see api.py:
+
+    python batch.py --blender /path/to/blender --spec overrides.json characters/*.blend
+"""
+
+import argparse
+import importlib
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+
+# Lines written by a worker starting with this marker contain the JSON result of a file
+# Anything else a worker prints, such as Blender's render progress, is passed through to the console
+RESULT_MARKER = "SPRITE_BATCH_RESULT "
+READY_MARKER = "SPRITE_BATCH_READY"
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Render the sprites of many .blend files.")
+    parser.add_argument('files', nargs='*', help=".blend files to render.")
+    parser.add_argument('--blender', default='blender', help="Path to the Blender executable.")
+    parser.add_argument('--workers', type=int, default=2, help="Number of Blender processes to run at once.")
+    parser.add_argument('--spec', default=None, help="JSON job spec applied on top of each file's settings.")
+    parser.add_argument('--report', default=None, help="Path to write the per-file results to as JSON.")
+    parser.add_argument('--quiet', action='store_true', help="Hide the output of the Blender processes.")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+class Worker():
+    """A long-lived background Blender process that renders the files it is sent one at a time"""
+
+    process = None
+    ready = None
+    results = None
+
+    def __init__(self, blender, spec, quiet):
+        self.blender = blender
+        self.spec = spec
+        self.quiet = quiet
+        self.start()
+
+    def start(self):
+        command = [self.blender, '-b', '--python', os.path.abspath(__file__), '--', '--worker']
+        if self.spec != None:
+            command += ['--spec', self.spec]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT, universal_newlines=True, bufsize=1)
+        self.ready = threading.Event()
+        self.results = queue.Queue()
+        threading.Thread(target=self.read_output, daemon=True).start()
+
+    def read_output(self):
+        """Sort the worker's output into results and console output, runs on its own thread"""
+
+        for line in self.process.stdout:
+            if line.startswith(RESULT_MARKER):
+                self.results.put(json.loads(line[len(RESULT_MARKER):]))
+            elif line.startswith(READY_MARKER):
+                self.ready.set()
+            elif not self.quiet:
+                sys.stdout.write(line)
+        # The process has exited, wake anything waiting on it
+        self.ready.set()
+        self.results.put(None)
+
+    def render(self, path):
+        """Send a file to the worker and wait for its result
+        If the worker exits while rendering the file is reported as failed and the worker is restarted
+        """
+
+        self.ready.wait()
+        result = None
+        if self.process.poll() == None:
+            try:
+                self.process.stdin.write(path + "\n")
+                self.process.stdin.flush()
+                result = self.results.get()
+            except (BrokenPipeError, OSError):
+                result = None
+
+        if result == None:
+            result = {"file": path, "status": 'FAILED', "error": "Blender exited while rendering the file"}
+            self.stop()
+            self.start()
+        return result
+
+    def stop(self):
+        if self.process.poll() == None:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+            self.process.wait()
+
+
+def run_batch(files, blender='blender', workers=2, spec=None, quiet=False):
+    """Render each file using a pool of Blender processes, returning a list of results in the same order as files"""
+
+    files = [os.path.abspath(f) for f in files]
+    if spec != None:
+        spec = os.path.abspath(spec)
+    pending = queue.Queue()
+    for i, path in enumerate(files):
+        pending.put((i, path))
+    results = [None] * len(files)
+
+    def work():
+        try:
+            worker = Worker(blender, spec, quiet)
+        except OSError as e:
+            print("Unable to start {0}: {1}".format(blender, e))
+            return
+        try:
+            while True:
+                try:
+                    i, path = pending.get_nowait()
+                except queue.Empty:
+                    break
+                results[i] = worker.render(path)
+                print("{0}: {1} ({2}/{3})".format(path, results[i]["status"], sum(r != None for r in results), len(files)))
+        finally:
+            worker.stop()
+
+    threads = [threading.Thread(target=work) for i in range(max(1, min(workers, len(files))))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Files left over if no worker could be started
+    for i, path in enumerate(files):
+        if results[i] == None:
+            results[i] = {"file": path, "status": 'FAILED', "error": "The file was not rendered"}
+
+    return results
+
+
+def print_summary(results, elapsed):
+    print("\n{0:<40} {1:<10} {2:>8} {3:>8} {4:>8}".format("File", "Status", "Sprites", "Open", "Render"))
+    for result in results:
+        print("{0:<40} {1:<10} {2:>8} {3:>7.2f}s {4:>7.2f}s".format(
+            os.path.basename(result["file"])[:40],
+            result["status"],
+            result.get("completed", 0),
+            result.get("open_time", 0.0),
+            result.get("elapsed", 0.0)))
+        if result.get("error"):
+            print("  {0}".format(result["error"].replace("\n", "\n  ")))
+    finished = sum(r["status"] == 'FINISHED' for r in results)
+    print("\n{0} of {1} files finished in {2:.2f}s".format(finished, len(results), elapsed))
+
+
+def main(argv):
+    args = parse_args(argv)
+    if args.worker:
+        run_worker(args.spec)
+        return 0
+
+    start = time.perf_counter()
+    results = run_batch(args.files, args.blender, args.workers, args.spec, args.quiet)
+    elapsed = time.perf_counter() - start
+
+    print_summary(results, elapsed)
+    if args.report != None:
+        with open(args.report, 'w') as f:
+            json.dump({"elapsed": elapsed, "files": results}, f, indent=4)
+
+    return 0 if all(r["status"] == 'FINISHED' for r in results) else 1
+
+
+def run_worker(spec_path):
+    """Runs inside Blender, renders each file path read from stdin until stdin is closed"""
+
+    import bpy
+
+    # Import the addon from the folder containing this script and register it if it is not already enabled
+    package_folder = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.dirname(package_folder))
+    addon = importlib.import_module(os.path.basename(package_folder))
+    api = importlib.import_module(addon.__name__ + ".api")
+    if not hasattr(bpy.types.Scene, 'addon_properties'):
+        addon.register()
+
+    spec = {}
+    if spec_path != None:
+        spec = api.load_job_specs(spec_path)[0]
+
+    print(READY_MARKER, flush=True)
+    for line in sys.stdin:
+        path = line.strip()
+        if not path:
+            continue
+
+        result = {"file": path, "status": 'FAILED', "error": None}
+        try:
+            start = time.perf_counter()
+            bpy.ops.wm.open_mainfile(filepath=path, load_ui=False)
+            result["open_time"] = time.perf_counter() - start
+            job = api.SpriteJob(spec, bpy.context)
+            job.run()
+            result.update(job.result)
+        except Exception as e:
+            result["error"] = str(e)
+
+        print(RESULT_MARKER + json.dumps(result), flush=True)
+
+
+if __name__ == '__main__':
+    # Blender passes the script's own arguments after --
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else sys.argv[1:]
+    code = main(argv)
+    if '--worker' not in argv:
+        sys.exit(code)
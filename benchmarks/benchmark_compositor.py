@@ -0,0 +1,80 @@
+"""Compare the NumPy and Pillow sprite sheet backends on large sheets.
+
+Run from a terminal with Blender's Python, for example:
+
+    blender -b --python benchmarks/benchmark_compositor.py -- --frames 256 --size 256 --columns 16
+
+Frames are merged the same way merge_images() merges them, into rows and then into a single sheet.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy
+import compositor
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(description="Benchmark the sprite sheet backends.")
+    parser.add_argument('--frames', type=int, default=256, help="Number of frames in the sheet.")
+    parser.add_argument('--size', type=int, default=256, help="Width and height of each frame in pixels.")
+    parser.add_argument('--columns', type=int, default=16, help="Number of frames in each row of the sheet.")
+    parser.add_argument('--repeat', type=int, default=3, help="Number of times to run each backend.")
+    return parser.parse_args(argv)
+
+
+def write_frames(folder, count, size):
+    """Write count random RGBA frames to folder using the NumPy backend"""
+
+    backend = compositor.NumpyBackend('PNG')
+    rng = numpy.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        frame = rng.integers(0, 256, (size, size, 4), dtype=numpy.uint8)
+        path = os.path.join(folder, "frame_{0}.png".format(str(i).zfill(4)))
+        backend.save(frame, path)
+        paths.append(path)
+    return paths
+
+
+def build_sheet(backend, paths, columns, folder):
+    """Merge frames into rows, then the rows into a sheet"""
+
+    row_paths = []
+    for row, start in enumerate(range(0, len(paths), columns)):
+        row_path = os.path.join(folder, "row_{0}.png".format(str(row).zfill(4)))
+        compositor.merge_files(backend, paths[start:start + columns], 'HORIZONTAL', row_path)
+        row_paths.append(row_path)
+    compositor.merge_files(backend, row_paths, 'VERTICAL', os.path.join(folder, "sheet.png"))
+
+
+def main():
+    args = parse_args()
+    folder = tempfile.mkdtemp(prefix="sprite_benchmark_")
+    try:
+        paths = write_frames(folder, args.frames, args.size)
+        print("{0} frames of {1}x{1}px, {2} per row".format(args.frames, args.size, args.columns))
+        for name in ('NUMPY', 'PILLOW'):
+            backend = compositor.get_image_backend(name)
+            if backend == None:
+                print("{0}: not installed".format(name))
+                continue
+            timings = []
+            for i in range(args.repeat):
+                start = time.perf_counter()
+                build_sheet(backend, paths, args.columns, folder)
+                timings.append(time.perf_counter() - start)
+            print("{0}: best {1:.3f}s, mean {2:.3f}s".format(name, min(timings), sum(timings) / len(timings)))
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
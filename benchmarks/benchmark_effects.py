@@ -0,0 +1,72 @@
+"""Measure the cost of the post-processing effects on batches of frames, without Blender.
+
+Frames are processed the same way write_effects() processes them, in batches of 16 on a pool of worker threads,
+but are held in memory so that only the effects are timed. Run from a terminal with any Python 3 interpreter that has NumPy installed:
+
+    python benchmarks/benchmark_effects.py --frames 1024 --size 64
+"""
+
+import argparse
+import concurrent.futures
+import importlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy
+import fake_bpy
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the post-processing effects.")
+    parser.add_argument('--frames', type=int, default=1024, help="Number of frames to process.")
+    parser.add_argument('--size', type=int, default=64, help="Width and height of each frame in pixels.")
+    parser.add_argument('--batch', type=int, default=16, help="Number of frames in each batch.")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker threads, defaults to the number of CPUs.")
+    parser.add_argument('--repeat', type=int, default=3, help="Number of times to run each effect, the fastest time is reported.")
+    return parser.parse_args()
+
+
+def make_frames(count, size):
+    """Create frames with an opaque blob in the middle and soft edges, like a sprite rendered with a transparent background"""
+
+    y, x = numpy.mgrid[0:size, 0:size]
+    distance = numpy.hypot(x - size / 2, y - size / 2) / (size / 3)
+    frames = numpy.zeros((count, size, size, 4), dtype=numpy.uint8)
+    rng = numpy.random.default_rng(0)
+    frames[..., :3] = rng.integers(0, 256, (count, size, size, 3), dtype=numpy.uint8)
+    frames[..., 3] = numpy.clip((1 - distance) * 4 * 255, 0, 255).astype(numpy.uint8)
+    return frames
+
+
+def main():
+    args = parse_args()
+    fake_bpy.install()
+    compositor = importlib.import_module(fake_bpy.import_addon().__name__ + ".compositor")
+
+    effects = {
+        'OUTLINE': lambda images: compositor.add_outline(images, (0, 0, 0, 255), 1),
+        'SHADOW': lambda images: compositor.add_drop_shadow(images, (0, 0, 0, 128), 2, 2),
+        'CLAMP': lambda images: compositor.clamp_colours(images, 8)}
+    effects['ALL'] = lambda images: effects['CLAMP'](effects['SHADOW'](effects['OUTLINE'](images)))
+
+    frames = make_frames(args.frames, args.size)
+    batches = [frames[i:i + args.batch] for i in range(0, len(frames), args.batch)]
+    workers = args.workers or os.cpu_count() or 1
+
+    print("{0} frames of {1}x{1}px, batches of {2}, {3} workers".format(args.frames, args.size, args.batch, workers))
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        for name, function in effects.items():
+            best = None
+            for i in range(args.repeat):
+                start = time.perf_counter()
+                list(pool.map(function, batches))
+                elapsed = time.perf_counter() - start
+                best = elapsed if best == None else min(best, elapsed)
+            print("{0:<8} {1:8.3f}s, {2:8.1f}us per frame".format(name, best, best / args.frames * 1e6))
+
+
+if __name__ == '__main__':
+    main()
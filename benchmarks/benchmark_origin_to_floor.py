@@ -0,0 +1,73 @@
+"""Measure the Move Origin to Floor operator on large selections, without Blender.
+
+The operator is run against the stand-in bpy module in fake_bpy.py, on a selection of mesh objects at random heights,
+some of which share their mesh with other objects. Run from a terminal with any Python 3 interpreter that has NumPy installed:
+
+    python benchmarks/benchmark_origin_to_floor.py --objects 1000 10000 --vertices 500 --shared 0.5
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_bpy
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark Move Origin to Floor with a fake bpy module.")
+    parser.add_argument('--objects', type=int, nargs='+', default=[1000, 10000], help="Numbers of selected objects to time.")
+    parser.add_argument('--vertices', type=int, default=500, help="Number of vertices in each mesh.")
+    parser.add_argument('--shared', type=float, default=0.5, help="Fraction of objects that share their mesh with another object.")
+    parser.add_argument('--repeat', type=int, default=3, help="Number of times to run the operator, the fastest time is reported.")
+    parser.add_argument('--json', default=None, help="Path to write the results to as JSON.")
+    return parser.parse_args()
+
+
+def build_selection(count, vertices, shared):
+    """Create count mesh objects at random heights, returning the selected objects and the number of meshes"""
+
+    fake_bpy.reset()
+    rng = random.Random(count)
+    objects = fake_bpy.data.objects
+    meshes = []
+    for i in range(count):
+        if meshes and rng.random() < shared:
+            mesh = rng.choice(meshes)
+        else:
+            mesh = fake_bpy.Mesh("Mesh {0}".format(i), vertices)
+            meshes.append(mesh)
+        objects.new("Prop {0}".format(i), mesh, 'MESH', location=(i, 0, rng.uniform(-5, 5)))
+    fake_bpy.context.selected_objects = list(objects)
+    return len(meshes)
+
+
+def main():
+    args = parse_args()
+    fake_bpy.install()
+    addon = fake_bpy.import_addon()
+    operator = addon.game_sprite_addon.OriginToFloor_OT_Operator()
+
+    results = {"args": vars(args), "runs": []}
+    for count in args.objects:
+        best = None
+        for i in range(args.repeat):
+            meshes = build_selection(count, args.vertices, args.shared)
+            start = time.perf_counter()
+            operator.execute(fake_bpy.context)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best == None else min(best, elapsed)
+        results["runs"].append({"objects": count, "meshes": meshes, "seconds": best, "mesh_updates": fake_bpy.stats["mesh_updates"]})
+        print("{0:>8} objects, {1:>8} meshes: {2:8.3f}s, {3:.1f}us per object".format(count, meshes, best, best / count * 1e6))
+
+    if args.json != None:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
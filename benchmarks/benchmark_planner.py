@@ -0,0 +1,156 @@
+"""Measure the per-sprite overhead of the render planner and the cost of merging sprite sheets, without Blender.
+
+The addon is run against the stand-in bpy module in fake_bpy.py, where each render writes a fixed image instead of rendering.
+Run from a terminal with any Python 3 interpreter that has NumPy installed, for example:
+
+    python benchmarks/benchmark_planner.py --objects 8 --tracks 4 --frames 24 --angles 8
+    python benchmarks/benchmark_planner.py --objects 100 --tracks 10 --frames 100 --angles 8 --no-write
+
+--no-write skips writing the renders and merging the sprite sheets, so that millions of sprites can be planned quickly.
+--json writes the results to a file so they can be tracked over time.
+"""
+
+import argparse
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_bpy
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the render planner with a fake bpy module.")
+    parser.add_argument('--objects', type=int, default=8, help="Number of object parents.")
+    parser.add_argument('--children', type=int, default=2, help="Number of mesh children of each object parent.")
+    parser.add_argument('--scenery', type=int, default=0, help="Number of other objects in the file that are never rendered.")
+    parser.add_argument('--tracks', type=int, default=4, help="Number of NLA tracks on each object parent, 0 for no animation.")
+    parser.add_argument('--frames', type=int, default=24, help="Number of frames in each track.")
+    parser.add_argument('--cameras', type=int, default=1, help="Number of camera parents.")
+    parser.add_argument('--angles', type=int, default=8, help="Number of camera angles.")
+    parser.add_argument('--size', type=int, default=64, help="Width and height of each render in pixels.")
+    parser.add_argument('--sheets', default='OBJECT', choices=('OFF', 'OUTPUT', 'OBJECT'), help="The Sprite Sheets option.")
+    parser.add_argument('--order', default="sheet,object,camera,track,angle,frame", help="The Output Order.")
+    parser.add_argument('--no-write', action='store_true', help="Do not write renders or merge sprite sheets.")
+    parser.add_argument('--validate', type=int, default=1000, help="Number of times to run the validators.")
+    parser.add_argument('--profile', action='store_true', help="Print the functions taking the most time.")
+    parser.add_argument('--verbose', action='store_true', help="Show the progress messages printed by the addon.")
+    parser.add_argument('--json', default=None, help="Path to write the results to as JSON.")
+    return parser.parse_args()
+
+
+def build_scene(args, output_path):
+    """Create an Output Parent of animated objects, camera rigs and a Global Parent in the fake scene"""
+
+    scn = fake_bpy.context.scene
+    objects = fake_bpy.data.objects
+    addon_prop = scn.addon_properties
+
+    scn.render.resolution_x = args.size
+    scn.render.resolution_y = args.size
+
+    output = objects.new("Output")
+    global_parent = objects.new("Global")
+    objects.new("Sun", obj_type='LIGHT', parent=global_parent)
+
+    for i in range(args.objects):
+        obj = objects.new("Object {0}".format(i), parent=output, location=(i * 4, 0, 0))
+        for j in range(args.children):
+            objects.new("Mesh {0}.{1}".format(i, j), fake_bpy.Mesh("Mesh {0}.{1}".format(i, j)), 'MESH', obj)
+        if args.tracks:
+            tracks = []
+            for t in range(args.tracks):
+                action = fake_bpy.Action("Action {0}.{1}".format(i, t))
+                tracks.append(fake_bpy.NlaTrack("Track {0}".format(t), [fake_bpy.NlaStrip(1, args.frames, action)]))
+            obj.animation_data = fake_bpy.AnimData(tracks)
+
+    for i in range(args.scenery):
+        objects.new("Scenery {0}".format(i), fake_bpy.Mesh("Scenery {0}".format(i)), 'MESH')
+
+    for i in range(args.cameras):
+        cam_parent = objects.new("Camera Parent {0}".format(i))
+        objects.new("Camera {0}".format(i), fake_bpy.Camera("Camera {0}".format(i)), 'CAMERA', cam_parent)
+        addon_prop.collection_cameras.add().pointer_camera_parent = cam_parent
+
+    addon_prop.pointer_output_parent = output
+    addon_prop.pointer_global_parent = global_parent
+    addon_prop.string_output_path = output_path
+    addon_prop.int_camera_angles = args.angles
+    addon_prop.enum_sprite_sheet = 'OFF' if args.no_write else args.sheets
+    addon_prop.string_output_order = args.order
+
+
+def run(args, addon, results):
+    context = fake_bpy.context
+    module = addon.game_sprite_addon
+
+    start = time.perf_counter()
+    for i in range(args.validate):
+        module.get_validation_errors(None, context)
+    results["validate_us"] = (time.perf_counter() - start) / max(1, args.validate) * 1e6
+
+    start = time.perf_counter()
+    renderer = module.RenderSprites(context)
+    results["prepare_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results["sprites"] = renderer.count_iterations()
+    results["count_s"] = time.perf_counter() - start
+
+    # The last iteration also merges the sprite sheets, so it is timed separately
+    iterations = 0
+    finished = False
+    start = time.perf_counter()
+    while not finished:
+        iteration_start = time.perf_counter()
+        finished = renderer.iterate()
+        iterations += 1
+    end = time.perf_counter()
+    results["plan_s"] = iteration_start - start
+    results["sprite_us"] = (iteration_start - start) / max(1, iterations - 1) * 1e6
+    results["finish_s"] = end - iteration_start
+    results["renders"] = fake_bpy.stats["renders"]
+
+
+def main():
+    args = parse_args()
+    fake_bpy.install()
+    fake_bpy.write_renders = not args.no_write
+    addon = fake_bpy.import_addon()
+
+    folder = tempfile.mkdtemp(prefix="sprite_planner_")
+    results = {"args": vars(args)}
+    try:
+        build_scene(args, folder)
+        profile = cProfile.Profile() if args.profile else None
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+            if profile != None:
+                profile.runcall(run, args, addon, results)
+            else:
+                run(args, addon, results)
+        if profile != None:
+            pstats.Stats(profile).sort_stats('cumulative').print_stats(25)
+    finally:
+        shutil.rmtree(folder)
+
+    print("{0} sprites, {1} renders, {2} objects in the file".format(results["sprites"], results["renders"], len(fake_bpy.data.objects)))
+    print("Validation:   {0:10.1f}us".format(results["validate_us"]))
+    print("Prepare:      {0:10.3f}s".format(results["prepare_s"]))
+    print("Count:        {0:10.3f}s".format(results["count_s"]))
+    print("Render loop:  {0:10.3f}s, {1:.1f}us per sprite".format(results["plan_s"], results["sprite_us"]))
+    print("Finish:       {0:10.3f}s".format(results["finish_s"]))
+
+    if args.json != None:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Measure how long the addon takes to import and register, without Blender, and check it against a time budget.
+
+Every Blender start and every batch worker pays this cost, so the compositor, NumPy and Pillow must not be imported until a render, merge or validation needs them.
+Each sample imports the addon in a new Python process against the stand-in bpy module in fake_bpy.py.
+Run from a terminal with any Python 3 interpreter:
+
+    python benchmarks/benchmark_register.py --samples 10 --budget 20
+
+The exit status is 1 if the median time is over the budget, or if the compositor, NumPy or Pillow were imported.
+Run python -m compileall on the addon first, otherwise the time to compile it is included.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be imported once a render or merge needs them
+LAZY_MODULES = ('compositor', 'numpy', 'PIL')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark importing and registering the addon with a fake bpy module.")
+    parser.add_argument('--samples', type=int, default=10, help="Number of processes to time.")
+    parser.add_argument('--budget', type=float, default=20, help="Maximum median time in milliseconds to import and register the addon.")
+    parser.add_argument('--json', default=None, help="Path to write the results to as JSON.")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def run_child():
+    """Import and register the addon, printing the times and the lazy modules loaded as JSON"""
+
+    import importlib
+    import fake_bpy
+
+    fake_bpy.install()
+    package_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.path.dirname(package_folder))
+
+    start = time.perf_counter()
+    addon = importlib.import_module(os.path.basename(package_folder))
+    imported = time.perf_counter()
+    addon.register()
+    registered = time.perf_counter()
+
+    loaded = [name for name in LAZY_MODULES if name in sys.modules or addon.__name__ + '.' + name in sys.modules]
+    print(json.dumps({"import_ms": (imported - start) * 1e3, "register_ms": (registered - imported) * 1e3, "loaded": loaded}))
+
+
+def main():
+    args = parse_args()
+    if args.child:
+        run_child()
+        return
+
+    samples = []
+    for i in range(args.samples):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child'], check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+        samples.append(json.loads(output.splitlines()[-1]))
+
+    import_ms = statistics.median(sample["import_ms"] for sample in samples)
+    register_ms = statistics.median(sample["register_ms"] for sample in samples)
+    total_ms = statistics.median(sample["import_ms"] + sample["register_ms"] for sample in samples)
+    loaded = sorted(set(name for sample in samples for name in sample["loaded"]))
+
+    print("Import:   {0:8.2f}ms".format(import_ms))
+    print("Register: {0:8.2f}ms".format(register_ms))
+    print("Total:    {0:8.2f}ms, budget {1:.2f}ms".format(total_ms, args.budget))
+
+    failed = False
+    if total_ms > args.budget:
+        print("Over budget")
+        failed = True
+    if loaded:
+        print("Imported at startup: {0}".format(", ".join(loaded)))
+        failed = True
+
+    if args.json != None:
+        with open(args.json, 'w') as f:
+            json.dump({"args": vars(args), "samples": samples, "total_ms": total_ms, "loaded": loaded}, f, indent=4)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,917 @@
+"""A pure Python stand-in for the parts of bpy, mathutils and bmesh used by the addon.
+
+This allows the render planner, the validators and the sprite sheet compositor to be benchmarked, profiled and tested
+with a plain Python interpreter and NumPy, without Blender or real renders. It is used by the benchmarks and by the tests in the tests folder,
+and only provides what they exercise.
+
+    import fake_bpy
+    fake_bpy.install()
+    addon = fake_bpy.import_addon()
+
+install() must be called before the addon is imported. Only what the addon needs is provided:
+* Objects with a name, type, parent, location, rotation and hide_render, NLA tracks and strips, and empty lists of modifiers, constraints and drivers.
+* Meshes with vertex coordinates that can be read and written with foreach_get() and foreach_set().
+* A scene with render settings, a frame, a camera and the addon properties.
+* bpy.ops.render.render(), which writes a fixed size RGBA image to the render path instead of rendering.
+  Renders started with 'INVOKE_DEFAULT' run until finish_render() is called, and changing images or frames in the meantime raises an error.
+* bpy.data.images, reading and writing the 8-bit RGBA PNG files written by this module.
+* Compositor node trees, where each File Output node writes the render, or for the Mask pass the left half of the render with
+  pass index 1 and the right half with pass index 2.
+The Collections isolation mode and the scene setup operators are not supported.
+"""
+
+import importlib
+import itertools
+import math
+import os
+import struct
+import sys
+import types
+import zlib
+
+
+class LazyModule():
+    """Imports a module the first time one of its attributes is used, so that the register benchmark can see what the addon itself imports"""
+
+    module_name = None
+    module = None
+
+    def __init__(self, module_name):
+        self.module_name = module_name
+
+    def __getattr__(self, attr):
+        if self.module == None:
+            self.module = importlib.import_module(self.module_name)
+        return getattr(self.module, attr)
+
+
+numpy = LazyModule('numpy')
+
+
+# Set to False to count renders without writing any files
+write_renders = True
+
+# The number of calls made to the stub renderer, to Scene.frame_set() and to Mesh.update()
+stats = {"renders": 0, "frame_sets": 0, "mesh_updates": 0, "image_loads": 0}
+
+_pointers = itertools.count(1)
+
+
+# mathutils
+
+class Vector():
+    """A 3D vector"""
+
+    def __init__(self, values=(0, 0, 0)):
+        self.values = [float(v) for v in values]
+
+    x = property(lambda self: self.values[0], lambda self, v: self.values.__setitem__(0, v))
+    y = property(lambda self: self.values[1], lambda self, v: self.values.__setitem__(1, v))
+    z = property(lambda self: self.values[2], lambda self, v: self.values.__setitem__(2, v))
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def __setitem__(self, index, value):
+        self.values[index] = value
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __add__(self, other):
+        return Vector(a + b for a, b in zip(self, other))
+
+    def __sub__(self, other):
+        return Vector(a - b for a, b in zip(self, other))
+
+    def __repr__(self):
+        return "Vector({0})".format(tuple(self.values))
+
+    @property
+    def length(self):
+        return math.sqrt(sum(v * v for v in self.values))
+
+    def normalize(self):
+        length = self.length
+        if length > 0:
+            self.values = [v / length for v in self.values]
+
+
+class Matrix():
+    """A square matrix, 3x3 or 4x4"""
+
+    def __init__(self, rows):
+        self.rows = [[float(v) for v in row] for row in rows]
+        # The object whose matrix_world this is, updated when the translation is set
+        self.owner = None
+
+    @classmethod
+    def Identity(cls, size):
+        return cls([[1 if i == j else 0 for j in range(size)] for i in range(size)])
+
+    @classmethod
+    def Translation(cls, vector):
+        matrix = cls.Identity(4)
+        for i in range(3):
+            matrix.rows[i][3] = vector[i]
+        return matrix
+
+    def __getitem__(self, index):
+        return self.rows[index]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __matmul__(self, other):
+        size = len(self.rows)
+        if isinstance(other, Matrix):
+            return Matrix([[sum(self.rows[i][k] * other.rows[k][j] for k in range(size)) for j in range(size)] for i in range(size)])
+        values = list(other) + [1.0] * (size - len(other))
+        return Vector([sum(self.rows[i][k] * values[k] for k in range(size)) for i in range(len(other))])
+
+    @property
+    def translation(self):
+        return Vector(row[3] for row in self.rows[:3])
+
+    @translation.setter
+    def translation(self, vector):
+        for i in range(3):
+            self.rows[i][3] = float(vector[i])
+        if self.owner != None:
+            self.owner.matrix_world = self
+
+    def to_translation(self):
+        return self.translation
+
+    def to_3x3(self):
+        return Matrix([row[:3] for row in self.rows[:3]])
+
+    def inverted(self):
+        """Gauss-Jordan elimination"""
+
+        size = len(self.rows)
+        rows = [row[:] + [1.0 if i == j else 0.0 for j in range(size)] for i, row in enumerate(self.rows)]
+        for column in range(size):
+            pivot = max(range(column, size), key=lambda r: abs(rows[r][column]))
+            rows[column], rows[pivot] = rows[pivot], rows[column]
+            scale = rows[column][column]
+            rows[column] = [v / scale for v in rows[column]]
+            for r in range(size):
+                if r != column:
+                    factor = rows[r][column]
+                    rows[r] = [a - factor * b for a, b in zip(rows[r], rows[column])]
+        return Matrix([row[size:] for row in rows])
+
+
+class Euler(Vector):
+    """XYZ rotation in radians"""
+    pass
+
+
+# Properties
+
+class Property():
+    """The definition of an addon property, as returned by the bpy.props functions"""
+
+    def __init__(self, kind, **kwargs):
+        self.kind = kind
+        self.options = kwargs
+        default = kwargs.get('default')
+        if default == None:
+            default = {'INT': 0, 'FLOAT': 0.0, 'BOOL': False, 'STRING': "", 'ENUM': None, 'POINTER': None, 'COLLECTION': None, 'FLOAT_VECTOR': (0.0, 0.0, 0.0)}[kind]
+            if kind == 'ENUM':
+                default = set() if 'ENUM_FLAG' in kwargs.get('options', ()) else kwargs['items'][0][0]
+        self.default = default
+
+
+def _property_function(kind):
+    def function(**kwargs):
+        return Property(kind, **kwargs)
+    return function
+
+
+class BlRnaProperty():
+    def __init__(self, identifier, prop_type):
+        self.identifier = identifier
+        self.type = prop_type
+        self.is_readonly = False
+
+
+class BlRna():
+    """The RNA description of a struct, used by the fingerprinting of duplicate objects"""
+
+    def __init__(self, properties):
+        self.properties = [BlRnaProperty(identifier, prop_type) for identifier, prop_type in properties]
+
+
+class Struct():
+    bl_rna = BlRna(())
+
+
+class ID(Struct):
+    """A data-block"""
+
+    def __init__(self, name):
+        self.name = name
+        self.pointer = next(_pointers)
+
+    def as_pointer(self):
+        return self.pointer
+
+    def __repr__(self):
+        return "<{0} {1}>".format(type(self).__name__, self.name)
+
+
+class PropertyGroup():
+    """Instances hold the default value of each annotated property"""
+
+    def __init__(self):
+        for cls in reversed(type(self).__mro__):
+            for name, prop in getattr(cls, '__annotations__', {}).items():
+                if isinstance(prop, Property):
+                    value = prop.default
+                    if prop.kind == 'COLLECTION':
+                        value = PropertyCollection(prop.options['type'])
+                    setattr(self, name, set(value) if isinstance(value, set) else value)
+
+
+class PropertyCollection(list):
+    """The items of a collection property"""
+
+    def __init__(self, item_type):
+        super().__init__()
+        self.item_type = item_type
+
+    def add(self):
+        item = self.item_type()
+        self.append(item)
+        return item
+
+
+class Operator():
+    pass
+
+
+class Panel():
+    pass
+
+
+class Menu():
+    pass
+
+
+# Data
+
+class Action(ID):
+    pass
+
+
+class NlaStrip(Struct):
+    bl_rna = BlRna((('frame_start', 'FLOAT'), ('frame_end', 'FLOAT'), ('repeat', 'FLOAT'), ('scale', 'FLOAT')))
+
+    def __init__(self, frame_start, frame_end, action=None):
+        self.frame_start = float(frame_start)
+        self.frame_end = float(frame_end)
+        self.repeat = 1.0
+        self.scale = 1.0
+        self.action = action
+
+
+class NlaTrack(Struct):
+    def __init__(self, name, strips=()):
+        self.name = name
+        self.strips = list(strips)
+        self.mute = False
+
+
+class AnimData(Struct):
+    def __init__(self, tracks=()):
+        self.action = None
+        self.nla_tracks = list(tracks)
+        self.drivers = []
+
+
+class Object(ID):
+    """An object, its world matrix is built from the locations of the object and its parents"""
+
+    def __init__(self, name, obj_type='EMPTY', parent=None, location=(0, 0, 0), data=None):
+        super().__init__(name)
+        self.type = obj_type
+        self.parent = parent
+        self.data = data
+        self.hide_render = False
+        self.location = Vector(location)
+        self.delta_location = Vector()
+        self.matrix_parent_inverse = Matrix.Identity(4)
+        self.rotation_euler = Euler()
+        self.animation_data = None
+        self.modifiers = []
+        self.constraints = []
+        self.particle_systems = []
+        self.material_slots = []
+        self.pass_index = 0
+        self.custom_properties = {}
+
+    def get(self, key, default=None):
+        return self.custom_properties.get(key, default)
+
+    def __setitem__(self, key, value):
+        self.custom_properties[key] = value
+
+    @property
+    def bound_box(self):
+        """The corners of the bounding box of the object's mesh in local space"""
+
+        co = self.data.vertices.co
+        low = co.min(axis=0).tolist()
+        high = co.max(axis=0).tolist()
+        return [(x, y, z) for x in (low[0], high[0]) for y in (low[1], high[1]) for z in (low[2], high[2])]
+
+    @property
+    def matrix_world(self):
+        matrix = Matrix.Translation(self.location + self.delta_location)
+        if self.parent != None:
+            matrix = self.parent.matrix_world @ matrix
+        matrix.owner = self
+        return matrix
+
+    @matrix_world.setter
+    def matrix_world(self, matrix):
+        # Objects are only ever translated, so the location is the offset from the parent
+        location = matrix.translation - self.delta_location
+        if self.parent != None:
+            location = location - self.parent.matrix_world.translation
+        self.location = Vector(location)
+
+
+class MeshVertices():
+    """The vertex coordinates of a mesh"""
+
+    def __init__(self, count):
+        self.co = numpy.zeros((count, 3), dtype=numpy.float32)
+
+    def __len__(self):
+        return len(self.co)
+
+    def foreach_get(self, attr, array):
+        array[:] = self.co.ravel()
+
+    def foreach_set(self, attr, array):
+        self.co[:] = numpy.asarray(array, dtype=numpy.float32).reshape(-1, 3)
+
+
+class Mesh(ID):
+    def __init__(self, name, vertex_count=8):
+        super().__init__(name)
+        self.vertices = MeshVertices(vertex_count)
+        self.is_editmode = False
+
+    def update(self):
+        stats["mesh_updates"] += 1
+
+
+class Camera(ID):
+    def __init__(self, name, camera_type='ORTHO'):
+        super().__init__(name)
+        self.type = camera_type
+        self.ortho_scale = 6.0
+        self.angle = 0.6911
+        self.clip_start = 0.1
+        self.clip_end = 100.0
+
+
+class DataCollection(list):
+    """A list of data-blocks that can also be looked up by name"""
+
+    def get(self, name, default=None):
+        for item in self:
+            if item.name == name:
+                return item
+        return default
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            item = self.get(key)
+            if item == None:
+                raise KeyError(key)
+            return item
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        if isinstance(key, str):
+            return self.get(key) != None
+        return super().__contains__(key)
+
+
+class ObjectCollection(DataCollection):
+    def new(self, name, object_data=None, obj_type='EMPTY', parent=None, location=(0, 0, 0)):
+        obj = Object(name, obj_type, parent, location, object_data)
+        self.append(obj)
+        return obj
+
+
+class CollectionMembers(DataCollection):
+    """The objects or child collections of a collection"""
+
+    def link(self, item):
+        if item in self:
+            raise RuntimeError("'{0}' is already linked".format(item.name))
+        self.append(item)
+
+    def unlink(self, item):
+        self.remove(item)
+
+
+class Collection(ID):
+    def __init__(self, name):
+        super().__init__(name)
+        self.objects = CollectionMembers()
+        self.children = CollectionMembers()
+
+
+class BlendDataCollections(DataCollection):
+    def new(self, name):
+        collection = Collection(name)
+        self.append(collection)
+        return collection
+
+    def remove(self, collection):
+        # Removing a collection unlinks it from every scene
+        for scene in data.scenes:
+            for parent in [scene.collection] + list(self):
+                if collection in parent.children:
+                    parent.children.unlink(collection)
+        super().remove(collection)
+
+
+class ImagePixels():
+    """The float pixels of an image, bottom row first"""
+
+    def __init__(self, size):
+        self.array = numpy.zeros(size, dtype=numpy.float32)
+
+    def foreach_get(self, array):
+        array[:] = self.array
+
+    def foreach_set(self, array):
+        self.array = numpy.array(array, dtype=numpy.float32)
+
+
+class Image(ID):
+    def __init__(self, name, width, height):
+        super().__init__(name)
+        self.size = (width, height)
+        self.pixels = ImagePixels(width * height * 4)
+        self.filepath_raw = ""
+        self.file_format = 'PNG'
+
+    def save(self):
+        _check_not_rendering("Saving an image")
+        width, height = self.size
+        array = self.pixels.array.reshape(height, width, 4)[::-1]
+        write_png(self.filepath_raw, (numpy.clip(array, 0, 1) * 255 + 0.5).astype(numpy.uint8))
+
+
+class ImageCollection(DataCollection):
+    def new(self, name, width, height, alpha=True, float_buffer=False):
+        _check_not_rendering("Creating an image")
+        image = Image(name, width, height)
+        self.append(image)
+        return image
+
+    def load(self, filepath, check_existing=False):
+        _check_not_rendering("Loading an image")
+        stats["image_loads"] += 1
+        array = read_png(filepath)
+        height, width = array.shape[:2]
+        image = self.new(os.path.basename(filepath), width, height)
+        image.pixels.array = (array[::-1].astype(numpy.float32) / 255).ravel()
+        image.filepath_raw = filepath
+        return image
+
+    def remove(self, image):
+        _check_not_rendering("Removing an image")
+        list.remove(self, image)
+
+
+class ImageSettings():
+    def __init__(self):
+        self.file_format = 'PNG'
+        self.color_mode = 'RGBA'
+        self.color_depth = '8'
+        self.compression = 15
+        self.quality = 90
+        self.color_management = 'FOLLOW_SCENE'
+        self.view_settings = ViewSettings()
+
+
+class ViewSettings():
+    def __init__(self):
+        self.view_transform = 'Filmic'
+
+
+class RenderSettings():
+    def __init__(self):
+        self.engine = 'BLENDER_EEVEE'
+        self.filepath = ""
+        self.file_extension = ".png"
+        self.resolution_x = 64
+        self.resolution_y = 64
+        self.resolution_percentage = 100
+        self.fps = 24
+        self.fps_base = 1.0
+        self.use_compositing = False
+        self.use_simplify = False
+        self.simplify_subdivision_render = 6
+        self.simplify_child_particles_render = 1.0
+        self.image_settings = ImageSettings()
+
+
+class LayerCollection():
+    """Whether a collection, and each collection inside it, is excluded from a view layer"""
+
+    def __init__(self, collection):
+        self.name = collection.name
+        self.exclude = False
+        self.children = DataCollection(LayerCollection(child) for child in collection.children)
+
+
+class ViewLayer():
+    def __init__(self, name, scene):
+        self.name = name
+        self.use = True
+        self.layer_collection = LayerCollection(scene.collection)
+        self.use_pass_normal = False
+        self.use_pass_z = False
+        self.use_pass_emit = False
+        self.use_pass_object_index = False
+
+
+# Compositor nodes
+
+class NodeSocket():
+    def __init__(self, node, name):
+        self.node = node
+        self.name = name
+        self.default_value = None
+
+
+class NodeSockets():
+    """The inputs or outputs of a node, looked up by name or index, created when they are first used"""
+
+    def __init__(self, node):
+        self.node = node
+        self.sockets = {}
+
+    def __getitem__(self, key):
+        if key not in self.sockets:
+            self.sockets[key] = NodeSocket(self.node, key)
+        return self.sockets[key]
+
+
+class FileSlot():
+    def __init__(self):
+        self.path = ""
+
+
+class Node():
+    def __init__(self, bl_idname):
+        self.bl_idname = bl_idname
+        self.inputs = NodeSockets(self)
+        self.outputs = NodeSockets(self)
+        self.layer = ""
+        self.base_path = ""
+        self.file_slots = [FileSlot()]
+        self.format = ImageSettings()
+
+
+class NodeLink():
+    def __init__(self, from_socket, to_socket):
+        self.from_socket = from_socket
+        self.to_socket = to_socket
+
+
+class NodeCollection(list):
+    def new(self, bl_idname):
+        node = Node(bl_idname)
+        self.append(node)
+        return node
+
+
+class NodeLinks(list):
+    def new(self, from_socket, to_socket):
+        link = NodeLink(from_socket, to_socket)
+        self.append(link)
+        return link
+
+
+class NodeTree():
+    def __init__(self):
+        self.nodes = NodeCollection()
+        self.links = NodeLinks()
+
+    def find_pass(self, socket):
+        """Return the name of the Render Layers output that a node input is linked to through any other nodes, following the first linked input of each"""
+
+        links = [link for link in self.links if link.to_socket is socket and link.from_socket.node in self.nodes]
+        if not links:
+            return None
+        node = links[0].from_socket.node
+        if node.bl_idname == 'CompositorNodeRLayers':
+            return links[0].from_socket.name
+        linked = [key for key, input_socket in node.inputs.sockets.items()
+            if isinstance(key, int) and any(link.to_socket is input_socket for link in self.links)]
+        return self.find_pass(node.inputs[min(linked)]) if linked else None
+
+
+class Scene(ID):
+    """A scene, the addon properties registered on the class are created for each new scene"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.render = RenderSettings()
+        self.view_settings = ViewSettings()
+        self.frame_current = 1
+        self.camera = None
+        self._use_nodes = False
+        self.node_tree = None
+        self.collection = Collection("Scene Collection")
+        self.view_layers = ViewLayers(self)
+        self.view_layers.new("View Layer")
+        for attr, value in vars(type(self)).items():
+            if isinstance(value, Property) and value.kind == 'POINTER':
+                setattr(self, attr, value.options['type']())
+
+    @property
+    def use_nodes(self):
+        return self._use_nodes
+
+    @use_nodes.setter
+    def use_nodes(self, value):
+        # Blender creates the compositor node tree the first time nodes are used
+        self._use_nodes = value
+        if value and self.node_tree == None:
+            self.node_tree = NodeTree()
+
+    def frame_set(self, frame, subframe=0.0):
+        _check_not_rendering("Changing the frame")
+        stats["frame_sets"] += 1
+        self.frame_current = frame
+
+
+class ViewLayers(DataCollection):
+    def __init__(self, scene):
+        super().__init__()
+        self.scene = scene
+
+    def new(self, name):
+        view_layer = ViewLayer(name, self.scene)
+        self.append(view_layer)
+        return view_layer
+
+
+class SceneCollection(DataCollection):
+    def new(self, name):
+        scene = Scene(name)
+        self.append(scene)
+        return scene
+
+
+class Context():
+    def __init__(self):
+        self.scene = None
+        self.view_layer = None
+        self.window = None
+        self.selected_objects = []
+        self.active_object = None
+
+
+# Images
+
+def write_png(path, array, level=1):
+    """Write an 8-bit RGBA array, first row at the top, as a PNG file with the given zlib compression level"""
+
+    height, width = array.shape[:2]
+
+    def chunk(chunk_type, data):
+        return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff)
+
+    # Each row starts with filter type 0
+    raw = numpy.zeros((height, width * 4 + 1), dtype=numpy.uint8)
+    raw[:, 1:] = array.reshape(height, width * 4)
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(raw.tobytes(), level)) + chunk(b'IEND', b''))
+
+
+def read_png(path):
+    """Read a PNG file written by write_png(), an 8-bit RGBA PNG using the Up row filter, or an 8-bit indexed PNG without row filters, as an RGBA array"""
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    position = 8
+    width = height = None
+    palette = None
+    alpha = b''
+    compressed = b''
+    while position < len(data):
+        length, chunk_type = struct.unpack('>I4s', data[position:position + 8])
+        body = data[position + 8:position + 8 + length]
+        if chunk_type == b'IHDR':
+            width, height, depth, colour_type = struct.unpack('>IIBB', body[:10])
+            if depth != 8 or colour_type not in (3, 6):
+                raise ValueError("{0} is not an 8-bit RGBA or indexed PNG".format(path))
+        elif chunk_type == b'PLTE':
+            palette = numpy.full((len(body) // 3, 4), 255, dtype=numpy.uint8)
+            palette[:, :3] = numpy.frombuffer(body, dtype=numpy.uint8).reshape(-1, 3)
+        elif chunk_type == b'tRNS':
+            alpha = body
+        elif chunk_type == b'IDAT':
+            compressed += body
+        position += length + 12
+    channels = 4 if palette is None else 1
+    raw = numpy.frombuffer(zlib.decompress(compressed), dtype=numpy.uint8).reshape(height, width * channels + 1)
+    if palette is None and (raw[:, 0] == 2).all():
+        # Each row of the Up filter holds the difference from the row above
+        raw = raw.copy()
+        raw[:, 0] = 0
+        raw[:, 1:] = numpy.cumsum(raw[:, 1:], axis=0, dtype=numpy.uint8)
+    if raw[:, 0].any():
+        raise ValueError("{0} uses PNG row filters, which are not supported".format(path))
+    if palette is not None:
+        palette[:len(alpha), 3] = numpy.frombuffer(alpha, dtype=numpy.uint8)
+        return palette[raw[:, 1:]]
+    return raw[:, 1:].reshape(height, width, 4).copy()
+
+
+_frame_images = {}
+
+# The (scene, write_still, render path) of the render started with 'INVOKE_DEFAULT' that finish_render() has not ended yet
+_running_render = None
+
+
+def _check_not_rendering(action):
+    """Raise an error if a render is running, as Blender's render job is using the scene and its data"""
+
+    if _running_render != None:
+        raise RuntimeError("{0} while a render is running".format(action))
+
+
+def render(execution_context=None, write_still=False, scene=None, **kwargs):
+    """Stands in for bpy.ops.render.render(), writing a fixed image of the render size to the render path
+    Renders started with 'INVOKE_DEFAULT' keep running until finish_render() is called, and no other render can start until then
+    """
+
+    global _running_render
+
+    if _running_render != None:
+        return {'CANCELLED'}
+
+    scn = data.scenes[scene] if scene != None else context.scene
+    stats["renders"] += 1
+    if execution_context == 'INVOKE_DEFAULT':
+        _running_render = (scn, write_still, scn.render.filepath)
+        return {'RUNNING_MODAL'}
+
+    write_render(scn, write_still, scn.render.filepath)
+    return {'FINISHED'}
+
+
+def finish_render(cancel=False):
+    """End the render started with 'INVOKE_DEFAULT', writing its image unless it is cancelled, then call the render_complete or render_cancel handlers"""
+
+    global _running_render
+
+    scn, write_still, filepath = _running_render
+    _running_render = None
+    if not cancel:
+        write_render(scn, write_still, filepath)
+
+    handlers = sys.modules['bpy'].app.handlers
+    for handler in list(handlers.render_cancel if cancel else handlers.render_complete):
+        handler(scn)
+
+
+def write_render(scn, write_still, filepath):
+    """Write the image of a render, and the image of each File Output node of the compositor with the frame number added to its path"""
+
+    if not write_renders:
+        return
+
+    width = scn.render.resolution_x * scn.render.resolution_percentage // 100
+    height = scn.render.resolution_y * scn.render.resolution_percentage // 100
+    if (width, height) not in _frame_images:
+        image = numpy.zeros((height, width, 4), dtype=numpy.uint8)
+        image[height // 4:height * 3 // 4, width // 4:width * 3 // 4] = (200, 120, 40, 255)
+        _frame_images[(width, height)] = image
+    image = _frame_images[(width, height)]
+    # Blender's compression percentage maps onto the zlib levels
+    level = scn.render.image_settings.compression * 9 // 100
+
+    if write_still:
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        write_png(filepath, image, level)
+
+    if scn.use_nodes and scn.render.use_compositing:
+        tree = scn.node_tree
+        for node in tree.nodes:
+            if node.bl_idname != 'CompositorNodeOutputFile':
+                continue
+            output = image
+            if tree.find_pass(node.inputs[0]) == 'IndexOB':
+                output = numpy.zeros_like(image)
+                output[..., 0] = 1
+                output[:, width // 2:, 0] = 2
+                output[..., 3] = image[..., 3]
+                output[output[..., 3] == 0] = 0
+            path = "{0}{1:04d}{2}".format(os.path.join(node.base_path, node.file_slots[0].path), scn.frame_current, scn.render.file_extension)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_png(path, output, level)
+
+
+# Modules
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    return module
+
+
+data = _module('bpy.data',
+    objects=ObjectCollection(),
+    scenes=SceneCollection(),
+    collections=BlendDataCollections(),
+    images=ImageCollection(),
+    is_saved=True,
+    is_dirty=False,
+    filepath="")
+
+context = Context()
+
+
+def reset():
+    """Remove every object, scene and image, and create a new scene as the context scene"""
+
+    global _running_render
+
+    _running_render = None
+    del data.objects[:]
+    del data.scenes[:]
+    del data.collections[:]
+    del data.images[:]
+    for key in stats:
+        stats[key] = 0
+    context.scene = data.scenes.new("Scene")
+    context.view_layer = context.scene.view_layers[0]
+    return context.scene
+
+
+def install():
+    """Add the fake bpy, mathutils and bmesh modules to sys.modules"""
+
+    props = _module('bpy.props', **{name: _property_function(kind) for name, kind in (
+        ('IntProperty', 'INT'),
+        ('FloatProperty', 'FLOAT'),
+        ('FloatVectorProperty', 'FLOAT_VECTOR'),
+        ('BoolProperty', 'BOOL'),
+        ('StringProperty', 'STRING'),
+        ('EnumProperty', 'ENUM'),
+        ('PointerProperty', 'POINTER'),
+        ('CollectionProperty', 'COLLECTION'))})
+
+    bpy_types = _module('bpy.types',
+        ID=ID, Object=Object, Mesh=Mesh, Scene=Scene, Image=Image, Action=Action,
+        PropertyGroup=PropertyGroup, Operator=Operator, Panel=Panel, Menu=Menu)
+
+    ops = _module('bpy.ops', render=_module('bpy.ops.render', render=render))
+
+    utils = _module('bpy.utils',
+        register_class=lambda cls: None,
+        unregister_class=lambda cls: None)
+
+    app = _module('bpy.app', handlers=_module('bpy.app.handlers', load_post=[], render_complete=[], render_cancel=[],
+        persistent=lambda function: function))
+
+    bpy = _module('bpy', app=app, props=props, types=bpy_types, ops=ops, utils=utils, data=data, context=context)
+
+    sys.modules['bpy'] = bpy
+    sys.modules['mathutils'] = _module('mathutils', Vector=Vector, Matrix=Matrix, Euler=Euler)
+    sys.modules['bmesh'] = _module('bmesh')
+    reset()
+    return bpy
+
+
+def import_addon():
+    """Import and register the addon package from the folder above this one, then reset the data"""
+
+    package_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if os.path.dirname(package_folder) not in sys.path:
+        sys.path.insert(0, os.path.dirname(package_folder))
+    addon = importlib.import_module(os.path.basename(package_folder))
+    addon.register()
+    # Scenes created before registering do not have the addon properties
+    reset()
+    return addon
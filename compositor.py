@@ -0,0 +1,1275 @@
+import os
+import math
+import base64
+import hashlib
+import json
+import struct
+import zlib
+import collections
+import concurrent.futures
+import fractions
+import importlib
+import importlib.util
+import bpy
+
+
+class LazyModule():
+    """Stands in for a module, importing it the first time one of its attributes is used"""
+
+    # The name of the module and the module once it has been imported
+    module_name = None
+    module = None
+
+    def __init__(self, module_name):
+        self.module_name = module_name
+
+    def __getattr__(self, attr):
+        if self.module == None:
+            self.module = importlib.import_module(self.module_name)
+        return getattr(self.module, attr)
+
+
+# NumPy and Pillow take far longer to import than the addon itself, so they are only imported once images are processed
+# Checking that they are installed only searches for them
+pil_installed = importlib.util.find_spec('PIL') != None
+Image = LazyModule('PIL.Image')
+features = LazyModule('PIL.features')
+
+numpy_installed = importlib.util.find_spec('numpy') != None
+numpy = LazyModule('numpy')
+
+
+class PillowBackend():
+    """Assembles sprite sheets as Pillow images.
+    Requires Pillow to be installed in Blender's Python.
+    """
+
+    name = 'PILLOW'
+
+    # Whether save() can be called from a background thread, Pillow does not use bpy
+    threaded_save = True
+
+    def load(self, path):
+        """Open an image file"""
+        return Image.open(path)
+
+    def size(self, image):
+        """Return the (width, height) of an image"""
+        return image.size
+
+    def new(self, width, height):
+        """Create an empty transparent sheet"""
+        return Image.new('RGBA', (width, height))
+
+    def paste(self, sheet, image, x, y):
+        """Copy an image into a sheet with its top left corner at x, y"""
+        sheet.paste(image, (x, y))
+
+    def save(self, sheet, path):
+        """Write a sheet to disk, the format is taken from the file extension"""
+        sheet.save(path)
+
+    def release(self, image):
+        """Free the memory used by an image or sheet"""
+        image.close()
+
+    def digest(self, image):
+        """Return a hash of the size and pixels of an image"""
+
+        h = hashlib.sha256("{0} {1} {2}".format(image.mode, *image.size).encode())
+        h.update(image.tobytes())
+        return h.hexdigest()
+
+    def to_array(self, image):
+        """Convert an image to a uint8 RGBA array, requires NumPy"""
+        return numpy.asarray(image.convert('RGBA'))
+
+    def from_array(self, array):
+        """Convert a uint8 RGBA array to an image"""
+        return Image.fromarray(numpy.ascontiguousarray(array), 'RGBA')
+
+
+class NumpyBackend():
+    """Assembles sprite sheets as NumPy arrays.
+    Images are read and written through bpy.data.images, so only the NumPy module bundled with Blender is needed.
+    Images are held as uint8 RGBA arrays of shape (height, width, 4) with the first row at the top of the image.
+    """
+
+    name = 'NUMPY'
+
+    # The Blender file format used when saving, eg 'PNG'
+    file_format = None
+    # Whether save() can be called from a background thread, PNG files are written without bpy
+    threaded_save = False
+
+    def __init__(self, file_format='PNG'):
+        self.file_format = file_format
+        self.threaded_save = file_format == 'PNG'
+
+    def load(self, path):
+        """Read an image file into an array"""
+
+        image = bpy.data.images.load(path, check_existing=False)
+        width, height = image.size
+        pixels = numpy.empty(width * height * 4, dtype=numpy.float32)
+        try:
+            image.pixels.foreach_get(pixels)
+        except AttributeError:
+            # foreach_get is not available on image pixels before Blender 2.83
+            pixels[:] = image.pixels[:]
+        bpy.data.images.remove(image)
+
+        # Blender stores rows from bottom to top, flip them so that row 0 is the top of the image
+        pixels = pixels.reshape(height, width, 4)[::-1]
+        return (pixels * 255 + 0.5).astype(numpy.uint8)
+
+    def size(self, image):
+        """Return the (width, height) of an image"""
+        return (image.shape[1], image.shape[0])
+
+    def new(self, width, height):
+        """Create an empty transparent sheet"""
+        return numpy.zeros((height, width, 4), dtype=numpy.uint8)
+
+    def paste(self, sheet, image, x, y):
+        """Copy an image into a sheet with its top left corner at x, y"""
+        height, width = image.shape[:2]
+        sheet[y:y + height, x:x + width] = image
+
+    def save(self, sheet, path):
+        """Write a sheet to disk, through Blender's image API for formats other than PNG"""
+
+        if self.file_format == 'PNG':
+            write_png(path, sheet)
+            return
+
+        height, width = sheet.shape[:2]
+        image = bpy.data.images.new(os.path.basename(path), width, height, alpha=True)
+        pixels = sheet[::-1].astype(numpy.float32).ravel()
+        pixels /= 255
+        try:
+            image.pixels.foreach_set(pixels)
+        except AttributeError:
+            image.pixels[:] = pixels
+        image.filepath_raw = path
+        image.file_format = self.file_format
+        image.save()
+        bpy.data.images.remove(image)
+
+    def release(self, image):
+        """Arrays are freed once they are no longer referenced"""
+        pass
+
+    def digest(self, image):
+        """Return a hash of the size, pixels and file format of an image"""
+
+        h = hashlib.sha256("{0} {1} {2}".format(self.file_format, *image.shape).encode())
+        h.update(numpy.ascontiguousarray(image).data)
+        return h.hexdigest()
+
+    def to_array(self, image):
+        """Images are already arrays"""
+        return image
+
+    def from_array(self, array):
+        """Images are already arrays"""
+        return array
+
+
+class StoredImageBackend():
+    """Wraps an image backend so that images held in a FrameStore are loaded from it
+    If store_saves is True, saved images are also written to the store, and if save_files is False they are only written to the store
+    """
+
+    # The wrapped backend and the FrameStore
+    backend = None
+    store = None
+    store_saves = False
+    save_files = True
+
+    def __init__(self, backend, store, store_saves=False, save_files=True):
+        self.backend = backend
+        self.store = store
+        self.store_saves = store_saves
+        self.save_files = save_files
+
+    def __getattr__(self, attr):
+        return getattr(self.backend, attr)
+
+    def load(self, path):
+        """Load an image from the store if it is held there, otherwise from its file"""
+
+        if path in self.store:
+            return self.backend.from_array(self.store.read(path))
+        return self.backend.load(path)
+
+    def save(self, sheet, path):
+        """Save a sheet to disk, to the store, or to both"""
+
+        if self.save_files:
+            self.backend.save(sheet, path)
+        if self.store_saves:
+            self.store.write(path, self.backend.to_array(sheet))
+
+
+def get_image_backend(name='AUTO', file_format='PNG'):
+    """Return a backend for assembling sprite sheets, or None if none are available.
+    AUTO prefers NumPy, as it ships with Blender, and falls back to Pillow.
+    """
+
+    if name in ('AUTO', 'NUMPY') and numpy_installed:
+        return NumpyBackend(file_format)
+    if name in ('AUTO', 'PILLOW') and pil_installed:
+        return PillowBackend()
+    return None
+
+
+def mirror_image(image, normal_axis=None):
+    """Flip a uint8 RGBA array horizontally.
+    If normal_axis is given the colours are treated as normals mapped into the 0 to 1 range,
+    and each normal is reflected in the plane perpendicular to normal_axis to match the mirrored geometry.
+    """
+
+    mirrored = image[:, ::-1].copy()
+
+    if normal_axis is not None:
+        axis = numpy.asarray(normal_axis, dtype=numpy.float32)
+        normals = mirrored[..., :3].astype(numpy.float32) / 127.5 - 1
+        normals -= 2 * (normals @ axis)[..., None] * axis
+        mirrored[..., :3] = numpy.clip((normals + 1) * 127.5 + 0.5, 0, 255).astype(numpy.uint8)
+
+    return mirrored
+
+
+def read_image_size(backend, path):
+    """Return the (width, height) of an image file.
+    Only the header is read for PNG files, other formats are loaded through the backend.
+    """
+
+    with open(path, 'rb') as f:
+        header = f.read(24)
+    if header[:8] == b'\x89PNG\r\n\x1a\n' and header[12:16] == b'IHDR':
+        return struct.unpack('>II', header[16:24])
+
+    image = backend.load(path)
+    size = backend.size(image)
+    backend.release(image)
+    return size
+
+
+def wrap_rows(sizes, indexes, max_width, max_count=None):
+    """Split a list of image indexes into rows no wider than max_width, and with no more than max_count images"""
+
+    rows = []
+    row = []
+    row_width = 0
+    for index in indexes:
+        width = sizes[index][0]
+        if row and (row_width + width > max_width or (max_count != None and len(row) >= max_count)):
+            rows.append(row)
+            row = []
+            row_width = 0
+        row.append(index)
+        row_width += width
+    if row:
+        rows.append(row)
+    return rows
+
+
+def pack_rows(sizes, rows):
+    """Place rows of images one below another, returning the page as (width, height, [(image index, x, y), ...])"""
+
+    cells = []
+    page_width = 0
+    y = 0
+    for row in rows:
+        x = 0
+        for index in row:
+            cells.append((index, x, y))
+            x += sizes[index][0]
+        page_width = max(page_width, x)
+        y += max(sizes[index][1] for index in row)
+    return (page_width, y, cells)
+
+
+def layout_pages(sizes, direction, max_size=0):
+    """Arrange images one after another in the given direction, returning a list of pages.
+    Each page is (width, height, [(image index, x, y), ...]).
+
+    If max_size is set and the images do not fit in a single strip they are wrapped into rows (HORIZONTAL) or columns (VERTICAL),
+    and split across as few pages as possible so that no page is wider or taller than max_size.
+    The images are shared evenly between the pages, and between the rows or columns of each page.
+    """
+
+    # Vertical layouts are horizontal layouts with the axes swapped
+    if direction == 'VERTICAL':
+        pages = layout_pages([(height, width) for width, height in sizes], 'HORIZONTAL', max_size)
+        return [(height, width, [(index, y, x) for index, x, y in cells]) for width, height, cells in pages]
+
+    indexes = list(range(len(sizes)))
+
+    if max_size <= 0 or (sum(size[0] for size in sizes) <= max_size and max(size[1] for size in sizes) <= max_size):
+        return [pack_rows(sizes, [indexes])]
+
+    # Start from the number of pages needed when filling each row and page in turn
+    page_count = 1
+    page_height = 0
+    for row in wrap_rows(sizes, indexes, max_size):
+        row_height = max(sizes[index][1] for index in row)
+        if page_height and page_height + row_height > max_size:
+            page_count += 1
+            page_height = 0
+        page_height += row_height
+
+    while True:
+        page_size = math.ceil(len(indexes) / page_count)
+        pages = []
+        for start in range(0, len(indexes), page_size):
+            page_indexes = indexes[start:start + page_size]
+            # Balance the number of images in each row
+            row_count = len(wrap_rows(sizes, page_indexes, max_size))
+            rows = wrap_rows(sizes, page_indexes, max_size, math.ceil(len(page_indexes) / row_count))
+            page = pack_rows(sizes, rows)
+            if page[1] > max_size and len(page_indexes) > 1:
+                break
+            pages.append(page)
+        else:
+            return pages
+        page_count += 1
+
+
+def build_page(backend, image_paths, page, output_path, keep=False, digests=None):
+    """Create a single page as returned by layout_pages() from the list of image files it was laid out from
+    Only the images on the page are loaded, and each is released once it has been copied
+    If keep is True the page is returned as a uint8 RGBA array, requires NumPy
+    If digests is an OutputDigests the page is only saved if it differs from the file already at output_path
+    """
+
+    page_width, page_height, cells = page
+    output_image = backend.new(page_width, page_height)
+
+    for index, x, y in cells:
+        img = backend.load(image_paths[index])
+        backend.paste(output_image, img, x, y)
+        backend.release(img)
+
+    if digests != None:
+        # The backends encode files differently, eg Pillow takes the format from the file extension
+        digest = "{0} {1} {2}".format(backend.name, os.path.splitext(output_path)[1].lower(), backend.digest(output_image))
+        digests.write_image(output_path, digest, lambda: backend.save(output_image, output_path))
+    else:
+        backend.save(output_image, output_path)
+    array = numpy.array(backend.to_array(output_image)) if keep else None
+    backend.release(output_image)
+
+    return array
+
+
+def get_file_stat(path):
+    """Return the (size, modification time) of a file, or None if it does not exist"""
+
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+class FrameStore():
+    """Holds images as raw RGBA pixels in a single file, so they are decoded at most once and intermediate images are never encoded.
+    Each image is written to a slot at the end of the file, and an index records the slot's offset and size by the path of the image file.
+    The image file may exist alongside its slot, such as a render saved by Blender, and the slot is only used while the file is unchanged.
+    Images are read as read-only memory mapped arrays, so they are not copied until they are used. Requires NumPy.
+    The store is temporary, and is deleted when it is closed.
+    """
+
+    # The path of the store and the open file
+    path = None
+    file = None
+
+    # The (offset, width, height, file stat) of each image by normalised path, and the end of the file
+    index = None
+    offset = 0
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'w+b')
+        self.index = {}
+        self.offset = 0
+
+    def __contains__(self, path):
+        path = os.path.normpath(path)
+        return path in self.index and self.index[path][3] == get_file_stat(path)
+
+    def paths_in(self, folder):
+        """Return the paths of the images held for a folder that have no image file"""
+
+        folder = os.path.normpath(folder)
+        return [path for path in self.index if os.path.dirname(path) == folder and self.index[path][3] == None and path in self]
+
+    def size(self, path):
+        """Return the (width, height) of an image"""
+
+        offset, width, height, stat = self.index[os.path.normpath(path)]
+        return (width, height)
+
+    def write(self, path, image):
+        """Write a uint8 RGBA array to a new slot, once any file at path has been written"""
+
+        image = numpy.ascontiguousarray(image, dtype=numpy.uint8)
+        height, width = image.shape[:2]
+        self.file.write(image.data)
+        self.index[os.path.normpath(path)] = (self.offset, width, height, get_file_stat(path))
+        self.offset += image.nbytes
+
+    def read(self, path):
+        """Return an image as a read-only array mapped from the store"""
+
+        offset, width, height, stat = self.index[os.path.normpath(path)]
+        self.file.flush()
+        return numpy.memmap(self.file, dtype=numpy.uint8, mode='r', offset=offset, shape=(height, width, 4))
+
+    def remove(self, path):
+        """Remove an image from the index, its slot is only freed when the store is closed"""
+
+        self.index.pop(os.path.normpath(path), None)
+
+    def close(self):
+        """Close and delete the store"""
+
+        self.file.close()
+        self.index = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            # Windows does not delete files that are still mapped
+            print("{0}\nThe frame store could not be deleted.".format(self.path))
+
+
+class OutputDigests():
+    """Records a hash of the content of each output file, so that files identical to the last build are not written again.
+    Engines reimport assets whose modification time changes, so an unchanged file keeps its timestamp.
+    The hashes are saved in a JSON file in the output folder with the size and modification time of each file,
+    so a file that has been changed or replaced since it was written is always written again.
+    encoding describes the settings images are encoded with, such as the file format, colour depth and compression,
+    and is part of the hash of every image, so changing any of them writes every image again.
+    """
+
+    FILE_NAME = '.sprite_digests.json'
+
+    # The folder the paths are stored relative to, and the record of each file by relative path
+    folder = None
+    records = None
+
+    # The encode settings of the images, see write_image()
+    encoding = ""
+
+    # The paths of the files written and skipped
+    changed = None
+    unchanged = None
+
+    def __init__(self, folder, encoding=""):
+        self.folder = folder
+        self.encoding = encoding
+        self.records = {}
+        self.changed = []
+        self.unchanged = []
+
+        try:
+            with open(os.path.join(folder, self.FILE_NAME)) as f:
+                self.records = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def write(self, path, digest, save):
+        """Call save() to write the file at path unless it already has the content hashed by digest
+        Returns True if the file was written
+        """
+
+        key = os.path.relpath(path, self.folder)
+        record = self.records.get(key)
+        if record != None and record["digest"] == digest:
+            try:
+                stat = os.stat(path)
+                if stat.st_size == record["size"] and stat.st_mtime_ns == record["mtime"]:
+                    self.unchanged.append(path)
+                    return False
+            except OSError:
+                pass
+
+        save()
+        stat = os.stat(path)
+        self.records[key] = {"digest": digest, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+        self.changed.append(path)
+        return True
+
+    def write_image(self, path, digest, save):
+        """Call save() to write an image file unless it already has the pixels hashed by digest and was encoded with the same settings
+        Returns True if the file was written
+        """
+
+        return self.write(path, hashlib.sha256("{0}\n{1}".format(self.encoding, digest).encode('utf-8')).hexdigest(), save)
+
+    def write_text(self, path, text):
+        """Write a text file unless it already has this content, returns True if it was written"""
+
+        data = text.encode('utf-8')
+
+        def save():
+            with open(path, 'wb') as f:
+                f.write(data)
+
+        return self.write(path, hashlib.sha256(data).hexdigest(), save)
+
+    def save(self):
+        """Save the records of the files that still exist
+        Intermediate files that have since been removed are also dropped from the changed and unchanged lists
+        """
+
+        self.changed = [path for path in self.changed if os.path.isfile(path)]
+        self.unchanged = [path for path in self.unchanged if os.path.isfile(path)]
+        records = {key: record for key, record in self.records.items() if os.path.isfile(os.path.join(self.folder, key))}
+        with open(os.path.join(self.folder, self.FILE_NAME), 'w') as f:
+            json.dump(records, f, indent=4, sort_keys=True)
+
+
+def build_indexed_page(backend, image_paths, page, output_path, mapper, keep=False, digests=None):
+    """Create a page like build_page(), mapping each image to the palette of a PaletteMapper as it is loaded, and save it as an indexed PNG
+    The page is only held as one byte per pixel. If keep is True the page is returned as a uint8 RGBA array of the palette colours
+    """
+
+    page_width, page_height, cells = page
+    indexes = numpy.zeros((page_height, page_width), dtype=numpy.uint8)
+
+    for index, x, y in cells:
+        img = backend.load(image_paths[index])
+        image = backend.to_array(img)
+        height, width = image.shape[:2]
+        indexes[y:y + height, x:x + width] = mapper.map(image)
+        backend.release(img)
+
+    if digests != None:
+        h = hashlib.sha256("INDEXED {0} {1}".format(page_width, page_height).encode())
+        h.update(mapper.palette.tobytes())
+        h.update(indexes.data)
+        digests.write_image(output_path, h.hexdigest(), lambda: write_indexed_png(output_path, indexes, mapper.palette))
+    else:
+        write_indexed_png(output_path, indexes, mapper.palette)
+
+    return mapper.palette[indexes] if keep else None
+
+
+def process_images(backend, image_paths, function, save, batch_size=16, workers=None, load=None):
+    """Load images, process them in a pool of worker threads, and save the results.
+
+    Images of the same size are stacked into batches of up to batch_size, and function is called with a uint8 array of shape (n, height, width, 4).
+    function must return a sequence of n results, which are passed to save(image_path, result) in the same order as the batch.
+    If load is given, load(image_path) is used to get the array of each image in place of the backend, and may add channels.
+    Loading and saving are done on the calling thread as bpy is not thread safe, so function must only use NumPy.
+    """
+
+    if workers == None:
+        workers = os.cpu_count() or 1
+
+    if load == None:
+        def load(image_path):
+            image = backend.load(image_path)
+            array = numpy.array(backend.to_array(image))
+            backend.release(image)
+            return array
+
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        # Batches waiting to be filled, by image size
+        batches = {}
+        # Batches being processed, in the order they were submitted
+        pending = collections.deque()
+
+        def submit(batch_paths, batch_images):
+            pending.append((batch_paths, pool.submit(function, numpy.stack(batch_images))))
+            # Limit the number of batches held in memory
+            while len(pending) > workers * 2:
+                collect(*pending.popleft())
+
+        def collect(batch_paths, future):
+            for image_path, result in zip(batch_paths, future.result()):
+                save(image_path, result)
+
+        for image_path in image_paths:
+            array = load(image_path)
+            batch_paths, batch_images = batches.setdefault(array.shape, ([], []))
+            batch_paths.append(image_path)
+            batch_images.append(array)
+            if len(batch_images) >= batch_size:
+                del batches[array.shape]
+                submit(batch_paths, batch_images)
+
+        for batch_paths, batch_images in batches.values():
+            submit(batch_paths, batch_images)
+        while pending:
+            collect(*pending.popleft())
+
+
+# The filters that can be used to resize images
+# Each kernel takes the distance from the centre of an output pixel in input pixels, scaled by the reduction in size
+RESAMPLE_KERNELS = {
+    'BILINEAR': (1, lambda d: numpy.maximum(0, 1 - numpy.abs(d))),
+    'LANCZOS': (3, lambda d: numpy.where(numpy.abs(d) < 3, numpy.sinc(d) * numpy.sinc(d / 3), 0))}
+
+
+def get_resample_weights(source_size, target_size, resample_filter):
+    """Return a (target_size, source_size) matrix, where each row holds the weights of the input pixels for one output pixel"""
+
+    scale = source_size / target_size
+    centres = (numpy.arange(target_size) + 0.5) * scale
+    pixels = numpy.arange(source_size)
+
+    if resample_filter == 'AREA':
+        # The fraction of each input pixel covered by the output pixel
+        left = numpy.maximum(pixels[None, :], (centres - scale / 2)[:, None])
+        right = numpy.minimum(pixels[None, :] + 1, (centres + scale / 2)[:, None])
+        weights = numpy.maximum(0, right - left)
+    else:
+        kernel = RESAMPLE_KERNELS[resample_filter][1]
+        weights = kernel((pixels[None, :] + 0.5 - centres[:, None]) / max(scale, 1))
+
+    return (weights / weights.sum(axis=1, keepdims=True)).astype(numpy.float32)
+
+
+def resample_images(images, width, height, resample_filter='AREA'):
+    """Resize a batch of uint8 RGBA images of shape (n, height, width, 4).
+    resample_filter is one of NEAREST, BILINEAR, AREA or LANCZOS.
+    Colours are weighted by alpha so that transparent pixels do not bleed into the edges of the sprite.
+    """
+
+    source_height, source_width = images.shape[1:3]
+
+    if resample_filter == 'NEAREST':
+        rows = ((numpy.arange(height) + 0.5) * source_height / height).astype(numpy.intp)
+        columns = ((numpy.arange(width) + 0.5) * source_width / width).astype(numpy.intp)
+        return images[:, rows][:, :, columns]
+
+    pixels = images.astype(numpy.float32)
+    pixels[..., :3] *= pixels[..., 3:] / 255
+
+    # Resize the rows, then the columns
+    row_weights = get_resample_weights(source_height, height, resample_filter)
+    column_weights = get_resample_weights(source_width, width, resample_filter)
+    pixels = numpy.matmul(row_weights, pixels.reshape(len(images), source_height, -1)).reshape(len(images), height, source_width, 4)
+    pixels = numpy.moveaxis(numpy.tensordot(pixels, column_weights, axes=([2], [1])), 3, 2)
+
+    alpha = pixels[..., 3:]
+    pixels[..., :3] = numpy.divide(pixels[..., :3] * 255, alpha, out=numpy.zeros_like(pixels[..., :3]), where=alpha > 0)
+
+    return numpy.clip(pixels + 0.5, 0, 255).astype(numpy.uint8)
+
+
+def find_dirty_rects(previous, current, tile_size=8):
+    """Return the (x, y, width, height) rectangles covering every pixel that differs between two uint8 RGBA arrays of the same size.
+    Changed pixels are found on a grid of tiles, runs of changed tiles in each row of tiles are joined,
+    and runs covering the same columns in consecutive rows are joined into one rectangle.
+    Each rectangle is then trimmed to the changed pixels inside it.
+    """
+
+    height, width = current.shape[:2]
+    changed = (previous != current).any(axis=2)
+    if not changed.any():
+        return []
+
+    # Pad the image to a whole number of tiles, then find the tiles containing a change
+    rows = -(-height // tile_size)
+    columns = -(-width // tile_size)
+    padded = numpy.zeros((rows * tile_size, columns * tile_size), dtype=bool)
+    padded[:height, :width] = changed
+    tiles = padded.reshape(rows, tile_size, columns, tile_size).any(axis=(1, 3))
+
+    # Runs of changed tiles in each row, as (first column, last column + 1)
+    edges = numpy.diff(numpy.pad(tiles.astype(numpy.int8), ((0, 0), (1, 1))), axis=1)
+    open_rects = {}
+    rects = []
+    for row in range(rows):
+        starts = numpy.flatnonzero(edges[row] == 1)
+        ends = numpy.flatnonzero(edges[row] == -1)
+        runs = set(zip(starts.tolist(), ends.tolist()))
+        # Close the rectangles that do not continue into this row
+        for run in list(open_rects):
+            if run not in runs:
+                rects.append((run, open_rects.pop(run), row))
+        for run in runs:
+            open_rects.setdefault(run, row)
+    for run, first_row in open_rects.items():
+        rects.append((run, first_row, rows))
+
+    trimmed = []
+    for (first_column, end_column), first_row, end_row in sorted(rects, key=lambda r: (r[1], r[0])):
+        x, y = first_column * tile_size, first_row * tile_size
+        region = changed[y:end_row * tile_size, x:end_column * tile_size]
+        changed_rows = numpy.flatnonzero(region.any(axis=1))
+        changed_columns = numpy.flatnonzero(region.any(axis=0))
+        trimmed.append((x + int(changed_columns[0]), y + int(changed_rows[0]),
+            int(changed_columns[-1] - changed_columns[0]) + 1, int(changed_rows[-1] - changed_rows[0]) + 1))
+
+    return trimmed
+
+
+def composite_over(top, bottom):
+    """Draw a batch of uint8 RGBA images over another batch of the same shape, returning the result as uint8"""
+
+    top = top.astype(numpy.float32) / 255
+    bottom = bottom.astype(numpy.float32) / 255
+    top_alpha = top[..., 3:]
+    bottom_alpha = bottom[..., 3:] * (1 - top_alpha)
+    alpha = top_alpha + bottom_alpha
+
+    result = numpy.empty_like(top)
+    result[..., :3] = numpy.divide(top[..., :3] * top_alpha + bottom[..., :3] * bottom_alpha, alpha,
+        out=numpy.zeros_like(top[..., :3]), where=alpha > 0)
+    result[..., 3:] = alpha
+
+    return (result * 255 + 0.5).astype(numpy.uint8)
+
+
+def shift_images(array, x, y):
+    """Move the contents of a batch of arrays of shape (n, height, width, ...) right by x and down by y pixels
+    Pixels moved off the edge are lost, and uncovered pixels are zero
+    """
+
+    height, width = array.shape[1:3]
+    result = numpy.zeros_like(array)
+    if abs(x) >= width or abs(y) >= height:
+        return result
+
+    result[:, max(y, 0):height + min(y, 0), max(x, 0):width + min(x, 0)] = array[:, max(-y, 0):height - max(y, 0), max(-x, 0):width - max(x, 0)]
+    return result
+
+
+def add_outline(images, colour, width=1):
+    """Draw an outline around the sprite in a batch of uint8 RGBA images of shape (n, height, width, 4).
+    The outline is drawn behind the sprite, width pixels out from every pixel that is at least half opaque, in the RGBA colour given as 0 to 255.
+    """
+
+    shape = images[..., 3] >= 128
+    grown = shape.copy()
+    for i in range(width):
+        # Grow by one pixel in each of the four directions
+        step = grown.copy()
+        step[:, 1:] |= grown[:, :-1]
+        step[:, :-1] |= grown[:, 1:]
+        step[:, :, 1:] |= grown[:, :, :-1]
+        step[:, :, :-1] |= grown[:, :, 1:]
+        grown = step
+
+    outline = numpy.zeros_like(images)
+    outline[grown] = colour
+
+    return composite_over(images, outline)
+
+
+def add_drop_shadow(images, colour, x, y):
+    """Draw a shadow of the sprite behind a batch of uint8 RGBA images of shape (n, height, width, 4).
+    The shadow is the alpha of the sprite moved right by x and down by y pixels, in the RGBA colour given as 0 to 255.
+    """
+
+    shadow = numpy.empty_like(images)
+    shadow[..., :3] = colour[:3]
+    alpha = shift_images(images[..., 3], x, y).astype(numpy.uint16) * colour[3]
+    shadow[..., 3] = (alpha + 127) // 255
+
+    return composite_over(images, shadow)
+
+
+def clamp_colours(images, levels):
+    """Round each colour channel of a batch of uint8 RGBA images to the given number of evenly spaced levels.
+    Alpha is rounded to fully transparent or fully opaque, as pixel art has hard edges.
+    """
+
+    # Look up the rounded value of each of the 256 possible values
+    step = 255 / (levels - 1)
+    table = (numpy.round(numpy.arange(256) / step) * step + 0.5).astype(numpy.uint8)
+
+    opaque = images[..., 3] >= 128
+    result = numpy.zeros_like(images)
+    result[..., :3] = table[images[..., :3]] * opaque[..., numpy.newaxis]
+    result[..., 3] = opaque * numpy.uint8(255)
+
+    return result
+
+
+def rgb_to_hsv(rgb):
+    """Convert an array of RGB colours in the last axis, from 0 to 1, to hue, saturation and value from 0 to 1"""
+
+    maxc = rgb.max(axis=-1)
+    delta = maxc - rgb.min(axis=-1)
+    safe_delta = numpy.where(delta > 0, delta, 1)
+    rc, gc, bc = [(maxc - rgb[..., i]) / safe_delta for i in range(3)]
+
+    hue = numpy.where(rgb[..., 0] == maxc, bc - gc, numpy.where(rgb[..., 1] == maxc, 2 + rc - bc, 4 + gc - rc))
+    hue = numpy.where(delta > 0, (hue / 6) % 1, 0)
+    saturation = numpy.divide(delta, maxc, out=numpy.zeros_like(delta), where=maxc > 0)
+
+    return numpy.stack([hue, saturation, maxc], axis=-1)
+
+
+def hsv_to_rgb(hsv):
+    """Convert an array of hue, saturation and value colours in the last axis, from 0 to 1, to RGB from 0 to 1"""
+
+    hue, saturation, value = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+    sector = numpy.floor(hue * 6)
+    f = hue * 6 - sector
+    sector = sector.astype(numpy.int64) % 6
+    p = value * (1 - saturation)
+    q = value * (1 - saturation * f)
+    t = value * (1 - saturation * (1 - f))
+
+    return numpy.stack([
+        numpy.choose(sector, [value, q, p, p, t, value]),
+        numpy.choose(sector, [t, value, value, q, p, p]),
+        numpy.choose(sector, [p, p, t, value, value, q])], axis=-1)
+
+
+def recolour_images(images, masks, recolours):
+    """Change the colour of regions of a batch of uint8 RGBA images of shape (n, height, width, 4).
+    masks is the Mask pass of each image, where the red channel of each visible pixel is the pass index of the object drawn there.
+    recolours maps pass indexes to (hue shift, saturation scale, value scale), with the hue shift in turns,
+    or to a {source colour: target colour} dictionary of RGB tuples, see swap_colours(); alpha is not changed.
+    """
+
+    result = images.copy()
+    for index, recolour in recolours.items():
+        region = (masks[..., 0] == index) & (masks[..., 3] > 0)
+        if not region.any():
+            continue
+        if isinstance(recolour, dict):
+            result[..., :3][region] = swap_colours(images[region][:, :3], recolour)
+            continue
+        hue_shift, saturation_scale, value_scale = recolour
+        hsv = rgb_to_hsv(images[region][:, :3].astype(numpy.float32) / 255)
+        hsv[:, 0] = (hsv[:, 0] + hue_shift) % 1
+        hsv[:, 1:] = numpy.clip(hsv[:, 1:] * (saturation_scale, value_scale), 0, 1)
+        result[..., :3][region] = (hsv_to_rgb(hsv) * 255 + 0.5).astype(numpy.uint8)
+
+    return result
+
+
+def swap_colours(pixels, swaps):
+    """Return a uint8 array of RGB pixels of shape (n, 3) with each pixel moved from its nearest source colour to that colour's target
+    swaps maps source RGB tuples to target RGB tuples. The difference from the source colour is kept, so shading is kept,
+    and pixels that are exactly a source colour become exactly its target colour.
+    """
+
+    sources = numpy.array(list(swaps.keys()), dtype=numpy.int16)
+    offsets = numpy.array(list(swaps.values()), dtype=numpy.int16) - sources
+    nearest = find_nearest_colours(pixels, sources)
+
+    return numpy.clip(pixels.astype(numpy.int16) + offsets[nearest], 0, 255).astype(numpy.uint8)
+
+
+def encode_mask(mask):
+    """Return a 2D boolean array as a dict of its width, height and base64 encoded bits
+    The bits are stored row by row from the top, with each row padded to a whole number of bytes and the first pixel in the highest bit
+    """
+
+    return {
+        "width": int(mask.shape[1]),
+        "height": int(mask.shape[0]),
+        "bits": base64.b64encode(numpy.packbits(mask, axis=1).tobytes()).decode('ascii')}
+
+
+def find_hull(mask):
+    """Return the convex hull of the True pixels of a 2D boolean array, as a clockwise list of [x, y] pixel corners starting with the leftmost"""
+
+    # Only the corners of the first and last pixel of each row can be on the hull
+    rows = numpy.flatnonzero(mask.any(axis=1))
+    left = mask[rows].argmax(axis=1)
+    right = mask.shape[1] - mask[rows, ::-1].argmax(axis=1)
+    points = numpy.concatenate([
+        numpy.stack([left, rows], axis=1), numpy.stack([left, rows + 1], axis=1),
+        numpy.stack([right, rows], axis=1), numpy.stack([right, rows + 1], axis=1)])
+    points = sorted(set(map(tuple, points.tolist())))
+
+    # Andrew's monotone chain
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    lower = []
+    upper = []
+    for point in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], point) <= 0:
+            lower.pop()
+        lower.append(point)
+    for point in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], point) <= 0:
+            upper.pop()
+        upper.append(point)
+
+    # With y pointing down, anticlockwise in the maths convention is clockwise on screen
+    return [list(point) for point in lower[:-1] + upper[:-1]]
+
+
+def simplify_polygon(points, tolerance):
+    """Remove the vertices of a closed polygon that are within tolerance pixels of the line between their neighbours, least significant first
+    At least three vertices are always kept
+    """
+
+    points = numpy.array(points, dtype=numpy.float64)
+    while len(points) > 3:
+        previous = numpy.roll(points, 1, axis=0)
+        following = numpy.roll(points, -1, axis=0)
+        edge = following - previous
+        lengths = numpy.hypot(edge[:, 0], edge[:, 1])
+        offset = points - previous
+        distances = numpy.abs(edge[:, 0] * offset[:, 1] - edge[:, 1] * offset[:, 0]) / numpy.maximum(lengths, 1e-9)
+        index = int(distances.argmin())
+        if distances[index] > tolerance:
+            break
+        points = numpy.delete(points, index, axis=0)
+
+    return points.astype(int).tolist()
+
+
+def extract_collision(page, cells, threshold=128, tolerance=1.0):
+    """Return the collision data of each cell of a sprite sheet page, a uint8 RGBA array, in the same order as cells.
+    cells is a list of (x, y, width, height), and a pixel is solid if its alpha is at least threshold.
+    Each result has the 'bounds' of the solid pixels as [x, y, width, height], the 'mask' of the solid pixels inside the bounds, see encode_mask(),
+    and a convex 'hitbox' polygon around them simplified to within tolerance pixels, all relative to the top left of the cell.
+    Each value is None for cells without any solid pixels.
+    Cells of the same size are processed together as a single array.
+    """
+
+    results = [None] * len(cells)
+
+    groups = {}
+    for index, (x, y, width, height) in enumerate(cells):
+        groups.setdefault((width, height), []).append(index)
+
+    for (width, height), indexes in groups.items():
+        masks = numpy.stack([page[cells[i][1]:cells[i][1] + height, cells[i][0]:cells[i][0] + width, 3] for i in indexes]) >= threshold
+        rows = masks.any(axis=2)
+        columns = masks.any(axis=1)
+        solid = rows.any(axis=1)
+        top = rows.argmax(axis=1)
+        bottom = height - rows[:, ::-1].argmax(axis=1)
+        left = columns.argmax(axis=1)
+        right = width - columns[:, ::-1].argmax(axis=1)
+
+        for j, index in enumerate(indexes):
+            if not solid[j]:
+                results[index] = {"bounds": None, "mask": None, "hitbox": None}
+                continue
+            mask = masks[j, top[j]:bottom[j], left[j]:right[j]]
+            hitbox = simplify_polygon(find_hull(mask), tolerance)
+            results[index] = {
+                "bounds": [int(left[j]), int(top[j]), int(right[j] - left[j]), int(bottom[j] - top[j])],
+                "mask": encode_mask(mask),
+                "hitbox": [[x + int(left[j]), y + int(top[j])] for x, y in hitbox]}
+
+    return results
+
+
+# The file extension of each animated image format
+ANIMATION_EXTENSIONS = {'APNG': ".png", 'GIF': ".gif", 'WEBP': ".webp"}
+
+
+def find_nearest_colours(colours, palette, chunk_size=16384):
+    """Return the index of the nearest palette colour to each colour, both arrays with a colour in each row, such as uint8 RGBA arrays of shape (n, 4)
+    The squared distances are found with a matrix product, in chunks to limit the memory used
+    """
+
+    palette = palette.astype(numpy.float32)
+    palette_lengths = (palette * palette).sum(axis=1)
+
+    nearest = numpy.empty(len(colours), dtype=numpy.intp)
+    for start in range(0, len(colours), chunk_size):
+        chunk = colours[start:start + chunk_size].astype(numpy.float32)
+        # |c - p|^2 = |c|^2 - 2c.p + |p|^2, and |c|^2 is the same for every palette colour
+        distances = palette_lengths - 2 * (chunk @ palette.T)
+        nearest[start:start + chunk_size] = distances.argmin(axis=1)
+    return nearest
+
+
+def build_palette(pixels, size=256, iterations=4):
+    """Choose a palette of up to size colours for a uint8 array of RGBA pixels of shape (n, 4)
+    The first colour is always fully transparent, and is used for every fully transparent pixel.
+    The other colours are found by median cut, splitting the group of pixels with the widest range of a channel at its median,
+    then refined by moving each colour to the mean of the pixels nearest to it.
+    """
+
+    pixels = pixels[pixels[:, 3] > 0]
+
+    colours = numpy.zeros((0, 4), dtype=numpy.uint8)
+    if len(pixels):
+        def measure(box):
+            # Weight the widest range by the number of pixels, so that colours are spent where most pixels are
+            ranges = box.max(axis=0).astype(numpy.int32) - box.min(axis=0)
+            return (int(ranges.max()) * len(box) if len(box) > 1 else 0, ranges.argmax())
+
+        boxes = [pixels]
+        scores = [measure(pixels)]
+        while len(boxes) < size - 1:
+            index = max(range(len(boxes)), key=lambda i: scores[i][0])
+            score, channel = scores[index]
+            if score == 0:
+                break
+            box = boxes[index]
+            order = box[:, channel].argsort(kind='stable')
+            half = len(box) // 2
+            boxes[index] = box[order[:half]]
+            boxes.append(box[order[half:]])
+            scores[index] = measure(boxes[index])
+            scores.append(measure(boxes[-1]))
+
+        centres = numpy.array([box.mean(axis=0) for box in boxes], dtype=numpy.float32)
+        for i in range(iterations):
+            nearest = find_nearest_colours(pixels, numpy.round(centres))
+            counts = numpy.bincount(nearest, minlength=len(centres))
+            used = counts > 0
+            for channel in range(4):
+                sums = numpy.bincount(nearest, weights=pixels[:, channel], minlength=len(centres))
+                centres[used, channel] = sums[used] / counts[used]
+        colours = numpy.unique(numpy.clip(numpy.round(centres), 0, 255).astype(numpy.uint8), axis=0)
+
+    return numpy.concatenate([numpy.zeros((1, 4), dtype=numpy.uint8), colours])
+
+
+def read_palette(image, size=256):
+    """Return the palette defined by an image, a uint8 RGBA array, as its distinct colours in order
+    A fully transparent colour is always first, and the palette is cut to size colours
+    """
+
+    pixels = image.reshape(-1, 4)
+    pixels = pixels[pixels[:, 3] > 0]
+    colours, first = numpy.unique(pixels, axis=0, return_index=True)
+    colours = colours[first.argsort()]
+
+    return numpy.concatenate([numpy.zeros((1, 4), dtype=numpy.uint8), colours])[:size]
+
+
+class PaletteMapper():
+    """Maps uint8 RGBA arrays to indexes into a palette of up to 256 colours.
+    The nearest palette colour of each colour seen is cached, so each colour is only looked up once however many frames it is in.
+    Fully transparent pixels always map to the first palette colour. Requires NumPy.
+    """
+
+    # The palette, a uint8 array of shape (n, 4)
+    palette = None
+
+    # The colours seen so far as packed 32 bit values, sorted, and the index of each in the palette
+    keys = None
+    values = None
+
+    def __init__(self, palette):
+        self.palette = palette
+        self.keys = numpy.zeros(1, dtype=numpy.uint32)
+        self.values = numpy.zeros(1, dtype=numpy.uint8)
+
+    def map(self, image):
+        """Return the palette index of each pixel of a uint8 RGBA array, as a uint8 array of shape (height, width)"""
+
+        height, width = image.shape[:2]
+        packed = numpy.ascontiguousarray(image).view(numpy.uint32).reshape(height, width).copy()
+        packed[image[..., 3] == 0] = 0
+
+        colours, inverse = numpy.unique(packed, return_inverse=True)
+
+        positions = numpy.minimum(numpy.searchsorted(self.keys, colours), len(self.keys) - 1)
+        found = self.keys[positions] == colours
+        if not found.all():
+            new = colours[~found]
+            indexes = find_nearest_colours(new.view(numpy.uint8).reshape(-1, 4), self.palette).astype(numpy.uint8)
+            keys = numpy.concatenate([self.keys, new])
+            order = keys.argsort(kind='stable')
+            self.keys = keys[order]
+            self.values = numpy.concatenate([self.values, indexes])[order]
+            positions = numpy.searchsorted(self.keys, colours)
+
+        return self.values[positions][inverse].reshape(height, width)
+
+
+def write_indexed_png(path, indexes, palette):
+    """Write a uint8 array of palette indexes as an 8 bit indexed PNG, with the alpha of each palette colour"""
+
+    height, width = indexes.shape
+
+    # Each row starts with filter type 0, the other filters rarely help indexed images
+    rows = numpy.zeros((height, width + 1), dtype=numpy.uint8)
+    rows[:, 1:] = indexes
+
+    # Trailing opaque colours can be left out of the transparency chunk
+    alpha = palette[:, 3]
+    opaque = numpy.flatnonzero(alpha != 255)
+    alpha_count = opaque[-1] + 1 if len(opaque) else 0
+
+    chunks = [png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)),
+        png_chunk(b'PLTE', numpy.ascontiguousarray(palette[:, :3]).tobytes())]
+    if alpha_count:
+        chunks.append(png_chunk(b'tRNS', alpha[:alpha_count].tobytes()))
+    chunks.append(png_chunk(b'IDAT', zlib.compress(rows.tobytes(), 9)))
+    chunks.append(png_chunk(b'IEND', b''))
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n' + b''.join(chunks))
+
+
+def animation_format_available(file_format):
+    """Return True if animations can be saved in a format
+    All formats need NumPy, GIF and WebP also need Pillow, and WebP needs Pillow to be built with WebP support
+    """
+
+    if not numpy_installed:
+        return False
+    if file_format == 'APNG':
+        return True
+    if file_format == 'WEBP':
+        return pil_installed and features.check('webp')
+    return pil_installed
+
+
+def png_chunk(chunk_type, data):
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff)
+
+
+def compress_apng_frame(image):
+    """Compress a uint8 RGBA array as the image data of a PNG, using the Up filter on every row"""
+
+    height, width = image.shape[:2]
+    rows = image.reshape(height, width * 4)
+    filtered = numpy.empty((height, width * 4 + 1), dtype=numpy.uint8)
+    filtered[:, 0] = 2
+    filtered[0, 1:] = rows[0]
+    numpy.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])
+    return (width, height, zlib.compress(filtered.tobytes(), 6))
+
+
+def write_png(path, image):
+    """Write a uint8 RGBA array as an 8 bit RGBA PNG, compressed the same way as the frames of animated PNGs"""
+
+    width, height, data = compress_apng_frame(image)
+    chunks = [png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)), png_chunk(b'IDAT', data), png_chunk(b'IEND', b'')]
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n' + b''.join(chunks))
+
+
+def write_apng(path, frames, fps):
+    """Write frames returned by compress_apng_frame() as an animated PNG that loops forever"""
+
+    width, height = frames[0][:2]
+    delay = fractions.Fraction(1 / fps).limit_denominator(65535)
+
+    chunks = [png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)),
+        png_chunk(b'acTL', struct.pack('>II', len(frames), 0))]
+    sequence = 0
+    for index, (frame_width, frame_height, data) in enumerate(frames):
+        chunks.append(png_chunk(b'fcTL', struct.pack('>IIIIIHHBB', sequence, frame_width, frame_height, 0, 0,
+            delay.numerator, delay.denominator, 1, 0)))
+        sequence += 1
+        if index == 0:
+            chunks.append(png_chunk(b'IDAT', data))
+        else:
+            chunks.append(png_chunk(b'fdAT', struct.pack('>I', sequence) + data))
+            sequence += 1
+    chunks.append(png_chunk(b'IEND', b''))
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n' + b''.join(chunks))
+
+
+class AnimationWriter():
+    """Saves animated images, encoding their frames in a background thread as they are added.
+    Frames can be added in any order, each animation is saved as soon as all of its frames have been added.
+    file_format is APNG, GIF or WEBP.
+    """
+
+    def __init__(self, file_format, fps):
+        self.file_format = file_format
+        self.fps = fps
+        # The frames added to each unfinished animation by path, only used by the background thread
+        self.animations = {}
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.futures = collections.deque()
+
+    def add_frame(self, path, index, count, image):
+        """Add frame index of count frames to the animation saved at path, image is a uint8 RGBA array"""
+
+        self.futures.append(self.executor.submit(self.encode_frame, path, index, count, image))
+        # Raise any errors from frames that have finished
+        while self.futures and self.futures[0].done():
+            self.futures.popleft().result()
+
+    def encode_frame(self, path, index, count, image):
+        frames = self.animations.setdefault(path, {})
+        if self.file_format == 'APNG':
+            frames[index] = compress_apng_frame(image)
+        else:
+            frames[index] = image
+        if len(frames) == count:
+            self.save(path, self.animations.pop(path))
+
+    def save(self, path, frames):
+        frames = [frames[index] for index in sorted(frames)]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.file_format == 'APNG':
+            write_apng(path, frames, self.fps)
+            return
+
+        images = [Image.fromarray(numpy.ascontiguousarray(frame), 'RGBA') for frame in frames]
+        duration = int(round(1000 / self.fps))
+        if self.file_format == 'GIF':
+            images[0].save(path, save_all=True, append_images=images[1:], duration=duration, loop=0, disposal=2)
+        else:
+            images[0].save(path, save_all=True, append_images=images[1:], duration=duration, loop=0, lossless=True)
+
+    def close(self, save_incomplete=True):
+        """Wait for every frame to be encoded, saving animations that are missing frames if save_incomplete is True"""
+
+        try:
+            while self.futures:
+                self.futures.popleft().result()
+            if save_incomplete:
+                for path, frames in self.animations.items():
+                    self.save(path, frames)
+        finally:
+            self.animations = {}
+            self.executor.shutdown()
+
+
+class OutputWriter():
+    """Runs file and array work in order in a background thread, so it overlaps the next render.
+    The work must not use bpy, and wait() must be called before the files it writes are used.
+    """
+
+    def __init__(self):
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.futures = collections.deque()
+
+    def submit(self, function, *args):
+        """Run function(*args) once the work submitted before it has finished"""
+
+        self.futures.append(self.executor.submit(function, *args))
+        # Raise any errors from work that has finished
+        while self.futures and self.futures[0].done():
+            self.futures.popleft().result()
+
+    def wait(self):
+        """Wait for all of the submitted work to finish"""
+
+        while self.futures:
+            self.futures.popleft().result()
+
+    def close(self):
+        """Wait for all of the submitted work, then stop the thread"""
+
+        try:
+            self.wait()
+        finally:
+            self.futures.clear()
+            self.executor.shutdown()
+
+
+def merge_files(backend, image_paths, direction, output_path):
+    """Merge a list of image files into a single image, placed one after another in the given direction.
+    direction must be HORIZONTAL or VERTICAL.
+    """
+
+    sizes = [read_image_size(backend, path) for path in image_paths]
+    page = layout_pages(sizes, direction)[0]
+    build_page(backend, image_paths, page, output_path)
@@ -3,13 +3,11 @@ import bmesh
 import mathutils
 import math
 import os
+import hashlib
+import shutil
+import json
 
-pil_installed = True
-try:
-    from PIL import Image
-    pil_installed = True
-except ImportError:
-    pil_installed = False
+# The compositor is only imported once a render, merge or validation needs it, so it does not slow down starting Blender
 
 
 class ValidationError(Exception):
@@ -20,6 +18,68 @@ class ValidationError(Exception):
         super(ValidationError, self).__init__(message)
 
 
+# Extra render passes that can be written alongside each sprite
+# <pass id>: (<render layer output>, <view layer property>, <output folder>, <colour data>)
+# Colour data passes are saved with the scene's view transform, other passes are saved as raw values where supported
+RENDER_PASSES = {
+    'NORMAL': ('Normal', 'use_pass_normal', "normal_pass", False),
+    'DEPTH': ('Depth', 'use_pass_z', "depth_pass", False),
+    'EMISSION': ('Emit', 'use_pass_emit', "emission_pass", True),
+    'MASK': ('IndexOB', 'use_pass_object_index', "mask_pass", False)}
+
+
+# Name of the file beside each sheet group folder holding its renders and intermediate merged images as raw pixels, see get_frame_store()
+# The stores are temporary, and are deleted once the sprite sheets have been merged
+FRAME_STORE_NAME = ".sprite_frames_{0}.raw"
+
+
+# The most render files and pixels sampled to generate the shared palette, see get_palette()
+PALETTE_SAMPLE_FILES = 256
+PALETTE_SAMPLE_PIXELS = 65536
+
+
+# The object types that have a bounding box, used to size objects for Auto Simplify
+GEOMETRY_TYPES = ('MESH', 'CURVE', 'SURFACE', 'META', 'FONT')
+
+# The texture limits that can be set in Cycles, see setup_simplify()
+TEXTURE_LIMITS = (128, 256, 512, 1024, 2048, 4096, 8192)
+
+# The highest subdivision level that can be set in the scene's simplify settings
+MAX_SIMPLIFY_LEVELS = 6
+
+
+# Name of the temporary view layer and collections used by the Collections isolation mode
+ISOLATION_NAME = "Sprite Isolation"
+
+
+# Custom property set on an object parent to mark it as left/right symmetric
+# Only half of the camera angles are rendered, the rest are mirrored copies
+MIRROR_PROPERTY = "sprite_mirror"
+
+
+# Custom properties set on an object parent, its sprite sheet parent or a camera parent to override the output resolution and orthographic scale
+# The resolution is a single size for square renders or a [width, height] pair, see get_size_override()
+RESOLUTION_PROPERTY = "sprite_resolution"
+ORTHO_SCALE_PROPERTY = "sprite_ortho_scale"
+
+
+# Custom property set on an object parent to create recoloured copies of its renders from the Mask pass, see get_colour_variants()
+COLOUR_VARIANTS_PROPERTY = "sprite_colour_variants"
+
+
+# Names of the fixed camera parent properties used before the camera list, see upgrade_camera_properties()
+LEGACY_CAMERA_PROPERTIES = ('pointer_camera_one', 'pointer_camera_two', 'pointer_camera_three', 'pointer_camera_four')
+
+
+class CameraParentProperties(bpy.types.PropertyGroup):
+    """An entry in the list of camera parents."""
+
+    pointer_camera_parent: bpy.props.PointerProperty(
+        name = "Camera Parent",
+        description = "Camera rig parent.",
+        type = bpy.types.Object)
+
+
 class AddonProperties(bpy.types.PropertyGroup):
     """Declare properties to be used by the addon."""
 
@@ -42,25 +102,10 @@ class AddonProperties(bpy.types.PropertyGroup):
         description = "The size of a cube fitting the object being rendered.",
         default = 1)
 
-    pointer_camera_one: bpy.props.PointerProperty(
-        name = "Camera 1",
-        description = "Camera rig parent.",
-        type = bpy.types.Object)
-
-    pointer_camera_two: bpy.props.PointerProperty(
-        name = "Camera 2",
-        description = "Camera rig parent.",
-        type = bpy.types.Object)
-
-    pointer_camera_three: bpy.props.PointerProperty(
-        name = "Camera 3",
-        description = "Camera rig parent.",
-        type = bpy.types.Object)
-
-    pointer_camera_four: bpy.props.PointerProperty(
-        name = "Camera 4",
-        description = "Camera rig parent.",
-        type = bpy.types.Object)
+    collection_cameras: bpy.props.CollectionProperty(
+        name = "Camera Parents",
+        description = "The camera rig parents to render from, in order.",
+        type = CameraParentProperties)
 
     pointer_output_parent: bpy.props.PointerProperty(
         name = "Output",
@@ -74,7 +119,7 @@ class AddonProperties(bpy.types.PropertyGroup):
 
     bool_keep_renders: bpy.props.BoolProperty(
         name = "Keep Individual Renders",
-        description = "If enabled the individual render files will not be deleted at the end of the process.",
+        description = "If enabled the individual render files will not be deleted at the end of the process.\nIf disabled, the intermediate merged images are only held in a temporary raw frame store instead of image files",
         default = False)
 
     enum_sprite_sheet: bpy.props.EnumProperty(
@@ -90,6 +135,173 @@ class AddonProperties(bpy.types.PropertyGroup):
         get = None,
         set = None)
 
+    enum_render_passes: bpy.props.EnumProperty(
+        items = [
+            ('NORMAL', "Normal", "World space normals, mapped from -1 to 1 into the 0 to 1 colour range", 1),
+            ('DEPTH', "Depth", "Z depth, mapped from the camera's Clip Start (black) to its Clip End (white)", 2),
+            ('EMISSION', "Emission", "The emission colour", 4),
+            ('MASK', "Mask", "The Pass Index of each object, stored as a grey value of Pass Index / 255. Requires Cycles", 8)],
+        name = "Extra Passes",
+        description = "Extra render passes written from the same render as each sprite.\nEach pass is saved to its own folder tree inside the output path, named after the pass, and merged into matching sprite sheets",
+        options = {'ENUM_FLAG'},
+        default = set())
+
+    int_max_sheet_size: bpy.props.IntProperty(
+        name = "Max Sheet Size",
+        description = "The maximum width and height of a sprite sheet in pixels. Sheets that would be larger are wrapped into rows or columns and split into pages named _p0, _p1, ... Set to 0 for no limit",
+        default = 0,
+        min = 0)
+
+    enum_effects: bpy.props.EnumProperty(
+        items = [
+            ('OUTLINE', "Outline", "Draw an outline around each sprite", 1),
+            ('SHADOW', "Drop Shadow", "Draw a shadow of each sprite behind it, moved by the shadow offset", 2),
+            ('CLAMP', "Colour Clamp", "Round each colour channel to a number of levels, and make every pixel fully transparent or fully opaque", 4)],
+        name = "Effects",
+        description = "Effects applied to every render once rendering has finished, before the resolution variants and sprite sheets are created.\nThe effects are applied in order, outline first, and are not applied to the extra passes",
+        options = {'ENUM_FLAG'},
+        default = set())
+
+    float_outline_colour: bpy.props.FloatVectorProperty(
+        name = "Outline Colour",
+        description = "The colour of the outline.",
+        subtype = 'COLOR_GAMMA',
+        size = 4,
+        min = 0,
+        max = 1,
+        default = (0, 0, 0, 1))
+
+    int_outline_width: bpy.props.IntProperty(
+        name = "Outline Width",
+        description = "The width of the outline in pixels.",
+        default = 1,
+        min = 1,
+        max = 16)
+
+    float_shadow_colour: bpy.props.FloatVectorProperty(
+        name = "Shadow Colour",
+        description = "The colour of the drop shadow, its alpha is the opacity of the shadow.",
+        subtype = 'COLOR_GAMMA',
+        size = 4,
+        min = 0,
+        max = 1,
+        default = (0, 0, 0, 0.5))
+
+    int_shadow_offset_x: bpy.props.IntProperty(
+        name = "Shadow Offset X",
+        description = "The distance in pixels to move the shadow right, negative values move it left.",
+        default = 2,
+        min = -64,
+        max = 64)
+
+    int_shadow_offset_y: bpy.props.IntProperty(
+        name = "Shadow Offset Y",
+        description = "The distance in pixels to move the shadow down, negative values move it up.",
+        default = 2,
+        min = -64,
+        max = 64)
+
+    int_colour_levels: bpy.props.IntProperty(
+        name = "Colour Levels",
+        description = "The number of levels each colour channel is rounded to by Colour Clamp.",
+        default = 8,
+        min = 2,
+        max = 256)
+
+    string_resolution_variants: bpy.props.StringProperty(
+        name = "Resolution Variants",
+        description = "Smaller copies of every render to create from the full resolution render, as scales separated by commas, eg '0.5,0.25'.\nEach variant is saved to its own folder tree inside each output folder, named after the scale, eg '0.5x', and merged into its own sprite sheets",
+        default = "")
+
+    enum_animated_images: bpy.props.EnumProperty(
+        items = [
+            ('OFF', "Off", "No animated images", 0),
+            ('APNG', "APNG", "Animated PNG, with full alpha", 1),
+            ('GIF', "GIF", "Animated GIF, with on/off transparency. Requires Pillow", 2),
+            ('WEBP', "WebP", "Lossless animated WebP, with full alpha. Requires Pillow with WebP support", 3)],
+        name = "Animated Images",
+        description = "Save an animated image of each animation track at each camera and angle, at the scene's frame rate. Animations are saved to the 'animations' folder inside the output path",
+        default = 'OFF')
+
+    bool_delta_frames: bpy.props.BoolProperty(
+        name = "Delta Frames",
+        description = "Store only the first frame of each animation track in full. Each following frame is stored as patches of the areas that changed from the frame before, and the sprite sheet JSON file lists the patches needed to rebuild each frame",
+        default = False)
+
+    enum_palette: bpy.props.EnumProperty(
+        items = [
+            ('OFF', "Off", "Save full colour RGBA sprite sheets", 0),
+            ('GENERATE', "Generate", "Build one palette for every sprite sheet from a sample of the renders", 1),
+            ('IMAGE', "From Image", "Use the colours of an image as the palette, in the order they first appear", 2)],
+        name = "Palette",
+        description = "Save the sprite sheets as 8 bit indexed PNGs sharing a single palette. The first colour of the palette is always fully transparent",
+        default = 'OFF')
+
+    int_palette_size: bpy.props.IntProperty(
+        name = "Palette Size",
+        description = "The number of colours in the palette, including the transparent colour",
+        default = 256,
+        min = 2,
+        max = 256)
+
+    string_palette_image: bpy.props.StringProperty(
+        name = "Palette Image",
+        description = "An image whose colours are the palette, such as a strip with one pixel of each colour",
+        subtype = 'FILE_PATH',
+        default = "")
+
+    bool_collision_data: bpy.props.BoolProperty(
+        name = "Collision Data",
+        description = "Save the bounding box, a bitmask of the solid pixels and a convex hitbox polygon of every sprite in a JSON file next to each sprite sheet, extracted while the sheet is merged",
+        default = False)
+
+    int_alpha_threshold: bpy.props.IntProperty(
+        name = "Alpha Threshold",
+        description = "Pixels with at least this alpha, from 0 to 255, are solid in the collision data.",
+        default = 128,
+        min = 1,
+        max = 255)
+
+    float_hitbox_tolerance: bpy.props.FloatProperty(
+        name = "Hitbox Tolerance",
+        description = "How far in pixels a hitbox polygon may cut into the sprite, higher values give hitboxes with fewer points. 0 keeps every corner of the hull.",
+        default = 1,
+        min = 0)
+
+    enum_resample_filter: bpy.props.EnumProperty(
+        items = [
+            ('NEAREST', "Nearest", "Nearest neighbour, keeps hard pixel edges for pixel art", 0),
+            ('BILINEAR', "Bilinear", "Linear interpolation", 1),
+            ('AREA', "Area", "Averages every pixel covered, smooth with little blurring", 2),
+            ('LANCZOS', "Lanczos", "Sharp and smooth, for detailed art", 3)],
+        name = "Resample Filter",
+        description = "The filter used to create the resolution variants. The Mask pass always uses Nearest",
+        default = 'AREA')
+
+    enum_isolation: bpy.props.EnumProperty(
+        items = [
+            ('VISIBILITY', "Object Visibility", "Hide every other object in the file from the render while rendering", 0),
+            ('COLLECTION', "Collections", "Render from a temporary view layer with a collection for the Global Parent, each Camera Parent and each Object Parent. Only the collections of the current camera and object are included, so hidden objects are not evaluated", 1)],
+        name = "Isolation",
+        description = "How the objects not in the current sprite are hidden while rendering",
+        default = 'VISIBILITY')
+
+    bool_batch_objects: bpy.props.BoolProperty(
+        name = "Render Objects Together",
+        description = "Render Object Parents in a single render for each camera, angle and frame, using a view layer for each object. Each object is moved to the first object's location while rendering. Requires Collections isolation",
+        default = False)
+
+    bool_auto_simplify: bpy.props.BoolProperty(
+        name = "Auto Simplify",
+        description = "Cap the subdivision levels, child particles and, in Cycles, texture sizes of each render to the detail that can be seen at the size of the objects in the sprite. The scene's simplify settings are restored once rendering has finished",
+        default = False)
+
+    float_simplify_detail: bpy.props.FloatProperty(
+        name = "Detail Size",
+        description = "The size in pixels of the smallest detail kept by Auto Simplify. Higher values simplify more",
+        default = 2,
+        min = 0.1)
+
     string_output_path: bpy.props.StringProperty(
         name = "Output Path",
         description = "The folder to save the renders to.",
@@ -121,101 +333,328 @@ def find_children(parent_obj, obj_type=None):
     return output_list
 
 
-# Validate the camera parent selection
-def validate_camera_parent(caller, context):
-    """Validate the camera parent selection boxes.
-    At least one camera must be selected.
+def get_camera_parents(addon_prop):
+    """Return the camera parents in the camera list, skipping empty entries"""
+
+    return [camera.pointer_camera_parent for camera in addon_prop.collection_cameras if camera.pointer_camera_parent != None]
+
+
+@bpy.app.handlers.persistent
+def upgrade_camera_properties(dummy):
+    """Move the camera parents of files saved with the four fixed camera properties into the camera list.
+    Runs after a file is loaded.
     """
 
-    addon_prop = context.scene.addon_properties
+    for scn in bpy.data.scenes:
+        addon_prop = scn.addon_properties
+        for name in LEGACY_CAMERA_PROPERTIES:
+            if name not in addon_prop.keys():
+                continue
+            camera_parent = addon_prop[name]
+            del addon_prop[name]
+            if camera_parent != None:
+                addon_prop.collection_cameras.add().pointer_camera_parent = camera_parent
 
-    error = None
 
-    if (addon_prop.pointer_camera_one == None
-            and addon_prop.pointer_camera_two == None
-            and addon_prop.pointer_camera_three == None
-            and addon_prop.pointer_camera_four == None):
-        error = "* At least one camera parent must be selected"
+def get_rna_fingerprint(data):
+    """Return a tuple of the editable property values of a data-block or struct.
+    ID pointers are compared by address, other pointers and collections are ignored.
+    """
 
-    return error
+    values = []
+    for prop in data.bl_rna.properties:
+        # Skip the name and UI state, which do not affect the render
+        if prop.is_readonly or prop.identifier in ('name', 'select', 'active', 'is_active'):
+            continue
+        if prop.identifier.startswith('show_') and prop.identifier != 'show_render':
+            continue
+        if prop.type == 'COLLECTION':
+            continue
+        value = getattr(data, prop.identifier, None)
+        if prop.type == 'POINTER':
+            if isinstance(value, bpy.types.ID):
+                values.append((prop.identifier, value.as_pointer()))
+            continue
+        if hasattr(value, '__len__') and not isinstance(value, str):
+            value = tuple(value)
+        if isinstance(value, float):
+            value = round(value, 5)
+        values.append((prop.identifier, value))
+    return tuple(values)
+
+
+def get_animation_fingerprint(obj):
+    """Return a tuple describing an object's active action and NLA tracks"""
+
+    anim = obj.animation_data
+    if anim == None:
+        return None
+    tracks = []
+    for track in anim.nla_tracks:
+        strips = []
+        for strip in track.strips:
+            action = strip.action.as_pointer() if strip.action != None else None
+            strips.append((action, get_rna_fingerprint(strip)))
+        tracks.append((track.name, track.mute, tuple(strips)))
+    action = anim.action.as_pointer() if anim.action != None else None
+    return (action, tuple(tracks), get_driver_fingerprint(anim))
+
+
+def get_driver_fingerprint(anim):
+    """Return a tuple describing the drivers of an object's animation data
+    This covers the driven property, the expression, the targets of each variable and the keyframes mapping the driver's value
+    """
 
+    drivers = []
+    for fcurve in anim.drivers:
+        driver = fcurve.driver
+        variables = []
+        for variable in driver.variables:
+            targets = tuple((target.id.as_pointer() if target.id != None else None, target.data_path, target.bone_target,
+                target.transform_type, target.transform_space) for target in variable.targets)
+            variables.append((variable.name, variable.type, targets))
+        keyframes = tuple(tuple(round(value, 5) for value in point.co) for point in fcurve.keyframe_points)
+        drivers.append((fcurve.data_path, fcurve.array_index, driver.type, driver.expression, tuple(variables), keyframes))
+    return tuple(drivers)
+
+
+def get_size_override(parents):
+    """Return the (width, height) resolution and the orthographic scale set by the custom properties of the first of parents that sets each
+    Each is None if it is not set on any of the parents
+    """
 
-# Validate the top parent selection
-def validate_camera_one(caller, context):
-    """Validate the first camera parent selection box.
-    The parent must be an Empty object.
-    There must be a child Camera object.
+    resolution = None
+    ortho_scale = None
+
+    for parent in parents:
+        if parent == None:
+            continue
+        if resolution == None:
+            value = parent.get(RESOLUTION_PROPERTY)
+            if value != None:
+                if isinstance(value, (int, float)):
+                    resolution = (int(value), int(value))
+                else:
+                    resolution = (int(value[0]), int(value[1]))
+        if ortho_scale == None:
+            ortho_scale = parent.get(ORTHO_SCALE_PROPERTY)
+
+    return (resolution, ortho_scale)
+
+
+def get_subtree_fingerprint(obj):
+    """Return a hash of everything that affects how an object parent and its children render.
+    Linked duplicates have the same fingerprint, regardless of their names and locations.
+    This covers the data-blocks, modifiers, constraints, materials, NLA tracks and drivers of each object,
+    the transforms of the children relative to the parent, and the rotation and scale of the parent.
+    Constraint and driver targets are compared by address, so objects that follow different targets are not duplicates.
     """
 
-    addon_prop = context.scene.addon_properties
+    def round_matrix(matrix):
+        return tuple(tuple(round(value, 5) for value in row) for row in matrix)
 
-    error = None
+    def describe(o, matrix):
+        data = o.data.as_pointer() if o.data != None else None
+        modifiers = tuple((m.type, get_rna_fingerprint(m)) for m in o.modifiers)
+        constraints = tuple((c.type, get_rna_fingerprint(c)) for c in o.constraints)
+        materials = tuple((slot.link, slot.material.as_pointer() if slot.material != None else None) for slot in o.material_slots)
+        return repr((o.type, data, modifiers, constraints, materials, get_animation_fingerprint(o), o.pass_index, o.get(MIRROR_PROPERTY),
+            round_matrix(matrix)))
 
-    if addon_prop.pointer_camera_one != None:
-        if addon_prop.pointer_camera_one.type != 'EMPTY':
-            error = "* {0} must be an empty".format(addon_prop.pointer_camera_one.name)
-        elif len(find_children(addon_prop.pointer_camera_one, 'CAMERA')) == 0:
-            error = "* {0} does not have a child camera".format(addon_prop.pointer_camera_one.name)
+    parent_inverse = obj.matrix_world.inverted()
+    children = sorted(describe(child, parent_inverse @ child.matrix_world) for child in find_children(obj))
+    description = [describe(obj, obj.matrix_world.to_3x3())] + children
 
-    return error
+    return hashlib.sha1('\n'.join(description).encode('utf-8')).hexdigest()
 
 
-# Validate the dimetric parent selection
-def validate_camera_two(caller, context):
-    """Validate the second camera parent selection box.
-    The parent must be an Empty object.
-    There must be a child Camera object.
+def parse_hex_colour(text):
+    """Return a colour written as "#rrggbb" as a tuple of red, green and blue from 0 to 255, raising ValueError if it is not valid"""
+
+    if not isinstance(text, str) or len(text) != 7 or text[0] != '#':
+        raise ValueError("is not a #rrggbb colour")
+    return tuple(int(text[i:i + 2], 16) for i in (1, 3, 5))
+
+
+def get_colour_variants(obj):
+    """Return the colour variants of an object parent as {variant name: {pass index: recolour}}
+    Each recolour is a (hue shift, saturation scale, value scale) tuple, or a {source colour: target colour} dictionary of RGB tuples.
+    The custom property is a dictionary, or a JSON string of one, eg {"Red": {"1": [0.5, 1, 1]}} shifts the hue of pass index 1 by half a turn,
+    and {"Red": {"1": {"#808080": "#c02020"}}} changes the grey of pass index 1 to red.
+    Raises ValueError if the property is not valid.
+    """
+
+    prop = obj.get(COLOUR_VARIANTS_PROPERTY)
+    if prop == None:
+        return {}
+    if isinstance(prop, str):
+        try:
+            prop = json.loads(prop)
+        except ValueError:
+            raise ValueError("is not valid JSON")
+    elif hasattr(prop, 'to_dict'):
+        prop = prop.to_dict()
+    if not isinstance(prop, dict):
+        raise ValueError("must be a dictionary of colour variants")
+
+    variants = {}
+    for name, recolours in prop.items():
+        if name.strip() in ("", ".", "..") or any(c in name for c in '/\\:'):
+            raise ValueError("has a colour variant name that is not a valid folder name")
+        if not isinstance(recolours, dict):
+            raise ValueError("must map each colour variant to a dictionary of pass indexes")
+        variants[name] = {}
+        for index, recolour in recolours.items():
+            if hasattr(recolour, 'to_dict'):
+                recolour = recolour.to_dict()
+            try:
+                index = int(index)
+                if isinstance(recolour, dict):
+                    recolour = {parse_hex_colour(source): parse_hex_colour(target) for source, target in recolour.items()}
+                    saturation = value = 0
+                else:
+                    hue, saturation, value = [float(v) for v in recolour]
+                    recolour = (hue, saturation, value)
+            except (TypeError, ValueError):
+                raise ValueError("must map each pass index to a hue shift, saturation scale and value scale, or to a dictionary of #rrggbb colours")
+            if index < 1 or index > 255 or saturation < 0 or value < 0 or recolour == {}:
+                raise ValueError("must use pass indexes from 1 to 255, scales of 0 or more and at least one colour to change")
+            variants[name][index] = recolour
+
+    return variants
+
+
+def link_file(source_path, destination_path):
+    """Hard link a file to a new path, copying it if links are not supported.
+    Any existing file at the destination is replaced.
+    """
+
+    os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+    if os.path.exists(destination_path):
+        os.remove(destination_path)
+    try:
+        os.link(source_path, destination_path)
+    except OSError:
+        shutil.copyfile(source_path, destination_path)
+
+
+def get_settings(caller, context):
+    """Return the settings to validate.
+    This is the caller's job settings if it has any, such as a RenderSprites created from a job spec, otherwise the scene's addon properties.
+    """
+
+    settings = getattr(caller, 'settings', None)
+    if settings == None:
+        settings = context.scene.addon_properties
+    return settings
+
+
+# Validate the camera parent selection
+def validate_camera_parent(caller, context):
+    """Validate the camera parent list.
+    At least one camera must be selected.
     """
 
-    addon_prop = context.scene.addon_properties
+    addon_prop = get_settings(caller, context)
 
     error = None
 
-    if addon_prop.pointer_camera_two != None:
-        if addon_prop.pointer_camera_two.type != 'EMPTY':
-            error = "* {0} must be an empty".format(addon_prop.pointer_camera_two.name)
-        elif len(find_children(addon_prop.pointer_camera_two, 'CAMERA')) == 0:
-            error = "* {0} does not have a child camera".format(addon_prop.pointer_camera_two.name)
+    if len(get_camera_parents(addon_prop)) == 0:
+        error = "* At least one camera parent must be selected"
 
     return error
 
 
-# Validate the side parent selection
-def validate_camera_three(caller, context):
-    """Validate the third camera parent selection box.
-    The parent must be an Empty object.
-    There must be a child Camera object.
+# Validate each camera parent in the list
+def validate_cameras(caller, context):
+    """Validate each camera parent in the camera list.
+    Each parent must be an Empty object, with a child Camera object.
+    A parent can only be in the list once.
     """
 
-    addon_prop = context.scene.addon_properties
+    addon_prop = get_settings(caller, context)
 
-    error = None
+    error = []
+    names = set()
+
+    for camera_parent in get_camera_parents(addon_prop):
+        if camera_parent.type != 'EMPTY':
+            error.append("* {0} must be an empty".format(camera_parent.name))
+        elif len(find_children(camera_parent, 'CAMERA')) == 0:
+            error.append("* {0} does not have a child camera".format(camera_parent.name))
+        elif camera_parent.name in names:
+            error.append("* {0} is in the list more than once".format(camera_parent.name))
+        names.add(camera_parent.name)
 
-    if addon_prop.pointer_camera_three != None:
-        if addon_prop.pointer_camera_three.type != 'EMPTY':
-            error = "* {0} must be an empty".format(addon_prop.pointer_camera_three.name)
-        elif len(find_children(addon_prop.pointer_camera_three, 'CAMERA')) == 0:
-            error = "* {0} does not have a child camera".format(addon_prop.pointer_camera_three.name)
+    if error == []:
+        error = None
 
     return error
 
 
-# Validate the bird's eye view parent selection
-def validate_camera_four(caller, context):
-    """Validate the fourth camera parent selection box.
-    The parent must be an Empty object.
-    There must be a child Camera object.
+def validate_size_overrides(caller, context):
+    """Validate the resolution and orthographic scale custom properties of the object, sprite sheet and camera parents
+    A resolution must be a positive whole number or a pair of them, and an orthographic scale must be a positive number.
     """
 
-    addon_prop = context.scene.addon_properties
+    addon_prop = get_settings(caller, context)
+
+    error = []
+
+    parents = get_camera_parents(addon_prop)
+    output = addon_prop.pointer_output_parent
+    if output != None:
+        parents = parents + [output]
+        for child in find_children(output):
+            parents.append(child)
+            if addon_prop.enum_sprite_sheet == 'SPRITE':
+                parents.extend(find_children(child))
+
+    for parent in parents:
+        value = parent.get(RESOLUTION_PROPERTY)
+        if value != None:
+            values = [value] if isinstance(value, (int, float)) else list(value)
+            if len(values) not in (1, 2) or any(not isinstance(v, int) or v < 1 for v in values):
+                error.append("* {0} must be a positive whole number or pair of numbers on {1}".format(RESOLUTION_PROPERTY, parent.name))
+        value = parent.get(ORTHO_SCALE_PROPERTY)
+        if value != None and (not isinstance(value, (int, float)) or value <= 0):
+            error.append("* {0} must be a positive number on {1}".format(ORTHO_SCALE_PROPERTY, parent.name))
 
-    error = None
+    if error == []:
+        error = None
+
+    return error
 
-    if addon_prop.pointer_camera_four != None:
-        if addon_prop.pointer_camera_four.type != 'EMPTY':
-            error = "* {0} must be an empty".format(addon_prop.pointer_camera_four.name)
-        elif len(find_children(addon_prop.pointer_camera_four, 'CAMERA')) == 0:
-            error = "* {0} does not have a child camera".format(addon_prop.pointer_camera_four.name)
+
+def validate_colour_variants(caller, context):
+    """Validate the colour variants custom property of the object parents
+    The regions to recolour are read from the Mask pass with NumPy
+    """
+    from . compositor import numpy_installed
+
+    addon_prop = get_settings(caller, context)
+
+    error = []
+
+    output = addon_prop.pointer_output_parent
+    if output != None:
+        parents = find_children(output)
+        if addon_prop.enum_sprite_sheet == 'SPRITE':
+            parents = [obj for child in parents for obj in find_children(child)]
+
+        for parent in parents:
+            try:
+                variants = get_colour_variants(parent)
+            except ValueError as e:
+                error.append("* {0} {1} on {2}".format(COLOUR_VARIANTS_PROPERTY, e, parent.name))
+                continue
+            if variants and not numpy_installed:
+                error.append("* NumPy is not installed, the colour variants of {0} cannot be created".format(parent.name))
+            elif variants and 'MASK' not in addon_prop.enum_render_passes:
+                error.append("* The colour variants of {0} require the Mask pass".format(parent.name))
+
+    if error == []:
+        error = None
 
     return error
 
@@ -246,7 +685,7 @@ def validate_output_parent(caller, context):
         Sprite Sheet Parents must be an Empty and have at least one child.
     """
 
-    addon_prop = context.scene.addon_properties
+    addon_prop = get_settings(caller, context)
 
     error = None
 
@@ -279,7 +718,7 @@ def validate_output_path(caller, context):
     The file path must be selected, and be valid.
     """
 
-    addon_prop = context.scene.addon_properties
+    addon_prop = get_settings(caller, context)
 
     error = None
 
@@ -293,15 +732,186 @@ def validate_output_path(caller, context):
 
 def validate_sprite_dropdown(caller, context):
     """Validate the Sprite Sheet dropdown
-    If PIL if not installed this must be set to Off
+    If neither NumPy nor PIL is installed this must be set to Off
+    """
+    from . compositor import get_image_backend
+
+    addon_prop = get_settings(caller, context)
+
+    error = None
+
+    if addon_prop.enum_sprite_sheet != 'OFF' and get_image_backend() == None:
+        error = "* Neither NumPy nor PIL is installed, sprite sheets cannot be created."
+
+    return error
+
+
+def validate_render_passes(caller, context):
+    """Validate the Extra Passes selection
+    The Mask pass is only available in Cycles, and data passes can only be saved without the view transform from Blender 3.x
+    """
+
+    addon_prop = get_settings(caller, context)
+    scn = context.scene
+
+    error = None
+
+    data_passes = [pass_id for pass_id in addon_prop.enum_render_passes if not RENDER_PASSES[pass_id][3]]
+
+    if 'MASK' in addon_prop.enum_render_passes and scn.render.engine != 'CYCLES':
+        error = "* The Mask pass requires the Cycles render engine."
+    elif data_passes and not hasattr(scn.render.image_settings, 'color_management') and scn.view_settings.view_transform != 'Raw':
+        error = "* This Blender version saves the Normal, Depth and Mask passes with the view transform, set it to Raw or upgrade to Blender 3.x."
+
+    return error
+
+
+def validate_resolution_variants(caller, context):
+    """Validate the Resolution Variants field
+    The field must be empty, or contain scales greater than 0 and less than 1 separated by commas
+    Resizing requires NumPy
+    """
+    from . compositor import numpy_installed
+
+    addon_prop = get_settings(caller, context)
+
+    error = None
+
+    if addon_prop.string_resolution_variants.strip() != "":
+        if not numpy_installed:
+            error = "* NumPy is not installed, resolution variants cannot be created."
+        else:
+            for element in addon_prop.string_resolution_variants.split(','):
+                try:
+                    scale = float(element)
+                except ValueError:
+                    scale = None
+                if scale == None or scale <= 0 or scale >= 1:
+                    error = "* Scales must be numbers between 0 and 1, separated by commas."
+
+    return error
+
+
+def validate_effects(caller, context):
+    """Validate the Effects options
+    Effects require NumPy
+    """
+    from . compositor import numpy_installed
+
+    addon_prop = get_settings(caller, context)
+
+    error = None
+
+    if addon_prop.enum_effects and not numpy_installed:
+        error = "* NumPy is not installed, effects cannot be applied."
+
+    return error
+
+
+def validate_animated_images(caller, context):
+    """Validate the Animated Images dropdown
+    All formats require NumPy, GIF and WebP also require Pillow
+    """
+    from . compositor import animation_format_available, numpy_installed
+
+    addon_prop = get_settings(caller, context)
+
+    error = None
+
+    if addon_prop.enum_animated_images != 'OFF' and not animation_format_available(addon_prop.enum_animated_images):
+        if not numpy_installed:
+            error = "* NumPy is not installed, animated images cannot be created."
+        else:
+            error = "* Pillow is not installed with support for this format."
+
+    return error
+
+
+def validate_delta_frames(caller, context):
+    """Validate the Delta Frames option
+    The patches are found with NumPy, and are only useful when packed into sprite sheets
+    """
+    from . compositor import numpy_installed
+
+    addon_prop = get_settings(caller, context)
+
+    error = None
+
+    if addon_prop.bool_delta_frames:
+        if not numpy_installed:
+            error = "* NumPy is not installed, delta frames cannot be created."
+        elif addon_prop.enum_sprite_sheet == 'OFF':
+            error = "* Delta frames require sprite sheets."
+
+    return error
+
+
+def validate_palette(caller, context):
+    """Validate the Palette option
+    Indexed sheets are built with NumPy and written as PNG files, and a palette image must exist
+    """
+    from . compositor import numpy_installed
+
+    addon_prop = get_settings(caller, context)
+
+    error = None
+
+    if addon_prop.enum_palette != 'OFF':
+        if not numpy_installed:
+            error = "* NumPy is not installed, a palette cannot be used."
+        elif addon_prop.enum_sprite_sheet == 'OFF':
+            error = "* A palette requires sprite sheets."
+        elif context.scene.render.image_settings.file_format != 'PNG':
+            error = "* A palette requires the PNG file format."
+        elif addon_prop.enum_palette == 'IMAGE' and not os.path.isfile(addon_prop.string_palette_image):
+            error = "* The palette image must be an existing file."
+
+    return error
+
+
+def validate_collision_data(caller, context):
+    """Validate the Collision Data option
+    The data is extracted with NumPy from the sprite sheets as they are merged, and delta frames only hold the changed parts of each frame
+    """
+    from . compositor import numpy_installed
+
+    addon_prop = get_settings(caller, context)
+
+    error = None
+
+    if addon_prop.bool_collision_data:
+        if not numpy_installed:
+            error = "* NumPy is not installed, collision data cannot be extracted."
+        elif addon_prop.enum_sprite_sheet == 'OFF':
+            error = "* Collision data requires sprite sheets."
+        elif addon_prop.bool_delta_frames:
+            error = "* Collision data cannot be extracted from delta frames."
+
+    return error
+
+
+def validate_batch_objects(caller, context):
+    """Validate the Render Objects Together option
+    The view layer for each object is built from the Collections isolation mode
+    Objects linked directly to the Scene Collection are in every view layer, so they would appear in the renders of other objects
     """
 
-    addon_prop = context.scene.addon_properties
+    addon_prop = get_settings(caller, context)
 
     error = None
 
-    if not pil_installed and addon_prop.enum_sprite_sheet != 'OFF':
-        error = "* PIL is not installed, sprite sheets cannot be created."
+    if addon_prop.bool_batch_objects and addon_prop.enum_isolation != 'COLLECTION':
+        error = "* Rendering objects together requires Collections isolation."
+    elif addon_prop.bool_batch_objects and addon_prop.pointer_output_parent != None:
+        parents = find_children(addon_prop.pointer_output_parent)
+        if addon_prop.enum_sprite_sheet == 'SPRITE':
+            parents = [obj for child in parents for obj in find_children(child)]
+        scene_objects = context.scene.collection.objects
+        for parent in parents:
+            linked = [obj.name for obj in [parent] + find_children(parent) if obj.name in scene_objects]
+            if linked:
+                error = "* {0} is linked directly to the Scene Collection, move it into a collection to render objects together.".format(linked[0])
+                break
 
     return error
 
@@ -330,7 +940,7 @@ def validate_output_order(caller,context):
     frame must come after track
     """
 
-    addon_prop = context.scene.addon_properties
+    addon_prop = get_settings(caller, context)
 
     error = None
 
@@ -379,7 +989,7 @@ def validate_output_orientation(caller,context):
     v represent vertical orientation
     """
 
-    addon_prop = context.scene.addon_properties
+    addon_prop = get_settings(caller, context)
 
     error = None
 
@@ -405,24 +1015,41 @@ def validate_output_orientation(caller,context):
     return error
 
 
-def validate_settings(caller, context):
-    """Run all validation functions, returning True if the all pass."""
+def get_validation_errors(caller, context):
+    """Run all validation functions, returning a list of every error found."""
+
+    errors = []
+
+    for validate in (validate_camera_parent,
+            validate_cameras,
+            validate_output_parent,
+            validate_output_path,
+            validate_sprite_dropdown,
+            validate_render_passes,
+            validate_effects,
+            validate_resolution_variants,
+            validate_animated_images,
+            validate_delta_frames,
+            validate_palette,
+            validate_collision_data,
+            validate_size_overrides,
+            validate_colour_variants,
+            validate_batch_objects,
+            validate_output_order,
+            validate_output_orientation):
+        error = validate(caller, context)
+        if isinstance(error, str):
+            errors.append(error)
+        elif error != None:
+            errors.extend(error)
+
+    return errors
 
-    ok = False
 
-    if (validate_camera_parent(caller, context) == None
-            and validate_camera_one(caller, context) == None
-            and validate_camera_two(caller, context) == None
-            and validate_camera_three(caller, context) == None
-            and validate_camera_four(caller, context) == None
-            and validate_output_parent(caller, context) == None
-            and validate_output_path(caller, context) == None
-            and validate_sprite_dropdown(caller, context) == None
-            and validate_output_order(caller, context) == None
-            and validate_output_orientation(caller, context) == None):
-        ok = True
+def validate_settings(caller, context):
+    """Run all validation functions, returning True if the all pass."""
 
-    return ok
+    return len(get_validation_errors(caller, context)) == 0
 
 class CreateOrthoTemplate_OT_Operator(bpy.types.Operator):
     """Create a cube dispalyed as a wireframe to represent an orthographic object bounding cube."""
@@ -622,6 +1249,57 @@ class LoadExample_OT_Operator(bpy.types.Operator):
         return {'FINISHED'}
 
 
+def move_data_up(obj_data, offset):
+    """Move the geometry of a mesh, curve or other object data up by offset, in the object's local space
+    Mesh vertices are moved in bulk with NumPy when it is installed
+    """
+    from . compositor import numpy, numpy_installed
+
+    if getattr(obj_data, 'is_editmode', False):
+        bm = bmesh.from_edit_mesh(obj_data)
+        bm.transform(mathutils.Matrix.Translation((0, 0, offset)))
+        bmesh.update_edit_mesh(obj_data, False, False)
+    elif numpy_installed and isinstance(obj_data, bpy.types.Mesh):
+        co = numpy.empty(len(obj_data.vertices) * 3, dtype=numpy.float32)
+        obj_data.vertices.foreach_get('co', co)
+        co[2::3] += offset
+        obj_data.vertices.foreach_set('co', co)
+    else:
+        obj_data.transform(mathutils.Matrix.Translation((0, 0, offset)))
+
+    obj_data.update()
+
+
+class AddCameraParent_OT_Operator(bpy.types.Operator):
+    """Add an entry to the list of camera parents.
+    """
+
+    bl_idname = 'view3d.add_camera_parent'
+    bl_label = "Add Camera Parent"
+    bl_description = "Add a camera rig parent to render from."
+
+    def execute(self, context):
+        context.scene.addon_properties.collection_cameras.add()
+        return {'FINISHED'}
+
+
+class RemoveCameraParent_OT_Operator(bpy.types.Operator):
+    """Remove an entry from the list of camera parents.
+    """
+
+    bl_idname = 'view3d.remove_camera_parent'
+    bl_label = "Remove Camera Parent"
+    bl_description = "Remove this camera rig parent from the list."
+
+    index: bpy.props.IntProperty(default=0)
+
+    def execute(self, context):
+        cameras = context.scene.addon_properties.collection_cameras
+        if self.index < len(cameras):
+            cameras.remove(self.index)
+        return {'FINISHED'}
+
+
 class OriginToFloor_OT_Operator(bpy.types.Operator):
     """Move the origin point of selected objects so that z = 0.
     """
@@ -633,20 +1311,26 @@ class OriginToFloor_OT_Operator(bpy.types.Operator):
 
     def execute(self, context):
 
-        for obj in bpy.context.selected_objects:
-            new_origin = mathutils.Vector((obj.matrix_world.translation[0], obj.matrix_world.translation[1], 0))
-            transform_matrix = mathutils.Matrix.Translation(obj.matrix_world.translation - new_origin)
-            obj_data = obj.data
-            if obj_data.is_editmode:
-                bm = bmesh.from_edit_mesh(obj_data)
-                bm.transform(transform_matrix)
-                bmesh.update_edit_mesh(obj_data, False, False)
-            else:
-                obj_data.transform(transform_matrix)
-
-            obj_data.update()
-
-            obj.matrix_world.translation = new_origin
+        # Group the objects by their data, so that data shared by several objects is only moved once
+        groups = {}
+        for obj in context.selected_objects:
+            if obj.data == None or not hasattr(obj.data, 'transform'):
+                print("{0} has no geometry, its origin was not moved".format(obj.name))
+                continue
+            groups.setdefault(obj.data, []).append(obj)
+
+        # The first object using the data is moved to z = 0, the others are moved by the same amount so their geometry stays in place
+        offsets = []
+        for obj_data, objects in groups.items():
+            offset = objects[0].matrix_world.translation[2]
+            if offset != 0:
+                move_data_up(obj_data, offset)
+                offsets += [(obj, offset) for obj in objects]
+
+        for obj, offset in offsets:
+            translation = obj.matrix_world.translation
+            translation[2] -= offset
+            obj.matrix_world.translation = translation
 
         return {'FINISHED'}
 
@@ -665,6 +1349,13 @@ class RenderSprites():
     cameras = None
     i_current_camera = 0
 
+    # The camera parents and their child cameras, found once for the whole job
+    camera_parents = None
+    camera_objects = None
+
+    # The children of each parent object shown and hidden while rendering, by parent name, see show_subtree()
+    subtrees = None
+
     frames = None
     i_current_frame = 0
 
@@ -681,9 +1372,12 @@ class RenderSprites():
     output_order = None
     output_orientation = None
 
-    # This is used to get properties from the Blender UI
+    # This is used to get the scene from the Blender UI
     context = None
 
+    # The addon properties of the scene, or the settings of a job spec, see api.py
+    settings = None
+
     # These variables are used to store the initial scene layout so that it can be reset once rendering is completed
     cam_orig_location = None
     cam_orig_rotation = None
@@ -692,23 +1386,119 @@ class RenderSprites():
     orig_frame = None
     orig_render_path = None
     orig_visibility = None
+    orig_use_nodes = None
+    orig_use_compositing = None
+    orig_pass_settings = None
+
+    # The scene's resolution and the orthographic scale of each camera before rendering, set if any parent overrides them, see setup_render_size()
+    orig_render_size = None
+
+    # The scene's simplify settings before rendering, and the settings needed for each object and camera, see setup_simplify()
+    orig_simplify = None
+    simplify_cache = None
+
+    # The view layer rendered, and the changes made to the scene by prepare_isolation()
+    render_layer = None
+    isolation_collections = None
+    isolation_names = None
+    # Objects linked directly to the Scene Collection are in every view layer, so they are hidden from the render instead, see set_isolated()
+    # scene_objects holds those belonging to each isolated parent by the parent's name, orig_scene_visibility their original visibility
+    scene_objects = None
+    orig_scene_visibility = None
+    orig_layer_use = None
+    orig_window_layer = None
+
+    # The view layer of each object parent when rendering objects together, see prepare_isolation()
+    object_layers = None
+    # The (object, track, frame) indexes of each object in the current render, see get_batch()
+    batch = None
+    # The delta location of each object moved to the first object of the current render, by name, see setup_object()
+    orig_delta_locations = None
+    # The objects, tracks, cameras, angles and frames already rendered with another object, see get_job_key()
+    batched = None
+
+    # Compositor nodes added to write the extra render passes, and the File Output node for each pass
+    pass_nodes = None
+    pass_outputs = None
+    # The Map Range nodes scaling the Depth pass by the clip range of the current camera, see set_depth_range()
+    depth_ranges = None
+
+    # The mirror angle shift and mirror plane normal for each symmetric object and camera pair, see get_mirror()
+    mirrors = None
+
+    # Object parents that render identically to an earlier object parent are not rendered, the earlier object's renders are linked instead
+    # duplicate_of maps each duplicate's name to the object it copies, duplicates maps each rendered object's name to its duplicates
+    duplicate_of = None
+    duplicates = None
+
+    # The position of every render in each merged image, by file path, used to write the sprite sheet metadata
+    sheet_cells = None
+    # The merged images that are one page of a larger image
+    page_files = None
+
+    # The metadata file of every sprite sheet written
+    written_sheets = None
+
+    # The hashes of the sprite sheets of the last build, sheets that have not changed are not written again
+    output_digests = None
+
+    # The FrameStore of each sheet group folder, holding its renders and merged images as raw pixels, or None if NumPy is not installed, see get_frame_store()
+    frame_stores = None
+
+    # Maps the sprite sheets of the main image to the shared palette, see get_palette()
+    palette_mapper = None
+
+    # Saves and links the mirrored and duplicate outputs of each render while the next sprite renders, see write_outputs()
+    output_writer = None
+    # Encodes the animated images of each track as their frames are rendered
+    animation_writer = None
+    # The animation frames of each render of the main image that are added once its effects are applied, by render path, see add_animation_frames()
+    effect_frames = None
+
+    # The colour variants of each object parent that has any, by name, see find_colour_variants()
+    colour_variants = None
+
+    # The patches of each animation track stored as delta frames, by output root, and the output root being merged
+    delta_animations = None
+    # The normalised paths of the frames replaced by patches, which are kept with the renders but not merged
+    delta_replaced = None
+    merge_root = None
+    # The pass id of the output root being merged, and the collision data of the renders in the sprite sheet being merged
+    merge_pass = None
+    collision_frames = None
+    # The scale of the resolution variant being merged, None for full resolution roots
+    merge_scale = None
+    # The collision data of every render taken before the effects were applied, by (scale, cell name), see write_effects()
+    effect_collision = None
+
+    # The File Output nodes written by the current render and the number of compositor nodes before it, see end_render()
+    render_outputs = None
+    render_node_count = None
+    # True from starting a render without waiting for it until end_render() is called, the scene must not be changed in between
+    render_running = False
 
     # This is used to tell an outer loop calling iterate() if the program is currently doing an iteration
     # This allows for the outer loop to call cleanup() if the loop is cancelled part way through
     iterating = False
 
-    def __init__(self, context):
-        """ Initialise the renderer"""
+    def __init__(self, context, settings=None):
+        """ Initialise the renderer
+        If settings is None the addon properties of the scene are used
+        """
 
         # Set the context for retreiving UI options
         self.context = context
+        self.settings = settings
+        if settings == None:
+            self.settings = context.scene.addon_properties
 
         # Check that all options have been set correctly
-        if not validate_settings(self, context):
-            raise ValidationError
+        errors = get_validation_errors(self, context)
+        if errors:
+            raise ValidationError('\n'.join(errors))
 
         # Get the current settings from the UI
-        addon_prop = self.context.scene.addon_properties
+        addon_prop = self.settings
 
         output_order_string = addon_prop.string_output_order
         output_orientation_string = addon_prop.string_output_orientation
@@ -716,20 +1506,35 @@ class RenderSprites():
         self.output_order = output_order_string.split(',')
         self.output_orientation = output_orientation_string.split(',')
 
+        self.camera_parents = get_camera_parents(addon_prop)
+        self.camera_objects = [find_children(camera_parent, 'CAMERA')[0] for camera_parent in self.camera_parents]
+        self.subtrees = {}
+
+        self.mirrors = {}
+        self.find_duplicates()
+        self.sheet_cells = {}
+        self.page_files = set()
+        self.written_sheets = []
+
         self.prepare_render()
 
     def iterate(self):
         """ Wraps a single iteration of the renderer with cleanup code and output flags
         Returns True if rendering has not finished, False if it has finished
         """
-        # Get the current settings from the UI
-        addon_prop = self.context.scene.addon_properties
-
-        self.iterating = True
         self.render_iteration()
-        self.iterating = False
 
-        finished = False
+        finished = self.next_iteration()
+        if finished:
+            self.finish_outputs()
+            self.cleanup()
+
+        return finished
+
+    def next_iteration(self):
+        """ Increments the list indexes to the next iteration
+        Returns True if every iteration has been done
+        """
 
         # Increment all list indexes
         # Starts at the innermost level, if this value wraps round it increments the next level out once
@@ -737,34 +1542,99 @@ class RenderSprites():
         for level_index in range(len(self.output_order)-1, -1, -1):
             wrap = self.incr_index(level_index)
             if not wrap:
-                break
-            elif level_index == 0 and wrap:
-                finished = True
-                if addon_prop.enum_sprite_sheet != 'OFF':
-                    self.merge_images(addon_prop.string_output_path, True)
-                self.cleanup()
+                return False
 
-        return finished
+        return True
 
-    def incr_index(self, level_index):
-        """ This function increments an index based on the level and the output order
-        If the index wraps then it outputs True, otherwise it outputs False
+    def start_async(self):
+        """ Starts rendering the first sprite without waiting for the render to finish, see end_async()
+        Returns True if a render was started, or False if there was nothing to render and the outputs have been finished
         """
 
-        index_type = self.output_order[level_index]
+        if self.start_next_render():
+            return True
 
-        wrap = False
+        self.finish_outputs()
+        self.cleanup()
+        return False
 
-        if index_type == "angle":
-            self.i_current_angle += 1
-            # Wrap the index if it goes past the end of the list
-            self.i_current_angle %= len(self.angles)
-            if self.i_current_angle == 0:
-                wrap = True
-        elif index_type == "camera":
-            self.i_current_camera += 1
-            # Wrap the index if it goes past the end of the list
-            self.i_current_camera %= len(self.cameras)
+    def end_async(self, cancelled=False):
+        """ Must be called once the render started by start_async() or end_async() has completed or been cancelled
+        If cancelled is False the outputs of the finished sprite are written, then the next render is started
+        The renders are read through bpy.data, which is not safe while a render is running, and the files are written while the next render runs, see write_outputs()
+        Returns True if another render was started, or False if rendering has finished and the outputs have been finished
+        If cancelled is True the scene is reset from the render and False is returned, cleanup() must then be called
+        """
+
+        self.end_render()
+        if cancelled:
+            return False
+
+        self.write_outputs()
+        rendering = not self.next_iteration() and self.start_next_render()
+
+        if not rendering:
+            self.finish_outputs()
+            self.cleanup()
+        return rendering
+
+    def start_next_render(self):
+        """ Starts rendering the current sprite, or the first one after it that needs rendering, without waiting for the render to finish
+        Returns False if there are no sprites left to render
+        """
+
+        while not self.start_iteration(True):
+            if self.next_iteration():
+                return False
+
+        return True
+
+    def count_iterations(self):
+        """ Counts the number of times iterate() needs to be called to render every sprite, without rendering anything
+        This must be called before rendering starts
+        """
+
+        return sum(1 for i in self.plan_iterations())
+
+    def plan_iterations(self):
+        """ Steps through every iteration without rendering anything, yielding with the lists and indexes set as they are when each sprite is rendered
+        This must be called before rendering starts or once it has finished, and must be run to the end
+        """
+
+        finished = False
+        while not finished:
+            for level_index in range(0, len(self.output_order)):
+                self.update_lists(level_index)
+            yield
+            for level_index in range(len(self.output_order)-1, -1, -1):
+                if not self.incr_index(level_index):
+                    break
+                elif level_index == 0:
+                    finished = True
+
+        # All indexes have wrapped back to 0, clear the lists so they are rebuilt by the first iteration
+        for level_index in range(0, len(self.output_order)):
+            self.update_lists(level_index, reset=True)
+
+    def incr_index(self, level_index):
+        """ This function increments an index based on the level and the output order
+        If the index wraps then it outputs True, otherwise it outputs False
+        """
+
+        index_type = self.output_order[level_index]
+
+        wrap = False
+
+        if index_type == "angle":
+            self.i_current_angle += 1
+            # Wrap the index if it goes past the end of the list
+            self.i_current_angle %= len(self.angles)
+            if self.i_current_angle == 0:
+                wrap = True
+        elif index_type == "camera":
+            self.i_current_camera += 1
+            # Wrap the index if it goes past the end of the list
+            self.i_current_camera %= len(self.cameras)
             if self.i_current_camera == 0:
                 wrap = True
         elif index_type == "frame":
@@ -801,7 +1671,7 @@ class RenderSprites():
         If reset is True then the list is set to None
         """
 
-        addon_prop = self.context.scene.addon_properties
+        addon_prop = self.settings
 
         list_type = self.output_order[level_index]
 
@@ -813,17 +1683,7 @@ class RenderSprites():
                 self.angles = None
         elif list_type == "camera":
             if not reset:
-                # Returns a list of pointers to the camera objects
-                cameras = []
-                if addon_prop.pointer_camera_one != None:
-                    cameras.append(addon_prop.pointer_camera_one)
-                if addon_prop.pointer_camera_two != None:
-                    cameras.append(addon_prop.pointer_camera_two)
-                if addon_prop.pointer_camera_three != None:
-                    cameras.append(addon_prop.pointer_camera_three)
-                if addon_prop.pointer_camera_four != None:
-                    cameras.append(addon_prop.pointer_camera_four)
-                self.cameras = cameras
+                self.cameras = self.get_camera_list()
             else:
                 self.cameras = None
         elif list_type == "frame":
@@ -856,27 +1716,7 @@ class RenderSprites():
                 self.objects = None
         elif list_type == "sheet":
             if not reset:
-                # Get the scenes root empty node
-                output = addon_prop.pointer_output_parent
-                # 2d array, where each row represents the sprite sheets, and columns represent the objects for each sprite
-                # [[...],[...],[...]]
-                # [.................] = List of sprite sheets
-                #  [...] [...] [...]  = Lists of object pointers
-                sheet_array = []
-                sheet_option = addon_prop.enum_sprite_sheet
-                if sheet_option in ('OFF', 'OUTPUT'):
-                    # For simplification OFF will be set up as if for OUTPUT, and will simply skip the composition stage
-                    # One sprite sheet containing all objects
-                    sheet_array.append(find_children(output))
-                elif sheet_option == 'SPRITE':
-                    # Multiple sprite sheets containing multiple objects
-                    for child in find_children(output):
-                        sheet_array.append(find_children(child))
-                elif sheet_option == 'OBJECT':
-                    # Multiple sprite sheets containing a single object each
-                    for child in find_children(output):
-                        sheet_array.append([child])
-                self.sheets = sheet_array
+                self.sheets = self.get_sheet_array()
             else:
                 self.sheets = None
         elif list_type == "track":
@@ -893,6 +1733,39 @@ class RenderSprites():
 
         return self.get_list(level_index)
 
+    def get_camera_list(self):
+        """ Returns a list of pointers to the camera parent objects"""
+
+        return list(self.camera_parents)
+
+    def get_sheet_array(self):
+        """ Gets the objects to render for each sprite sheet based on the Sprite Sheets option"""
+
+        addon_prop = self.settings
+
+        # Get the scenes root empty node
+        output = addon_prop.pointer_output_parent
+        # 2d array, where each row represents the sprite sheets, and columns represent the objects for each sprite
+        # [[...],[...],[...]]
+        # [.................] = List of sprite sheets
+        #  [...] [...] [...]  = Lists of object pointers
+        sheet_array = []
+        sheet_option = addon_prop.enum_sprite_sheet
+        if sheet_option in ('OFF', 'OUTPUT'):
+            # For simplification OFF will be set up as if for OUTPUT, and will simply skip the composition stage
+            # One sprite sheet containing all objects
+            sheet_array.append(find_children(output))
+        elif sheet_option == 'SPRITE':
+            # Multiple sprite sheets containing multiple objects
+            for child in find_children(output):
+                sheet_array.append(find_children(child))
+        elif sheet_option == 'OBJECT':
+            # Multiple sprite sheets containing a single object each
+            for child in find_children(output):
+                sheet_array.append([child])
+
+        return sheet_array
+
     def get_list(self, level_index):
         """ Gets a list for a group level as specified by the output order"""
 
@@ -914,7 +1787,7 @@ class RenderSprites():
     def get_item_string(self, level_index):
         """ Gets a string for use in output folders and files for a group level"""
 
-        addon_prop = self.context.scene.addon_properties
+        addon_prop = self.settings
 
         item_type = self.output_order[level_index]
 
@@ -934,12 +1807,317 @@ class RenderSprites():
             else:
                 return "Static"
 
+    def get_item_strings(self, **indexes):
+        """ Gets the strings for every group level
+        List indexes can be given to use in place of the current ones, eg angle=2
+        """
+
+        current_indexes = {}
+        for item_type, index in indexes.items():
+            current_indexes[item_type] = getattr(self, 'i_current_' + item_type)
+            setattr(self, 'i_current_' + item_type, index)
+
+        item_strings = [self.get_item_string(level_index) for level_index in range(len(self.output_order))]
+
+        for item_type, index in current_indexes.items():
+            setattr(self, 'i_current_' + item_type, index)
+
+        return item_strings
+
+    def get_mirror(self):
+        """ Gets the mirror settings for the current object and camera as (shift, axis), or None if the object is not mirrored
+        The render of angle i is the horizontal mirror image of the render of angle (shift - i)
+        axis is the world space normal of the object's plane of symmetry, its local X axis
+        """
+
+        obj = self.objects[self.i_current_object]
+        cam_parent = self.cameras[self.i_current_camera]
+
+        key = (obj.name, cam_parent.name)
+        if key not in self.mirrors:
+            self.mirrors[key] = self.calculate_mirror(obj, cam_parent, self.camera_objects[self.i_current_camera])
+
+        return self.mirrors[key]
+
+    def calculate_mirror(self, obj, cam_parent, obj_cam):
+        """ Calculates the mirror settings returned by get_mirror()
+        This must be called while the camera parent is at its original rotation
+        """
+        from . compositor import get_image_backend
+
+        addon_prop = self.settings
+
+        if not obj.get(MIRROR_PROPERTY) or get_image_backend() == None:
+            return None
+
+        # The horizontal direction the camera faces, using the up direction as well for cameras looking straight down
+        cam_matrix = obj_cam.matrix_world.to_3x3()
+        view = cam_matrix @ mathutils.Vector((0, 0, -1)) + cam_matrix @ mathutils.Vector((0, 1, 0))
+        if math.hypot(view.x, view.y) < 0.000001:
+            return None
+        cam_yaw = math.degrees(math.atan2(view.y, view.x)) - math.degrees(cam_parent.rotation_euler.z)
+
+        # Mirroring the object in its local X axis maps a view from direction d to a view from direction 180 + 2 * object yaw - d
+        obj_matrix = obj.matrix_world.to_3x3()
+        obj_yaw = math.degrees(math.atan2(obj_matrix[1][0], obj_matrix[0][0]))
+        shift = (180 + 2 * obj_yaw - 2 * cam_yaw) / (360 / addon_prop.int_camera_angles)
+
+        # Only use the mirror if it falls on one of the camera angles
+        if abs(shift - round(shift)) > 0.001:
+            print("{0} cannot be mirrored for {1}, rendering all angles".format(obj.name, cam_parent.name))
+            return None
+
+        axis = obj_matrix @ mathutils.Vector((1, 0, 0))
+        axis.normalize()
+
+        return (int(round(shift)) % addon_prop.int_camera_angles, tuple(axis))
+
+    def get_mirror_angle(self):
+        """ Gets the index of the angle that mirrors the current angle, or None if the current object is not mirrored"""
+
+        mirror = self.get_mirror()
+        if mirror == None:
+            return None
+        return (mirror[0] - self.i_current_angle) % len(self.angles)
+
+    def read_render_images(self, angles):
+        """ Reads the current render of each render folder tree, for the mirrored outputs, animation frames and frame stores at each of the given angle indexes
+        Returns the arrays for each angle by root, the renders are flipped for the mirrored angle, or None if no outputs need them
+        """
+        from . compositor import get_image_backend, mirror_image
+
+        scn = self.context.scene
+
+        animated = self.animation_writer != None and len(self.frames) >= 2
+        if len(angles) < 2 and not animated and self.frame_stores == None:
+            return None
+
+        backend = get_image_backend(file_format=scn.render.image_settings.file_format)
+        item_strings = self.get_item_strings()
+        images = {angle: {} for angle in angles}
+
+        for root, pass_id in self.get_render_roots():
+            folder, name = self.get_output_path(root, item_strings)
+            image = backend.load(os.path.join(folder, name + scn.render.file_extension))
+            array = backend.to_array(image)
+            backend.release(image)
+
+            images[self.i_current_angle][root] = array
+            for angle in angles[1:]:
+                images[angle][root] = mirror_image(array, self.get_mirror()[1] if pass_id == 'NORMAL' else None)
+
+        return images
+
+    def write_mirror_outputs(self, images):
+        """ Saves the horizontally flipped copies of the current render and passes for the mirrored camera angle, see read_render_images()
+        The angle with the lower index of each pair is rendered, the other is written here
+        """
+        from . compositor import get_image_backend
+
+        scn = self.context.scene
+
+        mirror_angle = self.get_mirror_angle()
+        if mirror_angle == None or mirror_angle <= self.i_current_angle:
+            return
+
+        backend = get_image_backend(file_format=scn.render.image_settings.file_format)
+        mirror_strings = self.get_item_strings(angle=mirror_angle)
+
+        for root, pass_id in self.get_render_roots():
+            mirror_folder, mirror_name = self.get_output_path(root, mirror_strings)
+            self.save_output(backend, images[mirror_angle][root], os.path.join(mirror_folder, mirror_name + scn.render.file_extension))
+
+    def save_output(self, backend, array, path):
+        """ Saves an array to path, in the output writer's thread if the backend does not need bpy to save it"""
+
+        def save():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            backend.save(backend.from_array(array), path)
+
+        if backend.threaded_save:
+            self.output_writer.submit(save)
+        else:
+            save()
+
+    def find_duplicates(self):
+        """ Groups the object parents by their fingerprint so that each group is only rendered once"""
+
+        self.duplicate_of = {}
+        self.duplicates = {}
+
+        fingerprints = {}
+        for sheet in self.get_sheet_array():
+            for obj in sheet:
+                # Objects rendered at a different size are not duplicates
+                fingerprint = (get_subtree_fingerprint(obj), get_size_override([obj, obj.parent]))
+                if fingerprint in fingerprints:
+                    original = fingerprints[fingerprint]
+                    self.duplicate_of[obj.name] = original
+                    self.duplicates[original.name].append(obj)
+                else:
+                    fingerprints[fingerprint] = obj
+                    self.duplicates[obj.name] = []
+
+        if self.duplicate_of:
+            print("Found {0} duplicate objects, these will be copied rather than rendered".format(len(self.duplicate_of)))
+
+    def store_render_images(self, angles, images):
+        """ Copies the images read by read_render_images() for the current object at each of the given angle indexes, and for its duplicates,
+        into the frame stores of their sheet groups, so the renders are not decoded again when the sprite sheets are merged
+        The images are written in the output writer's thread, after the mirrored and duplicate files they stand in for
+        """
+
+        scn = self.context.scene
+
+        if self.frame_stores == None:
+            return
+
+        duplicates = self.duplicates.get(self.objects[self.i_current_object].name, [])
+
+        slots = []
+        for angle in angles:
+            item_strings = self.get_item_strings(angle=angle)
+            for strings in [item_strings] + [self.get_duplicate_strings(item_strings, duplicate) for duplicate in duplicates]:
+                for root, pass_id in self.get_render_roots():
+                    folder, name = self.get_output_path(root, strings)
+                    store = self.get_frame_store(root, folder)
+                    if store != None:
+                        slots.append((store, os.path.join(folder, name + scn.render.file_extension), images[angle][root]))
+
+        def write():
+            for store, path, image in slots:
+                store.write(path, image)
+
+        self.output_writer.submit(write)
+
+    def get_frame_store(self, root, folder):
+        """ Gets the frame store of the sheet group holding a folder of an output folder tree, creating it the first time it is used
+        Each folder at the first level of an output root is merged into one sprite sheet, and its images are held in a store file beside it
+        Returns None if the frame stores are not used, or if the folder is the output root itself
+        """
+        from . compositor import FrameStore
+
+        if self.frame_stores == None:
+            return None
+
+        relative = os.path.relpath(folder, root)
+        if relative == os.curdir or relative.startswith(os.pardir):
+            return None
+
+        group = os.path.normpath(os.path.join(root, relative.split(os.sep)[0]))
+        if group not in self.frame_stores:
+            self.frame_stores[group] = FrameStore(os.path.join(root, FRAME_STORE_NAME.format(os.path.basename(group))))
+
+        return self.frame_stores[group]
+
+    def close_frame_stores(self, root=None):
+        """ Closes and deletes the frame stores of the sheet groups of an output root once its sprite sheets have been merged, or every store if root is None"""
+
+        for group in list(self.frame_stores):
+            if root == None or os.path.dirname(group) == os.path.normpath(root):
+                self.frame_stores.pop(group).close()
+
+    def write_duplicate_outputs(self, angles):
+        """ Links the files written for the current object at each of the given angle indexes into the output folders of its duplicates
+        The files are linked in the output writer's thread, after the mirrored outputs it is saving
+        """
+
+        scn = self.context.scene
+
+        duplicates = self.duplicates.get(self.objects[self.i_current_object].name)
+        if not duplicates:
+            return
+
+        links = []
+        for angle in angles:
+            item_strings = self.get_item_strings(angle=angle)
+            for duplicate in duplicates:
+                duplicate_strings = self.get_duplicate_strings(item_strings, duplicate)
+                for root, pass_id in self.get_render_roots():
+                    source_folder, source_name = self.get_output_path(root, item_strings)
+                    folder, name = self.get_output_path(root, duplicate_strings)
+                    links.append((os.path.join(source_folder, source_name + scn.render.file_extension), os.path.join(folder, name + scn.render.file_extension)))
+
+        def link():
+            for source_path, destination_path in links:
+                link_file(source_path, destination_path)
+
+        self.output_writer.submit(link)
+
+    def get_duplicate_strings(self, item_strings, duplicate):
+        """ Gets the item strings of a duplicate object from the item strings of the object it copies"""
+
+        duplicate_strings = list(item_strings)
+        duplicate_strings[self.output_order.index("object")] = duplicate.name
+        duplicate_strings[self.output_order.index("sheet")] = duplicate.parent.name
+
+        return duplicate_strings
+
+    def add_animation_frames(self, angles, images):
+        """ Adds the images read by read_render_images() for the current object at each of the given angle indexes, and for its duplicates, to their animated images
+        The frames of each track at each camera and angle are saved as an animated image inside the animation folder of each render folder tree
+        """
+        from . compositor import ANIMATION_EXTENSIONS
+
+        scn = self.context.scene
+        addon_prop = self.settings
+
+        # Objects without animation only have a single frame
+        if self.animation_writer == None or len(self.frames) < 2:
+            return
+
+        extension = ANIMATION_EXTENSIONS[addon_prop.enum_animated_images]
+        frame_level = self.output_order.index("frame")
+        duplicates = self.duplicates.get(self.objects[self.i_current_object].name, [])
+
+        for angle in angles:
+            item_strings = self.get_item_strings(angle=angle)
+            all_strings = [item_strings] + [self.get_duplicate_strings(item_strings, duplicate) for duplicate in duplicates]
+            for strings in all_strings:
+                track_strings = strings[:frame_level] + strings[frame_level + 1:]
+                for root, pass_id in self.get_render_roots():
+                    folder, name = self.get_output_path(root, strings)
+                    render_path = os.path.normpath(os.path.join(folder, name + scn.render.file_extension))
+                    animation_folder, animation_name = self.get_output_path(self.get_animation_root(root), track_strings)
+                    frame = (os.path.join(animation_folder, animation_name + extension), self.i_current_frame, len(self.frames))
+
+                    # Effects are applied to the renders once rendering has finished, so these frames are added by write_effects()
+                    if pass_id == None and addon_prop.enum_effects:
+                        self.effect_frames.setdefault(render_path, []).append(frame)
+                        continue
+
+                    self.animation_writer.add_frame(*frame, images[angle][root])
+
     def prepare_render(self):
         """Sets the visibility of objects ready for rendering"""
+        from . compositor import AnimationWriter, OutputWriter, numpy_installed
 
-        addon_prop = self.context.scene.addon_properties
+        addon_prop = self.settings
         global_parent = addon_prop.pointer_global_parent
 
+        self.render_layer = self.context.view_layer
+
+        self.prepare_render_size()
+
+        # Each render is copied into the frame store of its sheet group once it has been read, so it is not decoded again to merge the sprite sheets
+        if addon_prop.enum_sprite_sheet != 'OFF' and numpy_installed:
+            self.frame_stores = {}
+
+        if addon_prop.bool_auto_simplify:
+            self.prepare_simplify()
+
+        self.output_writer = OutputWriter()
+
+        if addon_prop.enum_animated_images != 'OFF':
+            scn = self.context.scene
+            self.animation_writer = AnimationWriter(addon_prop.enum_animated_images, scn.render.fps / scn.render.fps_base)
+            self.effect_frames = {}
+
+        if addon_prop.enum_isolation == 'COLLECTION':
+            self.prepare_isolation()
+            self.prepare_passes()
+            return
+
         self.orig_visibility = []
 
         # Hide all objects
@@ -952,47 +2130,1027 @@ class RenderSprites():
             for child in find_children(global_parent):
                 child.hide_render = False
 
+        self.prepare_passes()
+
+    def prepare_render_size(self):
+        """Saves the scene's resolution and the orthographic scale of each camera if any parent overrides them, setup_render_size() changes them for each render"""
+
+        scn = self.context.scene
+
+        parents = list(self.camera_parents)
+        for sheet in self.get_sheet_array():
+            for obj in sheet:
+                parents.append(obj)
+                if obj.parent not in parents:
+                    parents.append(obj.parent)
+        if not any(get_size_override([parent]) != (None, None) for parent in parents):
+            return
+
+        self.orig_render_size = (scn.render.resolution_x, scn.render.resolution_y, [obj_cam.data.ortho_scale for obj_cam in self.camera_objects])
+
+    def get_render_size(self, obj):
+        """ Gets the (width, height) resolution and orthographic scale to render an object parent with from the current camera
+        The object parent's custom properties are used first, then its sprite sheet parent's and then the camera parent's, otherwise the scene's settings are used
+        """
+
+        resolution, ortho_scale = get_size_override([obj, obj.parent, self.cameras[self.i_current_camera]])
+        width, height, ortho_scales = self.orig_render_size
+        if resolution == None:
+            resolution = (width, height)
+        if ortho_scale == None:
+            ortho_scale = ortho_scales[self.i_current_camera]
+
+        return (resolution[0], resolution[1], ortho_scale)
+
+    def setup_render_size(self):
+        """ Sets the resolution and orthographic scale of the current render
+        Settings are only changed when they differ, so sprites of the same size do not make Blender update the scene
+        """
+
+        scn = self.context.scene
+
+        width, height, ortho_scale = self.get_render_size(self.objects[self.i_current_object])
+        if scn.render.resolution_x != width:
+            scn.render.resolution_x = width
+        if scn.render.resolution_y != height:
+            scn.render.resolution_y = height
+        obj_cam = self.camera_objects[self.i_current_camera]
+        if obj_cam.data.type == 'ORTHO' and obj_cam.data.ortho_scale != ortho_scale:
+            obj_cam.data.ortho_scale = ortho_scale
+
+    def cleanup_render_size(self):
+        """Reverts the changes made by setup_render_size()"""
+
+        scn = self.context.scene
+
+        scn.render.resolution_x, scn.render.resolution_y, ortho_scales = self.orig_render_size
+        for obj_cam, ortho_scale in zip(self.camera_objects, ortho_scales):
+            obj_cam.data.ortho_scale = ortho_scale
+        self.orig_render_size = None
+
+    def prepare_simplify(self):
+        """Saves the scene's simplify settings, which setup_simplify() changes for each render"""
+
+        scn = self.context.scene
+        render = scn.render
+
+        # The texture limit is a Cycles setting, so is not available when Cycles is disabled
+        cycles = getattr(scn, 'cycles', None)
+        texture_limit = cycles.texture_limit_render if cycles != None else None
+
+        self.orig_simplify = (render.use_simplify, render.simplify_subdivision_render, render.simplify_child_particles_render, texture_limit)
+        self.simplify_cache = {}
+
+    def setup_simplify(self):
+        """ Caps the subdivision levels, child particles and texture size of the render to the detail that can be seen in the current sprite
+        The simplify settings apply to the whole scene, so the most detailed of the objects rendered together and the Global Parent is used
+        If the scene already had simplify enabled, its settings are kept where they are lower
+        """
+
+        scn = self.context.scene
+        render = scn.render
+        global_parent = self.settings.pointer_global_parent
+
+        use_simplify, max_levels, max_children, texture_limit = self.orig_simplify
+        if not use_simplify:
+            max_levels = MAX_SIMPLIFY_LEVELS
+            max_children = 1.0
+            if texture_limit != None:
+                texture_limit = 'OFF'
+
+        parents = [self.objects[job[0]] for job in self.batch]
+        if global_parent != None:
+            parents.append(global_parent)
+
+        levels = 0
+        children = 0.0
+        texture_size = 0
+        for parent in parents:
+            parent_levels, parent_children, parent_size = self.get_simplify(parent)
+            levels = max(levels, parent_levels)
+            children = max(children, parent_children)
+            texture_size = max(texture_size, parent_size)
+
+        # Settings are only changed when they differ, as each change makes Blender evaluate the scene again
+        levels = min(levels, max_levels)
+        children = min(children, max_children)
+        if not render.use_simplify:
+            render.use_simplify = True
+        if render.simplify_subdivision_render != levels:
+            render.simplify_subdivision_render = levels
+        if render.simplify_child_particles_render != children:
+            render.simplify_child_particles_render = children
+
+        if texture_limit != None:
+            limit = 'OFF'
+            for size in TEXTURE_LIMITS:
+                if size >= texture_size:
+                    limit = str(size)
+                    break
+            if texture_limit != 'OFF' and (limit == 'OFF' or int(limit) > int(texture_limit)):
+                limit = texture_limit
+            if scn.cycles.texture_limit_render != limit:
+                scn.cycles.texture_limit_render = limit
+
+    def get_simplify(self, parent):
+        """ Gets the subdivision levels, fraction of child particles and texture size in pixels needed to render a parent object and its children
+        from the current camera, see setup_simplify()
+        A subdivision level is only needed if it splits the edges of the mesh into pieces at least the detail size on screen,
+        the edge length is estimated from the size of the mesh on screen and its number of vertices
+        Child particles are reduced so that there is one for each detail sized area of the object, and textures are limited to the object's size on screen
+        """
+
+        scn = self.context.scene
+        detail = self.settings.float_simplify_detail
+
+        # The camera parent is moved to each object, so the number of pixels for each unit at the object only depends on the camera and the render size
+        camera_parent = self.cameras[self.i_current_camera]
+        obj_cam = self.camera_objects[self.i_current_camera]
+        if obj_cam.data.type == 'ORTHO':
+            view_size = obj_cam.data.ortho_scale
+        else:
+            distance = (obj_cam.matrix_world.to_translation() - camera_parent.matrix_world.to_translation()).length
+            view_size = 2 * distance * math.tan(obj_cam.data.angle / 2)
+        resolution = max(scn.render.resolution_x, scn.render.resolution_y) * scn.render.resolution_percentage / 100
+        scale = resolution / view_size if view_size > 0 else 0
+
+        key = (parent.name, scale)
+        if key in self.simplify_cache:
+            return self.simplify_cache[key]
+
+        levels = 0
+        children = 0.0
+        size = 0.0
+        for obj in [parent] + find_children(parent):
+            if obj.type not in GEOMETRY_TYPES:
+                continue
+
+            # The largest dimension of the object's bounding box in world space, in pixels
+            corners = [obj.matrix_world @ mathutils.Vector(corner) for corner in obj.bound_box]
+            extent = max(max(corner[i] for corner in corners) - min(corner[i] for corner in corners) for i in range(3)) * scale
+            size = max(size, extent)
+
+            if obj.type != 'MESH':
+                continue
+
+            vertex_count = len(obj.data.vertices)
+            if vertex_count > 0:
+                edge = extent / math.sqrt(vertex_count)
+                if edge >= detail * 2:
+                    levels = max(levels, min(MAX_SIMPLIFY_LEVELS, int(math.log2(edge / detail))))
+
+            for particle_system in obj.particle_systems:
+                settings = particle_system.settings
+                count = settings.count * settings.rendered_child_count
+                if settings.child_type != 'NONE' and count > 0:
+                    children = max(children, min(1.0, (extent / detail) ** 2 / count))
+
+        self.simplify_cache[key] = (levels, children, math.ceil(size))
+        return self.simplify_cache[key]
+
+    def cleanup_simplify(self):
+        """Reverts the changes made by setup_simplify()"""
+
+        scn = self.context.scene
+        render = scn.render
+
+        render.use_simplify, render.simplify_subdivision_render, render.simplify_child_particles_render, texture_limit = self.orig_simplify
+        if texture_limit != None:
+            scn.cycles.texture_limit_render = texture_limit
+        self.orig_simplify = None
+        self.simplify_cache = None
+
+    def prepare_isolation(self):
+        """ Creates a temporary view layer to render from, containing a collection for the global parent, each camera parent and each object parent
+        Each collection is excluded from the view layer until its camera or object is rendered, so hidden objects are not evaluated
+        The objects are linked into the new collections as well as their own, and the scene's collections are left as they are
+        """
+
+        scn = self.context.scene
+        addon_prop = self.settings
+        global_parent = addon_prop.pointer_global_parent
+
+        self.isolation_collections = []
+        self.isolation_names = {}
+        self.scene_objects = {}
+        self.orig_scene_visibility = []
+        self.orig_layer_use = []
+
+        root = bpy.data.collections.new(ISOLATION_NAME)
+        scn.collection.children.link(root)
+        self.isolation_collections.append(root)
+
+        # Link each parent and its children into their own collection
+        parents = [obj for sheet in self.get_sheet_array() for obj in sheet] + self.get_camera_list()
+        if global_parent != None:
+            parents.append(global_parent)
+        scene_objects = set(obj.name for obj in scn.collection.objects)
+        isolated = set()
+        for parent in parents:
+            if parent.name in self.isolation_names:
+                continue
+            collection = bpy.data.collections.new("{0} {1}".format(ISOLATION_NAME, parent.name))
+            root.children.link(collection)
+            self.isolation_collections.append(collection)
+            self.isolation_names[parent.name] = collection.name
+            self.scene_objects[parent.name] = []
+            for obj in [parent] + find_children(parent):
+                collection.objects.link(obj)
+                isolated.add(obj.name)
+                if obj.name in scene_objects:
+                    self.scene_objects[parent.name].append(obj)
+
+        # Objects linked directly to the scene collection cannot be excluded from a view layer, so they are hidden from the render
+        # Those belonging to a parent are shown with the parent's collection, see set_isolated()
+        for obj in scn.collection.objects:
+            self.orig_scene_visibility.append([obj, obj.hide_render])
+            obj.hide_render = True
+        if global_parent != None:
+            for obj in self.scene_objects[global_parent.name]:
+                obj.hide_render = False
+
+        # Only the isolation collections are included in the new view layer, and only the global parent to begin with
+        layer = scn.view_layers.new(ISOLATION_NAME)
+        for layer_collection in layer.layer_collection.children:
+            layer_collection.exclude = layer_collection.name != root.name
+        for layer_collection in layer.layer_collection.children[root.name].children:
+            layer_collection.exclude = global_parent == None or layer_collection.name != self.isolation_names[global_parent.name]
+
+        # Only render the new view layer
+        for view_layer in scn.view_layers:
+            if view_layer != layer:
+                self.orig_layer_use.append([view_layer, view_layer.use])
+                view_layer.use = False
+
+        # Frame changes only evaluate the active view layer, so make the new view layer active while rendering
+        window = getattr(self.context, 'window', None)
+        if window != None:
+            self.orig_window_layer = window.view_layer
+            window.view_layer = layer
+
+        self.render_layer = layer
+
+        if not addon_prop.bool_batch_objects:
+            return
+
+        # Add a view layer for each object parent containing the global parent and the object
+        # Only the layers of the objects being rendered are used, each writes to its own output path, see render_batch()
+        layer.use = False
+        self.object_layers = {}
+        self.batched = set()
+        for sheet in self.get_sheet_array():
+            for obj in sheet:
+                if obj.name in self.duplicate_of:
+                    continue
+                object_layer = scn.view_layers.new("{0} {1}".format(ISOLATION_NAME, obj.name))
+                object_layer.use = False
+                for layer_collection in object_layer.layer_collection.children:
+                    layer_collection.exclude = layer_collection.name != root.name
+                included = [self.isolation_names[obj.name]]
+                if global_parent != None:
+                    included.append(self.isolation_names[global_parent.name])
+                for layer_collection in object_layer.layer_collection.children[root.name].children:
+                    layer_collection.exclude = layer_collection.name not in included
+                for pass_id in addon_prop.enum_render_passes:
+                    setattr(object_layer, RENDER_PASSES[pass_id][1], True)
+                self.object_layers[obj.name] = object_layer
+
+    def set_isolated(self, parent, included):
+        """Includes or excludes the isolation collection of a parent object from the render"""
+
+        layers = [self.render_layer]
+        if self.object_layers != None:
+            layers.extend(self.object_layers.values())
+
+        for layer in layers:
+            root = layer.layer_collection.children[self.isolation_collections[0].name]
+            root.children[self.isolation_names[parent.name]].exclude = not included
+
+        for obj in self.scene_objects[parent.name]:
+            obj.hide_render = not included
+
+    def cleanup_isolation(self):
+        """Reverts the changes made by prepare_isolation()"""
+
+        scn = self.context.scene
+
+        if self.orig_window_layer != None:
+            self.context.window.view_layer = self.orig_window_layer
+        self.orig_window_layer = None
+
+        for view_layer, use in self.orig_layer_use:
+            view_layer.use = use
+        self.orig_layer_use = None
+
+        scn.view_layers.remove(self.render_layer)
+        self.render_layer = self.context.view_layer
+        if self.object_layers != None:
+            for object_layer in self.object_layers.values():
+                scn.view_layers.remove(object_layer)
+        self.object_layers = None
+
+        for obj, hide_render in self.orig_scene_visibility:
+            obj.hide_render = hide_render
+        self.orig_scene_visibility = None
+        self.scene_objects = None
+
+        for collection in self.isolation_collections:
+            bpy.data.collections.remove(collection)
+        self.isolation_collections = None
+        self.isolation_names = None
+
+    def show_subtree(self, parent, visible):
+        """Shows or hides a parent object and its children in the render"""
+
+        if self.object_layers != None and parent.name in self.object_layers:
+            self.object_layers[parent.name].use = visible
+        elif self.isolation_collections != None:
+            self.set_isolated(parent, visible)
+        else:
+            parent.hide_render = not visible
+            if parent.name not in self.subtrees:
+                self.subtrees[parent.name] = find_children(parent)
+            for child in self.subtrees[parent.name]:
+                child.hide_render = not visible
+
+    def prepare_passes(self):
+        """Adds compositor nodes that write each extra render pass to its own folder tree during the main render"""
+
+        scn = self.context.scene
+        addon_prop = self.settings
+        view_layer = self.render_layer
+
+        self.pass_nodes = []
+        self.pass_outputs = {}
+        self.depth_ranges = []
+        self.orig_pass_settings = []
+
+        if not addon_prop.enum_render_passes and self.object_layers == None:
+            return
+
+        self.orig_use_nodes = scn.use_nodes
+        self.orig_use_compositing = scn.render.use_compositing
+        scn.use_nodes = True
+        scn.render.use_compositing = True
+        tree = scn.node_tree
+
+        # Enable the passes before creating the Render Layers node so that its outputs exist
+        for pass_id in addon_prop.enum_render_passes:
+            use_pass = RENDER_PASSES[pass_id][1]
+            self.orig_pass_settings.append([view_layer, use_pass, getattr(view_layer, use_pass)])
+            setattr(view_layer, use_pass, True)
+
+        # When rendering objects together the nodes are added for each render, see render_batch()
+        if self.object_layers != None:
+            return
+
+        render_layers = tree.nodes.new('CompositorNodeRLayers')
+        render_layers.layer = view_layer.name
+        self.pass_nodes.append(render_layers)
+
+        self.pass_outputs = self.add_pass_outputs(tree, render_layers)
+
+    def add_pass_outputs(self, tree, render_layers):
+        """Adds the nodes that write each extra render pass from a Render Layers node, returning the File Output node of each pass"""
+
+        scn = self.context.scene
+        addon_prop = self.settings
+
+        pass_outputs = {}
+
+        for pass_id in sorted(addon_prop.enum_render_passes):
+            output_name, use_pass, folder, colour_data = RENDER_PASSES[pass_id]
+            socket = render_layers.outputs[output_name]
+
+            # Convert the pass values into the 0 to 1 range so they can be saved in the render file format
+            if pass_id == 'NORMAL':
+                socket = self.add_pass_node(tree, 'CompositorNodeMixRGB', socket, 1, blend_type='ADD', value=(1, 1, 1, 1))
+                socket = self.add_pass_node(tree, 'CompositorNodeMixRGB', socket, 1, blend_type='MULTIPLY', value=(0.5, 0.5, 0.5, 1))
+            elif pass_id == 'DEPTH':
+                # Map the camera's clip range to 0 to 1, so the same depth has the same value in every sprite, see set_depth_range()
+                socket = self.add_pass_node(tree, 'CompositorNodeMapRange', socket, 0)
+                socket.node.use_clamp = True
+                self.depth_ranges.append(socket.node)
+            elif pass_id == 'MASK':
+                socket = self.add_pass_node(tree, 'CompositorNodeMath', socket, 0, operation='DIVIDE', value=255)
+
+            # Keep the background transparent
+            set_alpha = self.add_pass_node(tree, 'CompositorNodeSetAlpha', socket, 0).node
+            tree.links.new(render_layers.outputs['Alpha'], set_alpha.inputs[1])
+
+            pass_outputs[pass_id] = self.add_file_output(tree, set_alpha.outputs[0], 'RGBA', colour_data)
+
+        return pass_outputs
+
+    def add_file_output(self, tree, socket, color_mode, colour_data):
+        """Adds a File Output node saving socket in the render file format"""
+
+        scn = self.context.scene
+
+        file_output = tree.nodes.new('CompositorNodeOutputFile')
+        file_output.format.file_format = scn.render.image_settings.file_format
+        file_output.format.color_mode = color_mode
+        file_output.format.color_depth = scn.render.image_settings.color_depth
+        if not colour_data and hasattr(file_output.format, 'color_management'):
+            # Blender 3.x and above can save data passes without the view transform
+            file_output.format.color_management = 'OVERRIDE'
+            file_output.format.view_settings.view_transform = 'Raw'
+        tree.links.new(socket, file_output.inputs[0])
+        self.pass_nodes.append(file_output)
+
+        return file_output
+
+    def add_pass_node(self, tree, node_type, socket, input_index, blend_type=None, operation=None, value=None):
+        """Adds a compositor node linking socket to the given input, returning the node's first output
+        value is used for the node's second input when set
+        """
+
+        node = tree.nodes.new(node_type)
+        if blend_type != None:
+            node.blend_type = blend_type
+        if operation != None:
+            node.operation = operation
+        if value != None:
+            node.inputs[input_index + 1].default_value = value
+        tree.links.new(socket, node.inputs[input_index])
+        self.pass_nodes.append(node)
+
+        return node.outputs[0]
+
+    def set_depth_range(self):
+        """Maps the clip range of the scene camera to 0 to 1 in the Depth pass, for the camera of the current render"""
+
+        camera = self.context.scene.camera.data
+
+        for node in self.depth_ranges:
+            node.inputs[1].default_value = camera.clip_start
+            node.inputs[2].default_value = camera.clip_end
+            node.inputs[3].default_value = 0
+            node.inputs[4].default_value = 1
+
+    def cleanup_passes(self):
+        """Reverts the changes made by prepare_passes()"""
+
+        scn = self.context.scene
+
+        if self.pass_nodes:
+            for node in self.pass_nodes:
+                scn.node_tree.nodes.remove(node)
+        if self.orig_use_nodes != None:
+            scn.use_nodes = self.orig_use_nodes
+            scn.render.use_compositing = self.orig_use_compositing
+        self.orig_use_nodes = None
+        self.pass_nodes = None
+        self.pass_outputs = None
+        self.depth_ranges = None
+
+        if self.orig_pass_settings:
+            for view_layer, use_pass, value in self.orig_pass_settings:
+                setattr(view_layer, use_pass, value)
+        self.orig_pass_settings = None
+
+    def get_pass_root(self, pass_id):
+        """ Gets the root folder of the folder tree for an extra render pass"""
+
+        addon_prop = self.settings
+
+        return os.path.join(addon_prop.string_output_path, RENDER_PASSES[pass_id][2])
+
+    def get_render_roots(self):
+        """ Gets the root folder of every folder tree written by the renderer, starting with the main render
+        Returns a list of (root, pass id), where the pass id is None for the main render
+        """
+
+        addon_prop = self.settings
+
+        roots = [(addon_prop.string_output_path, None)]
+        for pass_id in sorted(addon_prop.enum_render_passes):
+            roots.append((self.get_pass_root(pass_id), pass_id))
+
+        return roots
+
+    def get_resolution_variants(self):
+        """ Gets the list of scales to create resolution variants for"""
+
+        addon_prop = self.settings
+
+        if addon_prop.string_resolution_variants.strip() == "":
+            return []
+        return [float(element) for element in addon_prop.string_resolution_variants.split(',')]
+
+    def get_variant_root(self, root, scale):
+        """ Gets the root folder of the folder tree for a resolution variant of an output folder tree"""
+
+        return os.path.join(root, "{0:g}x".format(scale))
+
+    def find_colour_variants(self):
+        """ Reads the colour variants of every object parent, see get_colour_variants()"""
+
+        self.colour_variants = {}
+        for sheet in self.get_sheet_array():
+            for obj in sheet:
+                variants = get_colour_variants(obj)
+                if variants:
+                    self.colour_variants[obj.name] = variants
+
+    def get_colour_variants_folder(self):
+        """ Gets the folder holding the folder tree of each colour variant of the main image"""
+
+        addon_prop = self.settings
+
+        return os.path.join(addon_prop.string_output_path, "colour_variants")
+
+    def get_colour_variant_root(self, name):
+        """ Gets the root folder of the folder tree for a colour variant of the main image"""
+
+        return os.path.join(self.get_colour_variants_folder(), name)
+
+    def get_source_roots(self):
+        """ Gets the root folder of every full resolution folder tree, the render roots followed by the colour variants of the main image
+        Returns a list of (root, pass id), where the pass id is None for the main render and its colour variants
+        """
+
+        roots = self.get_render_roots()
+        names = sorted(set(name for variants in (self.colour_variants or {}).values() for name in variants))
+        roots += [(self.get_colour_variant_root(name), None) for name in names]
+
+        return roots
+
+    def get_animation_root(self, root):
+        """ Gets the root folder of the animated images of a render folder tree"""
+
+        return os.path.join(root, "animations")
+
+    def get_reserved_folders(self):
+        """ Gets the normalised path of every output root, animation folder and the colour variants folder,
+        which are not part of any other output folder tree
+        """
+
+        folders = [os.path.normpath(root) for root, pass_id in self.get_output_roots()]
+        folders += [os.path.normpath(self.get_animation_root(root)) for root, pass_id in self.get_render_roots()]
+        folders.append(os.path.normpath(self.get_colour_variants_folder()))
+
+        return folders
+
+    def get_output_roots(self):
+        """ Gets the root folder of every output folder tree, including those created by the output stages
+        Returns a list of (root, pass id), where the pass id is None for the main render
+        """
+
+        roots = []
+        for root, pass_id in self.get_source_roots():
+            roots.append((root, pass_id))
+            for scale in self.get_resolution_variants():
+                roots.append((self.get_variant_root(root, scale), pass_id))
+
+        return roots
+
+    def find_renders(self, root):
+        """ Gets the path of every render in an output folder tree
+        Renders are the files at the depth of the full group order, so existing sprite sheets and the folder trees of other outputs are ignored
+        """
+
+        scn = self.context.scene
+
+        roots = self.get_reserved_folders()
+
+        image_paths = []
+        for folder, sub_folders, files in os.walk(root):
+            sub_folders[:] = [f for f in sub_folders if os.path.normpath(os.path.join(folder, f)) not in roots]
+            if len(os.path.relpath(folder, root).split(os.sep)) == len(self.output_order) - 1:
+                image_paths += [os.path.join(folder, f) for f in files if f.endswith(scn.render.file_extension)]
+
+        return sorted(image_paths)
+
+    def finish_outputs(self):
+        """ Runs the output stages once every sprite has been rendered, then merges the sprite sheets"""
+        from . compositor import OutputDigests, PaletteMapper
+
+        addon_prop = self.settings
+
+        # The outputs of the last renders may still be being written
+        self.output_writer.close()
+        self.output_writer = None
+
+        # The animation frames of the main image are added as the effects are applied
+        self.write_effects()
+        if self.animation_writer != None:
+            print("Saving animated images ...", end='')
+            self.animation_writer.close()
+            self.animation_writer = None
+            self.effect_frames = None
+            print(" Done")
+
+        self.find_colour_variants()
+        self.write_colour_variants()
+        self.write_resolution_variants()
+        self.write_delta_frames()
+
+        if addon_prop.enum_palette != 'OFF':
+            self.palette_mapper = PaletteMapper(self.get_palette())
+
+        if addon_prop.enum_sprite_sheet != 'OFF':
+            self.output_digests = OutputDigests(addon_prop.string_output_path, self.get_image_encoding())
+            variant_scales = {os.path.normpath(self.get_variant_root(source, scale)): scale
+                for source, source_pass in self.get_source_roots() for scale in self.get_resolution_variants()}
+            for root, pass_id in self.get_output_roots():
+                self.merge_root = root
+                self.merge_pass = pass_id
+                self.merge_scale = variant_scales.get(os.path.normpath(root))
+                try:
+                    self.merge_images(root, True)
+                finally:
+                    if self.frame_stores != None:
+                        self.close_frame_stores(root)
+            self.merge_root = None
+            self.merge_pass = None
+            self.merge_scale = None
+            self.effect_collision = None
+            self.palette_mapper = None
+            self.output_digests.save()
+            print("Sprite sheet files: {0} changed, {1} unchanged".format(len(self.output_digests.changed), len(self.output_digests.unchanged)))
+
+    def get_image_encoding(self):
+        """ Describes the settings the sprite sheets are encoded with, a sheet saved with different settings is written again"""
+
+        settings = self.context.scene.render.image_settings
+
+        return repr((settings.file_format, settings.color_mode, settings.color_depth, settings.compression, settings.quality))
+
+    def get_palette(self):
+        """ Gets the palette shared by every sprite sheet, as a uint8 RGBA array
+        The palette is read from the palette image, or generated from an even sample of the pixels of the renders of the main image and its colour variants
+        """
+        from . compositor import build_palette, get_image_backend, numpy, read_palette
+
+        scn = self.context.scene
+        addon_prop = self.settings
+
+        backend = get_image_backend(file_format=scn.render.image_settings.file_format)
+
+        if addon_prop.enum_palette == 'IMAGE':
+            image = backend.load(addon_prop.string_palette_image)
+            palette = read_palette(backend.to_array(image), addon_prop.int_palette_size)
+            backend.release(image)
+            print("Using a palette of {0} colours from {1}".format(len(palette), addon_prop.string_palette_image))
+            return palette
+
+        image_paths = []
+        for root, pass_id in self.get_source_roots():
+            if pass_id == None:
+                image_paths += self.find_renders(root)
+        image_paths = image_paths[::max(1, math.ceil(len(image_paths) / PALETTE_SAMPLE_FILES))]
+
+        print("Generating a palette from {0} images ...".format(len(image_paths)), end='')
+        samples = []
+        for image_path in image_paths:
+            image = backend.load(image_path)
+            pixels = backend.to_array(image).reshape(-1, 4)
+            pixels = pixels[pixels[:, 3] > 0]
+            samples.append(pixels[::max(1, math.ceil(len(pixels) * len(image_paths) / PALETTE_SAMPLE_PIXELS))])
+            backend.release(image)
+        pixels = numpy.concatenate(samples) if samples else numpy.zeros((0, 4), dtype=numpy.uint8)
+
+        palette = build_palette(pixels, addon_prop.int_palette_size)
+        print(" Done, {0} colours".format(len(palette)))
+        return palette
+
+    def get_effects(self):
+        """ Gets a function applying the enabled effects to a batch of images, or None if no effects are enabled"""
+        from . compositor import add_drop_shadow, add_outline, clamp_colours
+
+        addon_prop = self.settings
+
+        effects = addon_prop.enum_effects
+        if not effects:
+            return None
+
+        outline_colour = tuple(round(c * 255) for c in addon_prop.float_outline_colour)
+        outline_width = addon_prop.int_outline_width
+        shadow_colour = tuple(round(c * 255) for c in addon_prop.float_shadow_colour)
+        shadow_x = addon_prop.int_shadow_offset_x
+        shadow_y = addon_prop.int_shadow_offset_y
+        levels = addon_prop.int_colour_levels
+
+        def apply_effects(images):
+            if 'OUTLINE' in effects:
+                images = add_outline(images, outline_colour, outline_width)
+            if 'SHADOW' in effects:
+                images = add_drop_shadow(images, shadow_colour, shadow_x, shadow_y)
+            if 'CLAMP' in effects:
+                images = clamp_colours(images, levels)
+            return images
+
+        return apply_effects
+
+    def write_effects(self):
+        """ Applies the enabled effects to every render of the main image, in a pool of worker threads
+        Duplicate objects are hard links to the renders they copy, so each file is processed once and replaced through a temporary file,
+        then the links are made again to the new file
+        Outlines and shadows would be solid in collision data taken from the finished sheets, so when collision data is saved it is taken here
+        from each render before the effects are applied, and from the render resized to each resolution variant
+        The processed images are also added to the animated images, see add_animation_frames()
+        """
+        from . compositor import extract_collision, get_image_backend, numpy, process_images, resample_images
+
+        scn = self.context.scene
+        addon_prop = self.settings
+
+        self.effect_collision = None
+
+        apply_effects = self.get_effects()
+        if apply_effects == None:
+            return
+
+        collision = addon_prop.bool_collision_data and addon_prop.enum_sprite_sheet != 'OFF'
+        if collision:
+            self.effect_collision = {}
+        scales = [None] + self.get_resolution_variants()
+
+        backend = get_image_backend(file_format=scn.render.image_settings.file_format)
+
+        # Group the paths of the same file
+        links = {}
+        for image_path in self.find_renders(addon_prop.string_output_path):
+            stat = os.stat(image_path)
+            links.setdefault((stat.st_dev, stat.st_ino), []).append(image_path)
+        image_paths = [paths[0] for paths in links.values()]
+        copies = {paths[0]: paths[1:] for paths in links.values()}
+
+        print("Applying effects to {0} images ...".format(len(image_paths)), end='')
+
+        def load(image_path):
+            store = self.get_frame_store(addon_prop.string_output_path, os.path.dirname(image_path))
+            if store != None and image_path in store:
+                return numpy.array(store.read(image_path))
+            image = backend.load(image_path)
+            array = numpy.array(backend.to_array(image))
+            backend.release(image)
+            return array
+
+        def process(images):
+            results = apply_effects(images)
+            if not collision:
+                return results
+
+            # Extract the collision data of the whole batch at once, laid side by side as a single page
+            collisions = [{} for image in images]
+            height, width = images.shape[1:3]
+            for scale in scales:
+                scaled = images
+                if scale != None:
+                    scaled = resample_images(images, max(1, round(width * scale)), max(1, round(height * scale)), addon_prop.enum_resample_filter)
+                scaled_height, scaled_width = scaled.shape[1:3]
+                cells = [(i * scaled_width, 0, scaled_width, scaled_height) for i in range(len(scaled))]
+                page = numpy.concatenate(list(scaled), axis=1)
+                for result, data in zip(collisions, extract_collision(page, cells, addon_prop.int_alpha_threshold, addon_prop.float_hitbox_tolerance)):
+                    result[scale] = data
+            return list(zip(results, collisions))
+
+        def save(image_path, result):
+            image = result
+            if collision:
+                image, collisions = result
+                for path in [image_path] + copies[image_path]:
+                    name = os.path.splitext(os.path.basename(path))[0]
+                    for scale, data in collisions.items():
+                        self.effect_collision[(scale, name)] = data
+
+            name, extension = os.path.splitext(image_path)
+            temp_path = name + "_effects" + extension
+            backend.save(backend.from_array(image), temp_path)
+            os.replace(temp_path, image_path)
+            for copy_path in copies[image_path]:
+                link_file(image_path, copy_path)
+            for path in [image_path] + copies[image_path]:
+                store = self.get_frame_store(addon_prop.string_output_path, os.path.dirname(path))
+                if store != None:
+                    store.write(path, image)
+            if self.effect_frames:
+                for path in [image_path] + copies[image_path]:
+                    for frame in self.effect_frames.pop(os.path.normpath(path), []):
+                        self.animation_writer.add_frame(*frame, image)
+
+        process_images(backend, image_paths, process, save, load=load)
+        print(" Done")
+
+    def write_colour_variants(self):
+        """ Creates the colour variants of the renders of each object parent that has any, see get_colour_variants()
+        The regions to recolour are read from the Mask pass, and the images are recoloured in a pool of worker threads
+        """
+        from . compositor import get_image_backend, numpy, process_images, recolour_images
+
+        scn = self.context.scene
+        addon_prop = self.settings
+
+        if not self.colour_variants:
+            return
+
+        backend = get_image_backend(file_format=scn.render.image_settings.file_format)
+        output_path = addon_prop.string_output_path
+        mask_root = self.get_pass_root('MASK')
+
+        # Find the renders of each object parent with colour variants, including its duplicates
+        renders = {}
+        for i in self.plan_iterations():
+            obj = self.objects[self.i_current_object]
+            if obj.name in self.colour_variants:
+                folder, name = self.get_output_path(output_path)
+                renders.setdefault(obj.name, []).append(os.path.join(folder, name + scn.render.file_extension))
+
+        # Each render is loaded with its Mask pass added as four more channels
+        def load(image_path):
+            arrays = []
+            for path in (image_path, os.path.join(mask_root, os.path.relpath(image_path, output_path))):
+                image = backend.load(path)
+                arrays.append(numpy.array(backend.to_array(image)))
+                backend.release(image)
+            return numpy.concatenate(arrays, axis=-1)
+
+        for obj_name, image_paths in renders.items():
+            variants = self.colour_variants[obj_name]
+            print("Creating {0} colour variants of {1} images of {2} ...".format(len(variants), len(image_paths), obj_name), end='')
+
+            def recolour(images):
+                results = [[] for image in images]
+                for recolours in variants.values():
+                    for result, image in zip(results, recolour_images(images[..., :4], images[..., 4:], recolours)):
+                        result.append(image)
+                return results
+
+            def save(image_path, results):
+                relative_path = os.path.relpath(image_path, output_path)
+                for name, image in zip(variants, results):
+                    variant_path = os.path.join(self.get_colour_variant_root(name), relative_path)
+                    os.makedirs(os.path.dirname(variant_path), exist_ok=True)
+                    backend.save(backend.from_array(image), variant_path)
+
+            process_images(backend, image_paths, recolour, save, load=load)
+            print(" Done")
+
+    def write_resolution_variants(self):
+        """ Creates the smaller resolution variants of every render from the full resolution renders
+        The images are resized in a pool of worker threads
+        """
+        from . compositor import get_image_backend, process_images, resample_images
+
+        scn = self.context.scene
+        addon_prop = self.settings
+
+        scales = self.get_resolution_variants()
+        if not scales:
+            return
+
+        backend = get_image_backend(file_format=scn.render.image_settings.file_format)
+
+        for root, pass_id in self.get_source_roots():
+            image_paths = self.find_renders(root)
+            print("Creating {0} resolution variants of {1} images ...".format(len(scales), len(image_paths)), end='')
+
+            # Mask values must not be blended together
+            resample_filter = addon_prop.enum_resample_filter
+            if pass_id == 'MASK':
+                resample_filter = 'NEAREST'
+
+            def resize(images):
+                results = [[] for image in images]
+                height, width = images.shape[1:3]
+                for scale in scales:
+                    resized = resample_images(images, max(1, round(width * scale)), max(1, round(height * scale)), resample_filter)
+                    for result, image in zip(results, resized):
+                        result.append(image)
+                return results
+
+            def save(image_path, results):
+                relative_path = os.path.relpath(image_path, root)
+                for scale, image in zip(scales, results):
+                    variant_path = os.path.join(self.get_variant_root(root, scale), relative_path)
+                    os.makedirs(os.path.dirname(variant_path), exist_ok=True)
+                    backend.save(backend.from_array(image), variant_path)
+
+            process_images(backend, image_paths, resize, save)
+            print(" Done")
+
+    def write_delta_frames(self):
+        """ Replaces every frame of each animation track, other than the first, with patches of the areas that changed from the frame before
+        Patches are saved next to the frame they replace, named after the frame with -0, -1, ... added, and are merged into the sprite sheets
+        in place of the frame. The frames themselves are left with the renders, and are deleted with them unless the renders are kept
+        """
+        from . compositor import find_dirty_rects, get_image_backend
+
+        scn = self.context.scene
+        addon_prop = self.settings
+
+        self.delta_animations = {}
+        self.delta_replaced = set()
+        if not addon_prop.bool_delta_frames:
+            return
+
+        # Group the renders of each track, the item strings of all other levels are the same for every frame of a track
+        frame_level = self.output_order.index("frame")
+        tracks = {}
+        for i in self.plan_iterations():
+            item_strings = self.get_item_strings()
+            key = tuple(item_strings[:frame_level] + item_strings[frame_level + 1:])
+            tracks.setdefault(key, []).append(item_strings)
+
+        backend = get_image_backend('NUMPY', scn.render.image_settings.file_format)
+        extension = scn.render.file_extension
+
+        for root, pass_id in self.get_output_roots():
+            print("Creating delta frames in {0} ...".format(root), end='')
+            animations = []
+            patch_count = 0
+            for frames in tracks.values():
+                if len(frames) < 2:
+                    continue
+                folder, name = self.get_output_path(root, frames[0])
+                # The folder trees of colour variants only hold the renders of the objects with that variant
+                if not os.path.exists(os.path.join(folder, name + extension)):
+                    continue
+                previous = backend.load(os.path.join(folder, name + extension))
+                animation = {"keyframe": name, "frames": []}
+                for item_strings in frames[1:]:
+                    folder, name = self.get_output_path(root, item_strings)
+                    frame_path = os.path.join(folder, name + extension)
+                    current = backend.load(frame_path)
+                    patches = []
+                    for x, y, width, height in find_dirty_rects(previous, current):
+                        patch_name = "{0}-{1}".format(name, len(patches))
+                        backend.save(current[y:y + height, x:x + width], os.path.join(folder, patch_name + extension))
+                        patches.append({"cell": patch_name, "x": x, "y": y})
+                    self.delta_replaced.add(os.path.normpath(frame_path))
+                    animation["frames"].append({"name": name, "patches": patches})
+                    patch_count += len(patches)
+                    previous = current
+                animations.append(animation)
+            self.delta_animations[root] = animations
+            print(" {0} tracks, {1} patches".format(len(animations), patch_count))
+
     def cleanup(self):
         """Reverts the changes made by prepare_render()"""
 
+        if self.iterating:
+            self.iterating = False
+            self.reset_scene()
+
+        self.cleanup_passes()
+
+        if self.orig_render_size != None:
+            self.cleanup_render_size()
+
+        if self.orig_simplify != None:
+            self.cleanup_simplify()
+
+        # The outputs still being written use the frame stores, so the stores are closed once they have finished
+        try:
+            if self.output_writer != None:
+                self.output_writer.close()
+        finally:
+            self.output_writer = None
+            if self.frame_stores != None:
+                self.close_frame_stores()
+                self.frame_stores = None
+
+        # A cancelled render leaves some animations without all of their frames, these are not saved
+        if self.animation_writer != None:
+            self.animation_writer.close(save_incomplete=False)
+            self.animation_writer = None
+            self.effect_frames = None
+
         # Show all objects
-        if self.orig_visibility:
+        if self.isolation_collections != None:
+            self.cleanup_isolation()
+        elif self.orig_visibility:
             for o in self.orig_visibility:
                 o[0].hide_render = o[1]
         else:
             for o in bpy.data.objects:
                 o.hide_render = False
 
-        if self.iterating:
-            self.iterating = False
-            self.reset_scene()
-
     def setup_scene(self):
         """Needs to be run each render before render_scene()
         Adjusts object visibility, camera position, location and visibility and animation frame for each iteration
         """
 
         scn = self.context.scene
-        addon_prop = self.context.scene.addon_properties
+        addon_prop = self.settings
         global_parent = addon_prop.pointer_global_parent
 
         # Setup scene
-        # Show current object and children
-        self.objects[self.i_current_object].hide_render = False
-        for child in find_children(self.objects[self.i_current_object]):
-            child.hide_render = False
-        obj_animations = self.objects[self.i_current_object].animation_data
-        # Mute all tracks
-        if self.tracks != ["No Action"]:
-            for track in obj_animations.nla_tracks:
-                track.mute = True
-            # Show current track
-            self.tracks[self.i_current_track].mute = False
+        # Show current objects and children, and their current tracks
+        current_job = self.get_job()
+        for job in self.batch:
+            self.select_job(job)
+            self.setup_object()
+        self.select_job(current_job)
+        if self.orig_render_size != None:
+            self.setup_render_size()
+        if self.orig_simplify != None:
+            self.setup_simplify()
         # Show camera hierarchy
-        obj_cam = find_children(self.cameras[self.i_current_camera], 'CAMERA')[0]
-        self.cameras[self.i_current_camera].hide_render = False
-        for child in find_children(self.cameras[self.i_current_camera]):
-            child.hide_render = False
+        obj_cam = self.camera_objects[self.i_current_camera]
+        self.show_subtree(self.cameras[self.i_current_camera], True)
         self.orig_scene_camera = scn.camera
         scn.camera = obj_cam
         # Move Camera to object
@@ -1009,51 +3167,236 @@ class RenderSprites():
         self.orig_frame = scn.frame_current
         scn.frame_set(self.frames[self.i_current_frame])
 
-    def render_scene(self):
-        """Renders the scene using the current scene state as set by setup_scene()"""
+    def setup_object(self):
+        """Shows the current object and its children, and mutes every track but the current one
+        Objects rendered with the first object of the batch are moved to its location, where the camera and global parent are moved
+        """
+
+        obj = self.objects[self.i_current_object]
+        first = self.objects[self.batch[0][0]]
+        if obj != first:
+            # The delta location is added on top of any animated location, and is in the same space as the location
+            offset = first.matrix_world.to_translation() - obj.matrix_world.to_translation()
+            if obj.parent != None:
+                offset = (obj.parent.matrix_world @ obj.matrix_parent_inverse).to_3x3().inverted() @ offset
+            if self.orig_delta_locations == None:
+                self.orig_delta_locations = {}
+            self.orig_delta_locations[obj.name] = obj.delta_location.copy()
+            obj.delta_location = obj.delta_location + offset
+
+        # Show current object and children
+        self.show_subtree(self.objects[self.i_current_object], True)
+        obj_animations = self.objects[self.i_current_object].animation_data
+        # Mute all tracks
+        if self.tracks != ["No Action"]:
+            for track in obj_animations.nla_tracks:
+                track.mute = True
+            # Show current track
+            self.tracks[self.i_current_track].mute = False
+
+    def reset_object(self):
+        """Reverts the changes made by setup_object()"""
+
+        # Hide current object and children
+        obj = self.objects[self.i_current_object]
+        self.show_subtree(obj, False)
+        # Move the object back
+        if self.orig_delta_locations != None and obj.name in self.orig_delta_locations:
+            obj.delta_location = self.orig_delta_locations.pop(obj.name)
+        # Unmute all tracks
+        if self.tracks != ["No Action"]:
+            obj_animations = self.objects[self.i_current_object].animation_data
+            for track in obj_animations.nla_tracks:
+                track.mute = False
+
+    def get_job(self):
+        """ Gets the current object, track and frame indexes"""
+
+        return (self.i_current_object, self.i_current_track, self.i_current_frame)
+
+    def select_job(self, job):
+        """ Sets the current object, track and frame indexes, updating the track and frame lists to match"""
+
+        self.i_current_object = job[0]
+        self.update_lists(self.output_order.index("track"))
+        self.i_current_track = job[1]
+        self.update_lists(self.output_order.index("frame"))
+        self.i_current_frame = job[2]
+
+    def get_job_key(self):
+        """ Gets a key identifying the current render for the set of renders already done by render_batch()"""
+
+        return (self.i_current_sheet, self.i_current_object, self.i_current_track, self.i_current_camera, self.i_current_angle, self.frames[self.i_current_frame])
+
+    def get_batch(self):
+        """ Gets the (object, track, frame) indexes of each object to render with the current object
+        When rendering objects together, each object is added with the first of its tracks that includes the current frame and has not been
+        rendered yet, otherwise only the current object is rendered. Each object is moved to the current object by setup_object()
+        """
+
+        current_job = self.get_job()
+        jobs = [current_job]
+
+        if self.object_layers == None:
+            return jobs
+
+        frame = self.frames[self.i_current_frame]
+
+        for object_index, obj in enumerate(self.objects):
+            if object_index == current_job[0] or obj.name in self.duplicate_of:
+                continue
+            # Objects rendered at a different size need their own render
+            if self.orig_render_size != None and self.get_render_size(obj) != self.get_render_size(self.objects[current_job[0]]):
+                continue
+            self.select_job((object_index, 0, 0))
+            mirror_angle = self.get_mirror_angle()
+            if mirror_angle != None and mirror_angle < self.i_current_angle:
+                continue
+            for track_index in range(len(self.tracks)):
+                self.select_job((object_index, track_index, 0))
+                if frame not in self.frames:
+                    continue
+                self.i_current_frame = self.frames.index(frame)
+                if self.get_job_key() not in self.batched:
+                    jobs.append(self.get_job())
+                    break
+
+        self.select_job(current_job)
+
+        return jobs
+
+    def get_output_path(self, root, item_strings=None):
+        """ Gets the folder and file name, without an extension, for the current render inside an output root
+        If item_strings is given it is used in place of the strings for the current group levels
+        """
+
+        if item_strings == None:
+            item_strings = [self.get_item_string(level_index) for level_index in range(len(self.output_order))]
+
+        # <root>\<item_1>\<item_2>\<item_3>\<item_4>\<item_5>\
+        output_folder = os.path.join(root, *item_strings[:-1])
+
+        # <item_1>_<item_2>_<item_3>_<item_4>_<item_5>_<item_6>
+        output_name = '_'.join(item_strings)
+
+        return output_folder, output_name
+
+    def render_scene(self, asynchronous=False):
+        """Renders the scene using the current scene state as set by setup_scene()
+        If asynchronous is True the render is started without waiting for it to finish, and end_render() must be called once it has
+        """
 
         scn = self.context.scene
-        addon_prop = self.context.scene.addon_properties
+        addon_prop = self.settings
 
         # Set render path
-        # <item_1>\<item_2>\<item_3>\<item_4>\<item_5>\
-        output_folder = "{}{}\\{}\\{}\\{}\\{}\\".format(addon_prop.string_output_path, self.get_item_string(0), self.get_item_string(1), self.get_item_string(2), self.get_item_string(3), self.get_item_string(4))
+        output_folder, output_name = self.get_output_path(addon_prop.string_output_path)
 
-        # Set render filename
-        # <item_1>_<item_2>_<item_3>_<item_4>_<item_5>_<item_6>.<file_extension>
-        output_name = "{}_{}_{}_{}_{}_{}{}".format(self.get_item_string(0), self.get_item_string(1), self.get_item_string(2), self.get_item_string(3), self.get_item_string(4), self.get_item_string(5), scn.render.file_extension)
+        # Point each extra pass at the same path in its own folder tree
+        for pass_id, file_output in self.pass_outputs.items():
+            file_output.base_path, file_output.file_slots[0].path = self.get_output_path(self.get_pass_root(pass_id))
+
+        self.render_outputs = list(self.pass_outputs.values())
+        self.set_depth_range()
 
         # Render frame
         self.orig_render_path = scn.render.filepath
-        scn.render.filepath = ''.join((output_folder, output_name))
-        bpy.ops.render.render(write_still=True)
+        scn.render.filepath = os.path.join(output_folder, output_name + scn.render.file_extension)
+        if asynchronous:
+            return bpy.ops.render.render('INVOKE_DEFAULT', write_still=True, scene=scn.name)
+        return bpy.ops.render.render(write_still=True, scene=scn.name)
+
+    def render_batch(self, asynchronous=False):
+        """ Renders every object in self.batch with a single render, using the scene state set by setup_scene()
+        Each object's view layer is written to the object's own output path by File Output nodes
+        If asynchronous is True the render is started without waiting for it to finish, and end_render() must be called once it has
+        """
+
+        scn = self.context.scene
+        addon_prop = self.settings
+        tree = scn.node_tree
+
+        self.render_node_count = len(self.pass_nodes)
+        self.render_outputs = []
+        file_outputs = self.render_outputs
+
+        current_job = self.get_job()
+        for job in self.batch:
+            self.select_job(job)
+            render_layers = tree.nodes.new('CompositorNodeRLayers')
+            render_layers.layer = self.object_layers[self.objects[self.i_current_object].name].name
+            self.pass_nodes.append(render_layers)
+
+            file_output = self.add_file_output(tree, render_layers.outputs['Image'], scn.render.image_settings.color_mode, True)
+            file_output.base_path, file_output.file_slots[0].path = self.get_output_path(addon_prop.string_output_path)
+            file_outputs.append(file_output)
+
+            for pass_id, pass_output in self.add_pass_outputs(tree, render_layers).items():
+                pass_output.base_path, pass_output.file_slots[0].path = self.get_output_path(self.get_pass_root(pass_id))
+                file_outputs.append(pass_output)
+        self.select_job(current_job)
+        self.set_depth_range()
+
+        if asynchronous:
+            return bpy.ops.render.render('INVOKE_DEFAULT', scene=scn.name)
+        return bpy.ops.render.render(scene=scn.name)
+
+    def end_render(self):
+        """ Reverts the changes made for the render by render_scene() or render_batch() and setup_scene(), once the render has finished"""
+
+        scn = self.context.scene
+
+        self.render_running = False
 
         # Reset render path
-        scn.render.filepath = self.orig_render_path
-        self.orig_render_path = None
+        if self.orig_render_path != None:
+            scn.render.filepath = self.orig_render_path
+            self.orig_render_path = None
+
+        self.rename_file_outputs(self.render_outputs)
+        self.render_outputs = None
+
+        # Remove the nodes added for a batch render
+        if self.render_node_count != None:
+            for node in self.pass_nodes[self.render_node_count:]:
+                self.context.scene.node_tree.nodes.remove(node)
+                if node in self.depth_ranges:
+                    self.depth_ranges.remove(node)
+            del self.pass_nodes[self.render_node_count:]
+            self.render_node_count = None
 
+        self.reset_scene()
+        self.iterating = False
+
+    def rename_file_outputs(self, file_outputs):
+        """ File Output nodes add the frame number to the file name, remove it so the files are named as the main render"""
+
+        scn = self.context.scene
+
+        for file_output in file_outputs:
+            output_path = os.path.join(file_output.base_path, file_output.file_slots[0].path)
+            written_path = "{0}{1:04d}{2}".format(output_path, scn.frame_current, scn.render.file_extension)
+            if os.path.isfile(written_path):
+                os.replace(written_path, output_path + scn.render.file_extension)
+            else:
+                print("Error: Output {0} was not written".format(written_path))
 
     def reset_scene(self):
         """Reverts the changes made by setup_scene()"""
 
         scn = self.context.scene
-        addon_prop = self.context.scene.addon_properties
+        addon_prop = self.settings
         global_parent = addon_prop.pointer_global_parent
 
         # Reset scene
-        # Hide current object and children
-        self.objects[self.i_current_object].hide_render = True
-        for child in find_children(self.objects[self.i_current_object]):
-            child.hide_render = True
-        # Unmute all tracks
-        if self.tracks != ["No Action"]:
-            obj_animations = self.objects[self.i_current_object].animation_data
-            for track in obj_animations.nla_tracks:
-                track.mute = False
+        # Hide current objects and children, and unmute their tracks
+        current_job = self.get_job()
+        for job in self.batch:
+            self.select_job(job)
+            self.reset_object()
+        self.select_job(current_job)
         # Hide camera hierarchy
-        self.cameras[self.i_current_camera].hide_render = True
-        for child in find_children(self.cameras[self.i_current_camera]):
-            child.hide_render = True
+        self.show_subtree(self.cameras[self.i_current_camera], False)
         scn.camera = self.orig_scene_camera
         # Reset camera
         if self.cam_orig_location != None:
@@ -1081,17 +3424,20 @@ class RenderSprites():
 
         To correctly merge all files output by the render code leave level and direction as default
         """
+        from . compositor import StoredImageBackend, build_indexed_page, build_page, extract_collision, get_image_backend, layout_pages, read_image_size
 
         scn = self.context.scene
-        addon_prop = self.context.scene.addon_properties
+        addon_prop = self.settings
 
         merge = True
 
         # Loop through sub-directories first to ensure that all iamges are correctly merged
+        # The folder trees of the extra passes are merged separately, so are skipped
         if recursive:
+            roots = self.get_reserved_folders()
             for f in os.listdir(folder_path):
                 sub_folder = os.path.join(folder_path, f)
-                if os.path.isdir(sub_folder):
+                if os.path.isdir(sub_folder) and os.path.normpath(sub_folder) not in roots:
                     self.merge_images(sub_folder, recursive, level + 1)
 
         # If a direction is specified, use that, otherwise base the direction on the output orientation property
@@ -1114,61 +3460,178 @@ class RenderSprites():
         # Merge images
         if merge:
             # Set the file paths
-            p = folder_path.split('\\')
-            save_path = '\\'.join(p[:-1])
-            save_path += '\\'
-            folder_path += '\\'
+            save_path = os.path.dirname(os.path.normpath(folder_path))
 
             # Get the images to be merged
-            images = []
-            save_name = None
+            # Pages of the same image are kept together, in page order
+            image_paths = []
             for f in os.listdir(folder_path):
                 file_name = os.fsdecode(f)
-                if file_name.endswith(scn.render.file_extension):
-                    image_path = ''.join((folder_path, "\\", file_name))
-                    print(image_path)
-                    images.append(Image.open(image_path))
-                    if not save_name:
-                        save_name = os.path.splitext(file_name)[0]
-                        n = save_name.split('_')
-                        save_name = '_'.join(n[:-1])
-
-            # Calculate the width and height for the merged image
-            widths, heights = zip(*(img.size for img in images))
-            output_width = None
-            output_height = None
-            if direction == 'HORIZONTAL':
-                output_width = sum(widths)
-                output_height = max(heights)
-            elif direction == 'VERTICAL':
-                output_width = max(widths)
-                output_height = sum(heights)
-
-            # Create the merged image
-            output_image = Image.new('RGBA', (output_width, output_height))
-
-            print("Saving as\n{0}{1}{2}".format(save_path,save_name,scn.render.file_extension))
-            print("Merging {} images ...".format(len(images)), end='')
-            offset = 0
-            for img in images:
-                if direction == 'HORIZONTAL':
-                    output_image.paste(img, (offset, 0))
-                    offset += img.size[0]
-                elif direction == 'VERTICAL':
-                    output_image.paste(img, (0, offset))
-                    offset += img.size[1]
-
-            output = ''.join((save_path,save_name,scn.render.file_extension))
-
-            output_image.save(output)
+                image_path = os.path.join(folder_path, file_name)
+                if file_name.endswith(scn.render.file_extension) and not (self.delta_replaced and os.path.normpath(image_path) in self.delta_replaced):
+                    image_paths.append(image_path)
+            store = self.get_frame_store(self.merge_root, folder_path) if self.merge_root != None else None
+            if store != None:
+                image_paths.extend(store.paths_in(folder_path))
+            image_paths.sort(key=self.get_image_sort_key)
+
+            # Every frame in a folder may have been replaced by delta frames with no patches
+            if not image_paths:
+                if not addon_prop.bool_keep_renders:
+                    self.empty_folder(folder_path, scn.render.file_extension)
+                return
+
+            save_name = None
+            for image_path in image_paths:
+                print(image_path)
+                if not save_name:
+                    save_name = self.get_image_stem(image_path)
+                    n = save_name.split('_')
+                    save_name = '_'.join(n[:-1])
+
+            # Merge the images using NumPy if available, otherwise PIL
+            backend = get_image_backend(file_format=scn.render.image_settings.file_format)
+
+            # Images merged again by the level above are held in the frame store, so they are read back without decoding
+            # They are only encoded as image files when the renders are kept
+            stored = store != None and level > 1 and self.output_orientation[level - 1] != '-'
+            if store != None:
+                backend = StoredImageBackend(backend, store, stored, not stored or addon_prop.bool_keep_renders)
+
+            # Split the merged image into pages if it would be larger than the maximum size
+            sizes = []
+            for image_path in image_paths:
+                if store != None and image_path in store:
+                    sizes.append(store.size(image_path))
+                else:
+                    sizes.append(read_image_size(backend, image_path))
+            pages = layout_pages(sizes, direction, addon_prop.int_max_sheet_size)
+
+            print("Merging {} images into {} page(s) using {} ...".format(len(image_paths), len(pages), backend.name))
+
+            # Collision data is taken from the finished sheets of the main image and its colour and resolution variants
+            # When effects are applied it was taken from the renders before the effects, see write_effects()
+            collision = level == 1 and addon_prop.bool_collision_data and self.merge_pass == None
+            extract = collision and self.effect_collision == None
+            if collision:
+                self.collision_frames = {}
+
+            metadata = {"pages": [], "frames": []}
+            for page_index, page in enumerate(pages):
+                page_name = save_name
+                if len(pages) > 1:
+                    page_name = "{0}_p{1}".format(save_name, page_index)
+                output = os.path.join(save_path, page_name + scn.render.file_extension)
+                print("Saving as\n{0}".format(output), end='')
+
+                # Each page is built and released before the next is started
+                # The sprite sheets of the main image and its colour and resolution variants are saved with the shared palette when one is used
+                if self.palette_mapper != None and level == 1 and self.merge_pass == None:
+                    page_image = build_indexed_page(backend, image_paths, page, output, self.palette_mapper, keep=extract, digests=self.output_digests)
+                else:
+                    page_image = build_page(backend, image_paths, page, output, keep=extract, digests=None if stored and not addon_prop.bool_keep_renders else self.output_digests)
+                if self.output_digests != None and self.output_digests.unchanged[-1:] == [output]:
+                    print(" unchanged", end='')
+
+                cells = []
+                for index, x, y in page[2]:
+                    for cell in self.pop_cells(image_paths[index], sizes[index]):
+                        cell["x"] += x
+                        cell["y"] += y
+                        cells.append(cell)
+                self.sheet_cells[output] = cells
+                if len(pages) > 1:
+                    self.page_files.add(output)
+
+                if extract:
+                    print(" extracting collision data ...", end='')
+                    rects = [(cell["x"], cell["y"], cell["width"], cell["height"]) for cell in cells]
+                    for cell, data in zip(cells, extract_collision(page_image, rects, addon_prop.int_alpha_threshold, addon_prop.float_hitbox_tolerance)):
+                        self.collision_frames[cell["name"]] = data
+                    page_image = None
+                elif collision:
+                    for cell in cells:
+                        self.collision_frames[cell["name"]] = self.effect_collision[(self.merge_scale, cell["name"])]
+
+                metadata["pages"].append({"image": page_name + scn.render.file_extension, "width": page[0], "height": page[1]})
+                for cell in cells:
+                    metadata["frames"].append(dict(cell, page=page_index))
+                print(" Done")
+
+            # The first merged level creates the sprite sheets, save where each render was placed
+            if level == 1:
+                # Add the delta frames of each track that starts in this sheet
+                animations = self.delta_animations.get(self.merge_root) if self.delta_animations else None
+                if animations:
+                    names = set(cell["name"] for cell in metadata["frames"])
+                    metadata["animations"] = [animation for animation in animations if animation["keyframe"] in names]
+                if self.palette_mapper != None and self.merge_pass == None:
+                    metadata["palette"] = self.palette_mapper.palette.tolist()
+                if collision:
+                    metadata["collision"] = save_name + "_collision.json"
+                    self.write_collision_data(os.path.join(save_path, metadata["collision"]))
+                self.write_metadata(os.path.join(save_path, save_name + ".json"), metadata)
+                for output in self.sheet_cells:
+                    self.page_files.discard(output)
+                self.sheet_cells = {}
 
             # Empty the folder of all images
+            if store != None:
+                for image_path in image_paths:
+                    store.remove(image_path)
             if not addon_prop.bool_keep_renders:
                 self.empty_folder(folder_path, scn.render.file_extension)
 
-            print(" Done")
             print("")
 
+    def get_image_stem(self, image_path):
+        """ Gets the file name of an image without its extension or page number"""
+
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        if image_path in self.page_files:
+            stem = stem.rsplit('_', 1)[0]
+        return stem
+
+    def get_image_sort_key(self, image_path):
+        """ Sorts images by name, keeping the pages of an image together in page order"""
+
+        page = 0
+        if image_path in self.page_files:
+            page = int(os.path.splitext(image_path)[0].rsplit('_p', 1)[1])
+        return (self.get_image_stem(image_path), page)
+
+    def pop_cells(self, image_path, size):
+        """ Gets the position of every render in an image, removing them from sheet_cells
+        A render that has not been merged is a single cell covering the whole image
+        """
+
+        if image_path in self.sheet_cells:
+            return self.sheet_cells.pop(image_path)
+        return [{"name": os.path.splitext(os.path.basename(image_path))[0], "x": 0, "y": 0, "width": size[0], "height": size[1]}]
+
+    def write_metadata(self, path, metadata):
+        """ Writes the metadata for a sprite sheet as JSON"""
+
+        self.write_text(path, json.dumps(metadata, indent=4))
+        self.written_sheets.append(path)
+
+    def write_collision_data(self, path):
+        """ Writes the collision data of every render in the sprite sheet being merged as JSON"""
+
+        addon_prop = self.settings
+
+        self.write_text(path, json.dumps({"alpha_threshold": addon_prop.int_alpha_threshold, "frames": self.collision_frames}, indent=4))
+        self.collision_frames = None
+
+    def write_text(self, path, text):
+        """ Writes a text output file, leaving it untouched if it already has the same content"""
+
+        if self.output_digests != None:
+            self.output_digests.write_text(path, text)
+        else:
+            with open(path, 'w') as f:
+                f.write(text)
+
     def empty_folder(self, folder_path, extension):
         """ Delete all file with a specified extension in a folder, and remove the folder if it is subsequently emptied
         extension can be a tuple containing all file types to be deleted or a string if only a single type is to be deleted
@@ -1177,7 +3640,7 @@ class RenderSprites():
         for f in os.listdir(folder_path):
             file_name = os.fsdecode(f)
             if file_name.endswith(extension):
-                os.remove(''.join((folder_path, "\\", file_name)))
+                os.remove(os.path.join(folder_path, file_name))
         try:
             os.rmdir(folder_path)
         except OSError:
@@ -1188,11 +3651,97 @@ class RenderSprites():
         This should only be called from iterate()
         """
 
+        if self.start_iteration():
+            self.end_render()
+            self.write_outputs()
+
+    def start_iteration(self, asynchronous=False):
+        """ Sets up the scene and renders the current iteration, returning False if it does not need rendering
+        If asynchronous is True the render is started without waiting for it to finish
+        end_render() then write_outputs() must be called once the render has finished
+        """
+
         for level_index in range(0,len(self.output_order)):
             self.update_lists(level_index)
+
+        # Duplicate objects are written when the object they copy is rendered
+        if self.objects[self.i_current_object].name in self.duplicate_of:
+            return False
+
+        # Mirrored angles are written when the angle they mirror is rendered
+        mirror_angle = self.get_mirror_angle()
+        if mirror_angle != None and mirror_angle < self.i_current_angle:
+            return False
+
+        # Objects rendered together with an earlier object have already been written
+        if self.batched != None and self.get_job_key() in self.batched:
+            return False
+
+        self.iterating = True
+        self.batch = self.get_batch()
         self.setup_scene()
-        self.render_scene()
-        self.reset_scene()
+        if self.object_layers != None:
+            result = self.render_batch(asynchronous)
+        else:
+            result = self.render_scene(asynchronous)
+
+        # Blender refuses to start a render while another one is running
+        if result == {'CANCELLED'}:
+            self.end_render()
+            raise RuntimeError("The render could not be started, check that no other render is running")
+
+        self.render_running = asynchronous
+        return True
+
+    def write_outputs(self):
+        """ Writes the mirrored, duplicate and animation outputs of each object in the current render, once it has finished
+        The renders are read on the calling thread as bpy is not thread safe, then the files are saved and linked by the output writer's thread
+        while the next sprite renders, see save_output()
+        """
+
+        current_job = self.get_job()
+        for job in self.batch:
+            self.select_job(job)
+
+            mirror_angle = self.get_mirror_angle()
+            angles = [self.i_current_angle]
+            if mirror_angle != None and mirror_angle != self.i_current_angle:
+                angles.append(mirror_angle)
+            images = self.read_render_images(angles)
+
+            self.write_mirror_outputs(images)
+            self.write_duplicate_outputs(angles)
+            self.store_render_images(angles, images)
+            self.add_animation_frames(angles, images)
+
+            if self.batched != None:
+                self.batched.add(self.get_job_key())
+        self.select_job(current_job)
+
+
+class RenderHandlers():
+    """ Records whether the render started by RenderSprites.start_async() has completed or been cancelled
+    The handlers are called from the render thread, so they only record the event, which is handled by the operator's modal()
+    """
+
+    # None while rendering, then 'COMPLETE' or 'CANCEL'
+    state = None
+
+    def __init__(self):
+        bpy.app.handlers.render_complete.append(self.complete)
+        bpy.app.handlers.render_cancel.append(self.cancel)
+
+    def complete(self, scene, *args):
+        self.state = 'COMPLETE'
+
+    def cancel(self, scene, *args):
+        self.state = 'CANCEL'
+
+    def remove(self):
+        if self.complete in bpy.app.handlers.render_complete:
+            bpy.app.handlers.render_complete.remove(self.complete)
+        if self.cancel in bpy.app.handlers.render_cancel:
+            bpy.app.handlers.render_cancel.remove(self.cancel)
 
 
 class RenderSprites_OT_Operator(bpy.types.Operator):
@@ -1207,28 +3756,43 @@ class RenderSprites_OT_Operator(bpy.types.Operator):
     bl_description = "Render sprites based on selected options and scene setup."
     bl_context = 'VIEW_3D'
 
-    _time = None
-    stop_modal = False
+    _timer = None
     r = None
+    handlers = None
+
+    # Set when ESC is pressed or the file is changed, rendering stops once the current render has finished or been cancelled
+    cancel_requested = False
 
     def modal(self, context, event):
+        if event.type == 'ESC' or bpy.data.is_dirty:
+            self.cancel_requested = True
+
+        # Each sprite is rendered in the background by Blender, the UI stays responsive until the render handlers report it has ended
+        if event.type != 'TIMER' or self.handlers.state == None:
+            return {'PASS_THROUGH'}
+
+        cancelled = self.cancel_requested or self.handlers.state == 'CANCEL'
+        self.handlers.state = None
+
         # As validation must have passed for the button calling this operator to be enabled, the scene should be ok
         # However, since a user could potentially try to use this operator elsewhere, it is included here
-        if not validate_settings(self, context):
+        if not cancelled and not validate_settings(self, context):
             print("Validation Error")
-            self.stop_modal = False
-            return self.cancel(context)
-        if event.type == 'ESC' or bpy.data.is_dirty:
+            cancelled = True
+
+        try:
+            rendering = self.r.end_async(cancelled)
+        except Exception as e:
+            print("Error: {0}".format(e))
+            return self.stop(context)
+
+        if cancelled:
             print("Cancelled Render")
             self.r.cleanup()
-            self.stop_modal = False
             return self.cancel(context)
-        if self.stop_modal:
+        if not rendering:
             print("Finished Render")
-            self.stop_modal = False
             return self.cancel(context)
-        if event.type == 'TIMER':
-            self.stop_modal = self.r.iterate()
 
         return {'PASS_THROUGH'}
 
@@ -1240,11 +3804,40 @@ class RenderSprites_OT_Operator(bpy.types.Operator):
             return {'CANCELLED'}
 
         print("Beginning Render")
+        self.cancel_requested = False
+        self.handlers = RenderHandlers()
         self._timer = context.window_manager.event_timer_add(0.01, window=context.window)
+        try:
+            rendering = self.r.start_async()
+        except Exception as e:
+            print("Error: {0}".format(e))
+            if self.stop(context) == {'PASS_THROUGH'}:
+                context.window_manager.modal_handler_add(self)
+                return {'RUNNING_MODAL'}
+            return {'CANCELLED'}
+        if not rendering:
+            print("Finished Render")
+            self.cancel(context)
+            return {'FINISHED'}
+
         context.window_manager.modal_handler_add(self)
         return {'RUNNING_MODAL'}
 
+    def stop(self, context):
+        """ Stops rendering after an error
+        If a render has already been started, cleanup() would remove the view layers and nodes it is using,
+        so the render is treated as cancelled once the render handlers report that it has ended
+        """
+
+        if self.r.render_running:
+            self.cancel_requested = True
+            return {'PASS_THROUGH'}
+
+        self.r.cleanup()
+        return self.cancel(context)
+
     def cancel(self, context):
+        self.handlers.remove()
         context.window_manager.event_timer_remove(self._timer)
         return {'CANCELLED'}
 
@@ -1333,29 +3926,16 @@ class ADDON_PT_SetupPanel(bpy.types.Panel):
 
         col = layout.column(align=True)
         col.label(text="Camera Parents:")
-        col.prop(addon_prop, 'pointer_camera_one')
-        error = validate_camera_one(self, context)
-        if not error == None:
-            box = col.box()
-            box.label(text=error)
-
-        col.prop(addon_prop, 'pointer_camera_two')
-        error = validate_camera_two(self, context)
-        if not error == None:
-            box = col.box()
-            box.label(text=error)
-
-        col.prop(addon_prop, 'pointer_camera_three')
-        error = validate_camera_three(self, context)
+        for i, camera in enumerate(addon_prop.collection_cameras):
+            row = col.row(align=True)
+            row.prop(camera, 'pointer_camera_parent', text="Camera {0}".format(i + 1))
+            row.operator('view3d.remove_camera_parent', text="", icon='X').index = i
+        col.operator('view3d.add_camera_parent', icon='ADD')
+        error = validate_cameras(self, context)
         if error != None:
             box = col.box()
-            box.label(text=error)
-
-        col.prop(addon_prop, 'pointer_camera_four')
-        error = validate_camera_four(self, context)
-        if not error == None:
-            box = col.box()
-            box.label(text=error)
+            for error_line in error:
+                box.label(text=error_line)
 
         error = validate_camera_parent(self, context)
         if not error == None:
@@ -1388,6 +3968,99 @@ class ADDON_PT_SetupPanel(bpy.types.Panel):
             box = col.box()
             box.label(text=error)
 
+        col = layout.column(align=True)
+        col.prop(addon_prop, 'int_max_sheet_size')
+        if addon_prop.enum_sprite_sheet == 'OFF':
+            col.enabled = False
+
+        col = layout.column(align=True)
+        col.label(text="Effects:")
+        row = col.row(align=True)
+        row.prop(addon_prop, 'enum_effects')
+        if 'OUTLINE' in addon_prop.enum_effects:
+            col.prop(addon_prop, 'float_outline_colour')
+            col.prop(addon_prop, 'int_outline_width')
+        if 'SHADOW' in addon_prop.enum_effects:
+            col.prop(addon_prop, 'float_shadow_colour')
+            col.prop(addon_prop, 'int_shadow_offset_x')
+            col.prop(addon_prop, 'int_shadow_offset_y')
+        if 'CLAMP' in addon_prop.enum_effects:
+            col.prop(addon_prop, 'int_colour_levels')
+        error = validate_effects(self, context)
+        if error != None:
+            box = col.box()
+            box.label(text=error)
+
+        col = layout.column(align=True)
+        col.prop(addon_prop, 'string_resolution_variants')
+        error = validate_resolution_variants(self, context)
+        if error != None:
+            box = col.box()
+            box.label(text=error)
+        col.prop(addon_prop, 'enum_resample_filter')
+
+        col = layout.column(align=True)
+        col.prop(addon_prop, 'enum_animated_images')
+        error = validate_animated_images(self, context)
+        if error != None:
+            box = col.box()
+            box.label(text=error)
+
+        col = layout.column(align=True)
+        col.prop(addon_prop, 'bool_delta_frames')
+        error = validate_delta_frames(self, context)
+        if error != None:
+            box = col.box()
+            box.label(text=error)
+
+        col = layout.column(align=True)
+        col.prop(addon_prop, 'enum_palette')
+        if addon_prop.enum_palette == 'GENERATE':
+            col.prop(addon_prop, 'int_palette_size')
+        elif addon_prop.enum_palette == 'IMAGE':
+            col.prop(addon_prop, 'string_palette_image')
+            col.prop(addon_prop, 'int_palette_size')
+        error = validate_palette(self, context)
+        if error != None:
+            box = col.box()
+            box.label(text=error)
+
+        col = layout.column(align=True)
+        col.prop(addon_prop, 'bool_collision_data')
+        sub = col.column(align=True)
+        sub.prop(addon_prop, 'int_alpha_threshold')
+        sub.prop(addon_prop, 'float_hitbox_tolerance')
+        if not addon_prop.bool_collision_data:
+            sub.enabled = False
+        error = validate_collision_data(self, context)
+        if error != None:
+            box = col.box()
+            box.label(text=error)
+
+        col = layout.column(align=True)
+        col.prop(addon_prop, 'enum_isolation')
+        col.prop(addon_prop, 'bool_batch_objects')
+        error = validate_batch_objects(self, context)
+        if error != None:
+            box = col.box()
+            box.label(text=error)
+
+        col = layout.column(align=True)
+        col.prop(addon_prop, 'bool_auto_simplify')
+        sub = col.column(align=True)
+        sub.prop(addon_prop, 'float_simplify_detail')
+        if not addon_prop.bool_auto_simplify:
+            sub.enabled = False
+
+        col = layout.column(align=True)
+        col.label(text="Extra Passes:")
+        row = col.row(align=True)
+        row.prop(addon_prop, 'enum_render_passes')
+        error = validate_render_passes(self, context)
+        if error != None:
+            box = col.box()
+            box.label(text=error)
+
 
 # The render sprites sub panel
 class ADDON_PT_RenderPanel(bpy.types.Panel):
@@ -0,0 +1,52 @@
+"""Fixtures for the tests, which run the addon against the stand-in bpy module in benchmarks/fake_bpy.py, without Blender.
+
+Run from the addon folder with any Python 3 interpreter that has NumPy and pytest installed:
+
+    python -m pytest tests
+"""
+
+import argparse
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import fake_bpy
+import benchmark_planner
+
+fake_bpy.install()
+_addon = fake_bpy.import_addon()
+
+
+@pytest.fixture
+def addon():
+    """The addon package, with an empty scene"""
+
+    fake_bpy.reset()
+    return _addon
+
+
+@pytest.fixture
+def output_path(tmp_path):
+    path = tmp_path / "output"
+    path.mkdir()
+    return str(path)
+
+
+@pytest.fixture
+def make_scene(addon, output_path):
+    """Return a function that creates a small scene of animated objects and a camera rig rendering to output_path, see benchmark_planner.build_scene()
+    Keyword arguments override the size of the scene, and the function returns the addon properties of the scene
+    """
+
+    def make_scene(**options):
+        args = dict(objects=2, children=1, scenery=0, tracks=1, frames=3, cameras=1, angles=2, size=16, sheets='OBJECT',
+            order="sheet,object,camera,track,angle,frame", no_write=False)
+        args.update(options)
+        fake_bpy.reset()
+        benchmark_planner.build_scene(argparse.Namespace(**args), output_path)
+        return fake_bpy.context.scene.addon_properties
+
+    return make_scene
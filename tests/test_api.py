@@ -0,0 +1,50 @@
+"""Tests of the scripting API"""
+
+import importlib
+import os
+
+import pytest
+
+import fake_bpy
+
+
+@pytest.fixture
+def api(addon):
+    return importlib.import_module(addon.__name__ + ".api")
+
+
+def test_run_jobs_continues_after_a_bad_spec(api, make_scene, output_path):
+    make_scene()
+    first = os.path.join(output_path, "first")
+    second = os.path.join(output_path, "second")
+    os.mkdir(first)
+    os.mkdir(second)
+
+    results = api.run_jobs([
+        {"output_path": first, "camera_angles": 1},
+        {"output_path": first, "no_such_setting": 1},
+        {"output_path": first, "output_parent": "No Such Object"},
+        {"scene": "No Such Scene"},
+        {"output_path": first, "sprite_sheet": 'OBJECT', "output_order": "frame"},
+        {"output_path": second}])
+
+    assert [result["status"] for result in results] == ['FINISHED', 'FAILED', 'FAILED', 'FAILED', 'FAILED', 'FINISHED']
+    assert "no_such_setting" in results[1]["error"]
+    assert "No Such Object" in results[2]["error"]
+    assert "No Such Scene" in results[3]["error"]
+    assert results[4]["error"]
+    assert os.path.isfile(os.path.join(first, "Output.png"))
+    assert os.path.isfile(os.path.join(second, "Output.png"))
+
+
+def test_job_progress(api, make_scene):
+    make_scene()
+    job = api.SpriteJob({"camera_angles": 1})
+    assert job.progress == 0.0
+    assert job.step()
+    assert job.status == 'RUNNING' and 0 < job.progress < 1
+
+    job.cancel()
+    assert not job.step()
+    assert job.status == 'CANCELLED'
+    assert fake_bpy.stats["renders"] == 1
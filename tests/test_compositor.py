@@ -0,0 +1,339 @@
+"""Round trip tests of the compositor functions"""
+
+import importlib
+import math
+import os
+import random
+import struct
+import types
+import zlib
+
+import numpy
+import pytest
+
+import fake_bpy
+
+
+@pytest.fixture
+def compositor(addon):
+    return importlib.import_module(addon.__name__ + ".compositor")
+
+
+def read_apng(path):
+    """Return the frame count and delay of an animated PNG written by write_apng(), and each frame as a uint8 RGBA array"""
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    position = 8
+    frames = []
+    frame_count = delay = None
+    while position < len(data):
+        length, chunk_type = struct.unpack('>I4s', data[position:position + 8])
+        body = data[position + 8:position + 8 + length]
+        if chunk_type == b'acTL':
+            frame_count = struct.unpack('>I', body[:4])[0]
+        elif chunk_type == b'fcTL':
+            width, height = struct.unpack('>II', body[4:12])
+            delay = struct.unpack('>HH', body[20:24])
+        elif chunk_type in (b'IDAT', b'fdAT'):
+            compressed = body if chunk_type == b'IDAT' else body[4:]
+            rows = numpy.frombuffer(zlib.decompress(compressed), dtype=numpy.uint8).reshape(height, width * 4 + 1)
+            # Every row uses the Up filter
+            frames.append(numpy.cumsum(rows[:, 1:], axis=0, dtype=numpy.uint8).reshape(height, width, 4))
+        position += length + 12
+    return frame_count, delay, frames
+
+
+def random_image(rng, width, height):
+    image = rng.integers(0, 256, (height, width, 4), dtype=numpy.uint8)
+    image[..., 3] = 255
+    return image
+
+
+def check_layout(compositor, sizes, direction, max_size):
+    """Lay out images, checking every image is placed once, inside its page and without overlapping another"""
+
+    pages = compositor.layout_pages(sizes, direction, max_size)
+
+    placed = sorted(index for width, height, cells in pages for index, x, y in cells)
+    assert placed == list(range(len(sizes)))
+
+    for page_width, page_height, cells in pages:
+        if max_size and len(cells) > 1:
+            assert page_width <= max_size and page_height <= max_size
+        covered = numpy.zeros((page_height, page_width), dtype=numpy.int32)
+        for index, x, y in cells:
+            width, height = sizes[index]
+            assert x + width <= page_width and y + height <= page_height
+            covered[y:y + height, x:x + width] += 1
+        assert covered.max() <= 1, "images overlap"
+
+    return pages
+
+
+def test_layout_single_strip(compositor):
+    pages = check_layout(compositor, [(4, 3), (5, 2), (2, 6)], 'HORIZONTAL', 0)
+    assert pages == [(11, 6, [(0, 0, 0), (1, 4, 0), (2, 9, 0)])]
+
+    pages = check_layout(compositor, [(4, 3), (5, 2), (2, 6)], 'VERTICAL', 0)
+    assert pages == [(5, 11, [(0, 0, 0), (1, 0, 3), (2, 0, 5)])]
+
+
+def test_layout_wrapped_pages(compositor):
+    rng = random.Random(0)
+    for trial in range(50):
+        sizes = [(rng.randint(1, 20), rng.randint(1, 20)) for i in range(rng.randint(1, 60))]
+        for direction in ('HORIZONTAL', 'VERTICAL'):
+            check_layout(compositor, sizes, direction, rng.choice([20, 32, 64, 128]))
+
+
+def test_layout_even_rows(compositor):
+    pages = check_layout(compositor, [(10, 10)] * 10, 'HORIZONTAL', 80)
+    assert len(pages) == 1
+    assert pages[0][:2] == (50, 20)
+
+
+def test_hull_of_rectangle(compositor):
+    mask = numpy.zeros((8, 12), dtype=bool)
+    mask[2:5, 3:9] = True
+    assert compositor.find_hull(mask) == [[3, 2], [9, 2], [9, 5], [3, 5]]
+
+
+def test_hull_contains_every_pixel(compositor):
+    y, x = numpy.mgrid[0:32, 0:32]
+    mask = numpy.hypot(x - 15.5, y - 13.5) < 10
+    hull = compositor.find_hull(mask)
+
+    # Every corner of every pixel is on or inside each edge
+    rows, columns = numpy.nonzero(mask)
+    corners = numpy.concatenate([numpy.stack([columns + dx, rows + dy], axis=1) for dx in (0, 1) for dy in (0, 1)])
+    for (ax, ay), (bx, by) in zip(hull, hull[1:] + hull[:1]):
+        cross = (bx - ax) * (corners[:, 1] - ay) - (by - ay) * (corners[:, 0] - ax)
+        assert (cross >= 0).all() or (cross <= 0).all()
+
+    # The hull is simplified without moving any edge more than the tolerance
+    simplified = compositor.simplify_polygon(hull, 1.0)
+    assert 3 <= len(simplified) < len(hull)
+    assert all(point in hull for point in simplified)
+
+
+def test_simplify_polygon(compositor):
+    square = [[0, 0], [5, 0], [10, 0], [10, 10], [0, 10]]
+    assert compositor.simplify_polygon(square, 0.1) == [[0, 0], [10, 0], [10, 10], [0, 10]]
+
+    bumped = [[0, 0], [5, 1], [10, 0], [10, 10], [0, 10]]
+    assert compositor.simplify_polygon(bumped, 0.5) == bumped
+    assert compositor.simplify_polygon(bumped, 1.5) == [[0, 0], [10, 0], [10, 10], [0, 10]]
+
+    triangle = [[0, 0], [1, 0], [0, 1]]
+    assert compositor.simplify_polygon(triangle, 100) == triangle
+
+
+def test_palette_map_round_trip(compositor):
+    rng = numpy.random.default_rng(1)
+    strip = numpy.zeros((1, 16, 4), dtype=numpy.uint8)
+    strip[0, :, :3] = rng.integers(0, 256, (16, 3))
+    strip[0, :, 3] = 255
+    strip[0, 5, 3] = 128
+    palette = compositor.read_palette(strip)
+    assert palette[0].tolist() == [0, 0, 0, 0]
+
+    indexes = rng.integers(0, len(palette), (24, 20))
+    image = palette[indexes]
+    mapper = compositor.PaletteMapper(palette)
+    for repeat in range(2):
+        mapped = mapper.map(image)
+        assert mapped.dtype == numpy.uint8
+        numpy.testing.assert_array_equal(palette[mapped], image)
+
+    # Fully transparent pixels always map to the first colour, and other colours to the nearest
+    image = image.copy()
+    image[0, 0] = (10, 20, 30, 0)
+    image[0, 1] = numpy.minimum(palette[3].astype(int) + (1, 0, 0, 0), 255)
+    mapped = mapper.map(image)
+    assert mapped[0, 0] == 0
+    assert mapped[0, 1] == 3
+
+
+def test_write_indexed_png(compositor, tmp_path):
+    palette = numpy.array([(0, 0, 0, 0), (255, 0, 0, 128), (0, 255, 0, 255), (0, 0, 255, 255)], dtype=numpy.uint8)
+    indexes = numpy.random.default_rng(2).integers(0, len(palette), (13, 7)).astype(numpy.uint8)
+    path = str(tmp_path / "indexed.png")
+    compositor.write_indexed_png(path, indexes, palette)
+    numpy.testing.assert_array_equal(fake_bpy.read_png(path), palette[indexes])
+
+    if compositor.pil_installed:
+        with compositor.Image.open(path) as image:
+            assert image.mode == 'P'
+            numpy.testing.assert_array_equal(numpy.asarray(image.convert('RGBA')), palette[indexes])
+
+
+def test_write_png(compositor, tmp_path):
+    image = numpy.random.default_rng(4).integers(0, 256, (13, 7, 4), dtype=numpy.uint8)
+    path = str(tmp_path / "image.png")
+    compositor.write_png(path, image)
+    numpy.testing.assert_array_equal(fake_bpy.read_png(path), image)
+
+    if compositor.pil_installed:
+        with compositor.Image.open(path) as decoded:
+            numpy.testing.assert_array_equal(numpy.asarray(decoded), image)
+
+
+def test_output_writer_runs_in_order(compositor):
+    writer = compositor.OutputWriter()
+    results = []
+    for i in range(50):
+        writer.submit(results.append, i)
+    writer.close()
+    assert results == list(range(50))
+
+    writer = compositor.OutputWriter()
+    writer.submit(os.remove, "missing file")
+    with pytest.raises(FileNotFoundError):
+        writer.close()
+
+
+def test_write_apng(compositor, tmp_path):
+    rng = numpy.random.default_rng(3)
+    frames = [rng.integers(0, 256, (9, 11, 4), dtype=numpy.uint8) for i in range(4)]
+    path = str(tmp_path / "animation.png")
+    compositor.write_apng(path, [compositor.compress_apng_frame(frame) for frame in frames], 12)
+    frame_count, delay, decoded = read_apng(path)
+
+    assert frame_count == 4
+    assert delay == (1, 12)
+    assert len(decoded) == 4
+    for frame, result in zip(frames, decoded):
+        numpy.testing.assert_array_equal(result, frame)
+
+
+def test_dirty_rects_unchanged(compositor):
+    image = random_image(numpy.random.default_rng(4), 20, 20)
+    assert compositor.find_dirty_rects(image, image.copy()) == []
+
+
+def test_dirty_rects_single_pixel(compositor):
+    previous = numpy.zeros((20, 30, 4), dtype=numpy.uint8)
+    current = previous.copy()
+    current[13, 21] = (1, 2, 3, 4)
+    assert compositor.find_dirty_rects(previous, current) == [(21, 13, 1, 1)]
+
+
+def test_dirty_rects_rebuild_the_frame(compositor):
+    rng = numpy.random.default_rng(5)
+    for trial in range(20):
+        height, width = rng.integers(1, 50, 2)
+        previous = random_image(rng, width, height)
+        current = previous.copy()
+        for change in range(rng.integers(1, 6)):
+            x, y = rng.integers(0, width), rng.integers(0, height)
+            current[y:y + rng.integers(1, 8), x:x + rng.integers(1, 8)] = random_image(rng, 1, 1)
+
+        rects = compositor.find_dirty_rects(previous, current, tile_size=int(rng.choice([1, 4, 8])))
+        rebuilt = previous.copy()
+        for x, y, rect_width, rect_height in rects:
+            assert 0 <= x and 0 <= y and x + rect_width <= width and y + rect_height <= height
+            rebuilt[y:y + rect_height, x:x + rect_width] = current[y:y + rect_height, x:x + rect_width]
+        numpy.testing.assert_array_equal(rebuilt, current)
+
+
+def rotated(degrees, **attributes):
+    """Return a stand-in object rotated about the Z axis"""
+
+    c, s = math.cos(math.radians(degrees)), math.sin(math.radians(degrees))
+    matrix = fake_bpy.Matrix([[c, -s, 0, 0], [s, c, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]])
+    return types.SimpleNamespace(name="Rotated {0}".format(degrees), matrix_world=matrix,
+        rotation_euler=fake_bpy.Euler((0, 0, math.radians(degrees))), **attributes)
+
+
+def calculate_mirror(addon, obj_degrees, cam_degrees, angles=8, mirrored=True):
+    module = addon.game_sprite_addon
+    renderer = types.SimpleNamespace(settings=types.SimpleNamespace(int_camera_angles=angles))
+    obj = rotated(obj_degrees, get={module.MIRROR_PROPERTY: mirrored}.get)
+    cam_parent = rotated(cam_degrees)
+    # The camera looks along its parent's Y axis
+    camera = rotated(cam_degrees)
+    camera.matrix_world = camera.matrix_world @ fake_bpy.Matrix([[1, 0, 0, 0], [0, 0, -1, 0], [0, 1, 0, 0], [0, 0, 0, 1]])
+    return module.RenderSprites.calculate_mirror(renderer, obj, cam_parent, camera)
+
+
+def test_mirror_angles(addon):
+    # Looking along the plane of symmetry, so each angle is mirrored by the angle the other side of it
+    shift, axis = calculate_mirror(addon, 0, 0)
+    assert shift == 0
+    numpy.testing.assert_allclose(axis, (1, 0, 0), atol=1e-9)
+
+    shift, axis = calculate_mirror(addon, 45, 0)
+    assert shift == 2
+    numpy.testing.assert_allclose(axis, (math.sqrt(0.5), math.sqrt(0.5), 0), atol=1e-9)
+
+    # The rotation of the camera parent is its angle, so it does not change the result
+    assert calculate_mirror(addon, 45, 30)[0] == 2
+
+    # Mirroring twice is the same as not mirroring
+    for obj_degrees in (0, 45, 90, 135):
+        shift = calculate_mirror(addon, obj_degrees, 0)[0]
+        for angle in range(8):
+            assert (shift - (shift - angle) % 8) % 8 == angle
+
+
+def test_not_mirrored(addon):
+    assert calculate_mirror(addon, 0, 0, mirrored=False) == None
+    # Mirrored views that fall between the camera angles cannot be used
+    assert calculate_mirror(addon, 10, 0) == None
+
+
+@pytest.fixture
+def write_digest(compositor, tmp_path):
+    """Return a function that writes sheet.png through OutputDigests, returning True if the file was written"""
+
+    path = str(tmp_path / "sheet.png")
+
+    def write_digest(digest, encoding="PNG", content=b"pixels"):
+        def save():
+            with open(path, 'wb') as f:
+                f.write(content)
+
+        digests = compositor.OutputDigests(str(tmp_path), encoding)
+        written = digests.write_image(path, digest, save)
+        digests.save()
+        return written
+
+    write_digest.path = path
+    return write_digest
+
+
+def test_digests_skip_unchanged_files(write_digest):
+    assert write_digest("a")
+    mtime = os.stat(write_digest.path).st_mtime_ns
+    assert not write_digest("a")
+    assert os.stat(write_digest.path).st_mtime_ns == mtime
+
+
+def test_digests_write_changes(write_digest):
+    write_digest("a")
+    assert write_digest("b")
+    assert write_digest("b", encoding="PNG 16")
+    assert not write_digest("b", encoding="PNG 16")
+
+
+def test_digests_write_edited_files(write_digest):
+    write_digest("a")
+    with open(write_digest.path, 'wb') as f:
+        f.write(b"edited by hand")
+    assert write_digest("a")
+
+    os.remove(write_digest.path)
+    assert write_digest("a")
+
+
+def test_digests_forget_removed_files(compositor, tmp_path):
+    folder = str(tmp_path)
+    digests = compositor.OutputDigests(folder)
+    digests.write_text(os.path.join(folder, "kept.json"), "{}")
+    digests.write_text(os.path.join(folder, "removed.json"), "{}")
+    os.remove(os.path.join(folder, "removed.json"))
+    digests.save()
+
+    assert digests.changed == [os.path.join(folder, "kept.json")]
+    assert list(compositor.OutputDigests(folder).records) == ["kept.json"]
@@ -0,0 +1,262 @@
+"""Tests of whole render jobs, rendered by the stand-in renderer"""
+
+import hashlib
+import json
+import os
+import shutil
+import types
+
+import bpy
+import numpy
+import pytest
+
+import fake_bpy
+from test_compositor import read_apng
+
+
+def render(addon, asynchronous=False):
+    """Render every sprite of the scene, waiting for each background render in turn when asynchronous is True"""
+
+    renderer = addon.game_sprite_addon.RenderSprites(fake_bpy.context)
+    if asynchronous:
+        running = renderer.start_async()
+        while running:
+            fake_bpy.finish_render()
+            running = renderer.end_async()
+    else:
+        while not renderer.iterate():
+            pass
+    return renderer
+
+
+def read_outputs(output_path):
+    """Return the hash of every file written, by relative path, leaving out the digests which record modification times"""
+
+    outputs = {}
+    for folder, folders, files in os.walk(output_path):
+        for name in files:
+            if name != ".sprite_digests.json":
+                path = os.path.join(folder, name)
+                with open(path, 'rb') as f:
+                    outputs[os.path.relpath(path, output_path)] = hashlib.sha1(f.read()).hexdigest()
+    return outputs
+
+
+@pytest.mark.parametrize("settings", [
+    {},
+    {"enum_animated_images": 'APNG', "bool_keep_renders": True},
+    {"bool_delta_frames": True, "enum_effects": {'OUTLINE'}}])
+def test_background_renders_match(addon, make_scene, output_path, settings):
+    outputs = []
+    for asynchronous in (False, True):
+        shutil.rmtree(output_path)
+        os.mkdir(output_path)
+        addon_prop = make_scene(tracks=2, frames=4, angles=4)
+        for key, value in settings.items():
+            setattr(addon_prop, key, value)
+        fake_bpy.data.objects["Object 1"][addon.game_sprite_addon.MIRROR_PROPERTY] = True
+        render(addon, asynchronous)
+        outputs.append(read_outputs(output_path))
+
+    assert outputs[0] and outputs[0] == outputs[1]
+
+
+def test_unchanged_sheets_are_not_written(addon, make_scene, output_path):
+    make_scene()
+    render(addon)
+    mtimes = {path: os.stat(os.path.join(output_path, path)).st_mtime_ns for path in read_outputs(output_path)}
+
+    make_scene()
+    renderer = render(addon)
+    assert renderer.output_digests.changed == []
+    assert {path: os.stat(os.path.join(output_path, path)).st_mtime_ns for path in read_outputs(output_path)} == mtimes
+
+
+def test_collision_ignores_effects(addon, make_scene, output_path):
+    collision = []
+    for effects in (set(), {'OUTLINE', 'SHADOW'}):
+        addon_prop = make_scene()
+        addon_prop.enum_effects = effects
+        addon_prop.string_resolution_variants = "0.5"
+        addon_prop.bool_collision_data = True
+        render(addon)
+        collision.append([json.load(open(os.path.join(output_path, folder, "Output_collision.json"))) for folder in ("", "0.5x")])
+
+    assert collision[0] == collision[1]
+
+
+@pytest.mark.parametrize("keep_renders", [False, True])
+def test_renders_are_decoded_once(addon, make_scene, output_path, keep_renders):
+    addon_prop = make_scene(tracks=2, angles=4)
+    addon_prop.bool_keep_renders = keep_renders
+    fake_bpy.data.objects["Object 1"][addon.game_sprite_addon.MIRROR_PROPERTY] = True
+    compression = fake_bpy.context.scene.render.image_settings.compression
+    renderer = addon.game_sprite_addon.RenderSprites(fake_bpy.context)
+    renderer.iterate()
+    # Renders are saved with the scene's own settings
+    assert fake_bpy.context.scene.render.image_settings.compression == compression
+    while not renderer.iterate():
+        pass
+
+    # Every render is read once, then the sprite sheets are merged from the frame stores
+    assert fake_bpy.stats["image_loads"] == fake_bpy.stats["renders"]
+    assert not [name for name in os.listdir(output_path) if name.endswith(".raw")]
+    assert os.path.isdir(os.path.join(output_path, "Output")) == keep_renders
+
+
+def test_delta_frames_keep_renders(addon, make_scene, output_path):
+    addon_prop = make_scene(objects=1)
+    addon_prop.bool_delta_frames = True
+    addon_prop.bool_keep_renders = True
+    render(addon)
+
+    frames = [path for path in read_outputs(output_path) if path.startswith("Output" + os.sep) and path.endswith("_002.png")]
+    assert frames
+    for path in frames:
+        assert fake_bpy.read_png(os.path.join(output_path, path)).shape == (16, 16, 4)
+
+
+def test_animations_match_renders_with_effects(addon, make_scene, output_path):
+    addon_prop = make_scene(objects=1, angles=1)
+    addon_prop.enum_animated_images = 'APNG'
+    addon_prop.enum_effects = {'OUTLINE'}
+    addon_prop.bool_keep_renders = True
+    render(addon)
+
+    outputs = read_outputs(output_path)
+    animations = [path for path in outputs if path.startswith("animations" + os.sep)]
+    frame_paths = sorted(path for path in outputs if path.startswith("Output" + os.sep) and path.endswith(("_001.png", "_002.png", "_003.png")))
+    assert len(animations) == 1 and len(frame_paths) == 3
+    frame_count, delay, frames = read_apng(os.path.join(output_path, animations[0]))
+    assert frame_count == 3
+    # The effects are applied once, outlining the outline again would change the frames
+    for frame, path in zip(frames, frame_paths):
+        assert (frame == fake_bpy.read_png(os.path.join(output_path, path))).all()
+
+
+def test_colour_variants(addon, make_scene, output_path):
+    addon_prop = make_scene()
+    addon_prop.enum_render_passes = {'MASK'}
+    fake_bpy.context.scene.render.engine = 'CYCLES'
+    variants = addon.game_sprite_addon.COLOUR_VARIANTS_PROPERTY
+    fake_bpy.data.objects["Object 0"][variants] = '{"Red": {"1": [0.5, 1, 1]}, "Blue": {"2": {"#c87828": "#102030"}}}'
+    assert addon.game_sprite_addon.get_validation_errors(None, fake_bpy.context) == []
+    render(addon)
+
+    main = fake_bpy.read_png(os.path.join(output_path, "Output.png"))
+    for name, changed_half in (("Red", 0), ("Blue", 1)):
+        variant = fake_bpy.read_png(os.path.join(output_path, "colour_variants", name, "Output.png"))
+        # Only Object 0 has variants, and the stand-in Mask pass has pass index 1 on the left and 2 on the right of each render
+        sprite = main[:variant.shape[0]]
+        changed = (variant != sprite).any(axis=2)
+        assert changed.any()
+        columns = numpy.flatnonzero(changed.any(axis=0)) % 16
+        assert ((columns >= 8) == changed_half).all()
+    assert tuple(variant[changed][0]) == (16, 32, 48, 255)
+
+
+def test_operator(addon, make_scene, output_path):
+    make_scene()
+    context = fake_bpy.context
+    timers = []
+    context.window_manager = types.SimpleNamespace(event_timer_add=lambda step, window=None: timers.append("timer") or "timer",
+        event_timer_remove=timers.remove, modal_handler_add=lambda operator: None)
+    operator = addon.game_sprite_addon.RenderSprites_OT_Operator()
+
+    assert operator.execute(context) == {'RUNNING_MODAL'}
+    # The UI stays responsive while each sprite renders
+    assert operator.modal(context, types.SimpleNamespace(type='TIMER')) == {'PASS_THROUGH'}
+    renders = 0
+    result = {'PASS_THROUGH'}
+    while result == {'PASS_THROUGH'}:
+        fake_bpy.finish_render()
+        renders += 1
+        result = operator.modal(context, types.SimpleNamespace(type='TIMER'))
+
+    assert renders == fake_bpy.stats["renders"] == 12
+    assert timers == []
+    assert bpy.app.handlers.render_complete == []
+    assert os.path.isfile(os.path.join(output_path, "Output.png"))
+
+
+def test_auto_simplify(addon, make_scene):
+    addon_prop = make_scene(size=64)
+    addon_prop.bool_auto_simplify = True
+    render_settings = fake_bpy.context.scene.render
+    # A large mesh, whose edges are many pixels long, and a small one
+    for name, size in (("Mesh 0.0", 2.0), ("Mesh 1.0", 0.1)):
+        mesh = fake_bpy.data.objects[name].data
+        mesh.vertices.co[:] = numpy.random.default_rng(0).uniform(-size, size, (len(mesh.vertices), 3))
+
+    renderer = addon.game_sprite_addon.RenderSprites(fake_bpy.context)
+    next(renderer.plan_iterations())
+    renderer.prepare_simplify()
+    levels = [renderer.get_simplify(fake_bpy.data.objects[name])[0] for name in ("Object 0", "Object 1")]
+    assert levels[0] > levels[1] == 0
+
+    renderer.cleanup_simplify()
+    render(addon)
+    assert (render_settings.use_simplify, render_settings.simplify_subdivision_render) == (False, 6)
+
+
+def test_depth_pass_uses_camera_clip_range(addon, make_scene):
+    addon_prop = make_scene()
+    addon_prop.enum_render_passes = {'DEPTH'}
+    renderer = addon.game_sprite_addon.RenderSprites(fake_bpy.context)
+    renderer.iterate()
+
+    camera = renderer.camera_objects[0].data
+    range_node, = renderer.depth_ranges
+    assert range_node.use_clamp
+    assert [range_node.inputs[i].default_value for i in range(1, 5)] == [camera.clip_start, camera.clip_end, 0, 1]
+
+    while not renderer.iterate():
+        pass
+    assert not [node for node in fake_bpy.context.scene.node_tree.nodes if node.bl_idname == 'CompositorNodeMapRange']
+
+
+def test_data_passes_need_raw_view_transform_before_blender_3(addon, make_scene):
+    addon_prop = make_scene()
+    addon_prop.enum_render_passes = {'EMISSION'}
+    scene = fake_bpy.context.scene
+    # Blender 2.x has no colour management override for saving images
+    del scene.render.image_settings.color_management
+    validate = addon.game_sprite_addon.validate_render_passes
+    assert validate(None, fake_bpy.context) == None
+
+    addon_prop.enum_render_passes = {'EMISSION', 'NORMAL'}
+    assert validate(None, fake_bpy.context) != None
+    scene.view_settings.view_transform = 'Raw'
+    assert validate(None, fake_bpy.context) == None
+
+
+def test_collection_isolation_leaves_scene_collection(addon, make_scene, output_path):
+    addon_prop = make_scene(scenery=1)
+    addon_prop.enum_isolation = 'COLLECTION'
+    scene = fake_bpy.context.scene
+    objects = fake_bpy.data.objects
+    for name in ("Scenery 0", "Mesh 0.0", "Camera 0"):
+        scene.collection.objects.link(objects[name])
+    objects["Mesh 0.0"].hide_render = True
+    visibility = {obj.name: obj.hide_render for obj in objects}
+
+    renderer = addon.game_sprite_addon.RenderSprites(fake_bpy.context)
+    renderer.iterate()
+    # The objects are linked into the isolation collections, not moved
+    assert [obj.name for obj in scene.collection.objects] == ["Scenery 0", "Mesh 0.0", "Camera 0"]
+    assert objects["Scenery 0"].hide_render
+    assert len(scene.view_layers) == 2 and fake_bpy.data.collections
+
+    while not renderer.iterate():
+        pass
+    assert [obj.name for obj in scene.collection.objects] == ["Scenery 0", "Mesh 0.0", "Camera 0"]
+    assert scene.collection.children == [] and fake_bpy.data.collections == []
+    assert [view_layer.name for view_layer in scene.view_layers] == ["View Layer"]
+    assert {obj.name: obj.hide_render for obj in objects} == visibility
+    assert os.path.isfile(os.path.join(output_path, "Output.png"))
+
+    # Objects linked directly to the scene collection are in every object's view layer
+    addon_prop.bool_batch_objects = True
+    assert "Mesh 0.0" in addon.game_sprite_addon.validate_batch_objects(None, fake_bpy.context)
+    scene.collection.objects.unlink(objects["Mesh 0.0"])
+    assert addon.game_sprite_addon.validate_batch_objects(None, fake_bpy.context) == None